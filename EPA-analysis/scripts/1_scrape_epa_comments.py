@@ -1,42 +1,119 @@
 #!/usr/bin/env python3
 import os
+import re
 import json
+import hashlib
 import argparse
-import pandas as pd
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from dotenv import load_dotenv
 from firecrawl import FirecrawlApp
-from bs4 import BeautifulSoup
+from records import write_records
+from rate_limit import TokenBucket
+from listing_parser import collect_listing_links
+from scrape_state import ScrapeState, DEFAULT_STATE_FILENAME
+from firecrawl_cache import get_default_cache
+from comment_parser import parse_comment_page, CommentParseError
+from tabular_export import export_records, EXPORT_FORMATS
 
 # Load environment variables from .env file
 load_dotenv()
 
+# output_files keys for each tabular export format
+EXPORT_KEYS = {"csv": "csv", "xlsx": "excel", "parquet": "parquet"}
+
+EPA_ID_PATTERN = re.compile(r"EPA-[A-Za-z0-9]+(?:-[A-Za-z0-9]+)*")
+
+def url_file_id(url):
+    """
+    Identifier for a URL in output file names
+
+    Document comment listings use the document ID. Any other URL gets the
+    first EPA ID in it (or "unknown") plus a short hash of the whole URL, so
+    different URLs scraped in the same run never share output files.
+    """
+    if "/document/" in url:
+        return url.split("/")[-2]
+    match = EPA_ID_PATTERN.search(url)
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+    return f"{match.group(0) if match else 'unknown'}_{digest}"
+
 class EPACommentScraper:
     """Class to scrape and process EPA comments from regulations.gov"""
 
-    def __init__(self, api_key=None, output_dir="output"):
+    def __init__(self, api_key=None, output_dir="output", record_format="json", concurrency=1, rate=None, app=None,
+                 state=None, mode="full", cache=None, offline=False, extraction="llm", exports=("csv", "xlsx")):
         """
         Initialize the scraper
 
         Args:
             api_key: Firecrawl API key (defaults to FIRECRAWL_API_KEY env var)
             output_dir: Directory to store output files
+            record_format: File format for comment records: "json", "jsonl" or "jsonl.gz"
+            concurrency: Number of comment pages fetched at the same time
+            rate: Maximum Firecrawl requests per second across all threads (None for no limit)
+            app: Firecrawl client to use instead of creating a FirecrawlApp
+            state: ScrapeState recording listing and comment progress (None to not track progress)
+            mode: "full" to scrape every listing page and comment, "resume" to continue an
+                interrupted run from the recorded state, or "incremental" to stop paginating
+                at the first already-known comment and fetch only new comments
+            cache: FirecrawlCache for scrape results (None to always call Firecrawl)
+            offline: Serve every request from the cache and fail on a miss instead of calling Firecrawl
+            extraction: "llm" to always use Firecrawl's LLM extraction, or "html" to parse
+                comment pages locally and fall back to the LLM extraction only when parsing fails
+            exports: Tabular formats written next to the JSON records: any of "csv", "xlsx", "parquet"
         """
+        if mode != "full" and state is None:
+            raise ValueError(f"Scrape mode '{mode}' needs a scrape state")
+        if offline and cache is None:
+            raise ValueError("Offline mode needs a Firecrawl cache")
         self.output_dir = output_dir
+        self.record_format = record_format
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = TokenBucket(rate, burst=self.concurrency)
+        self.state = state
+        self.mode = mode
+        self.cache = cache
+        self.offline = offline
+        self.extraction = extraction
+        self.exports = list(exports)
         os.makedirs(output_dir, exist_ok=True)
 
         # Get API key from parameter or environment
         self.api_key = api_key or os.environ.get("FIRECRAWL_API_KEY")
-        if not self.api_key:
+        if app is None and not offline and not self.api_key:
             raise ValueError("Firecrawl API key not provided and FIRECRAWL_API_KEY not found in environment")
 
-        # Initialize Firecrawl client
-        self.app = FirecrawlApp(api_key=self.api_key)
+        # Initialize Firecrawl client (not needed when everything comes from the cache)
+        if app is None and not offline:
+            app = FirecrawlApp(api_key=self.api_key)
+        self.app = app
 
         # Generate timestamp for file naming
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
+    def scrape(self, refresh=False, **kwargs):
+        """
+        Call Firecrawl's scrape_url through the response cache, waiting for the shared rate limit first
+
+        Args:
+            refresh: Skip the cache lookup (the fresh result is still cached)
+            **kwargs: Arguments for scrape_url
+        """
+        if self.cache and not refresh:
+            cached = self.cache.get(**kwargs)
+            if cached is not None:
+                return cached
+        if self.offline:
+            raise LookupError(f"Not in the Firecrawl cache (offline mode): {kwargs.get('url')}")
+
+        self.rate_limiter.acquire()
+        result = self.app.scrape_url(**kwargs)
+        if self.cache:
+            self.cache.put(kwargs, result)
+        return result
+
     def scrape_single_url(self, url, wait_time=5000):
         """
         Scrape a single URL and return the raw result
@@ -49,10 +126,12 @@ class EPACommentScraper:
             The raw scraping result
         """
         print(f"Scraping: {url}")
-        result = self.app.scrape_url(
+        # The docket page changes as comments arrive, so only offline runs read it from the cache
+        result = self.scrape(
             url=url,
             formats=["markdown", "html"],
-            wait_for=wait_time
+            wait_for=wait_time,
+            refresh=not self.offline
         )
         return result
 
@@ -72,10 +151,23 @@ class EPACommentScraper:
         # Remove any existing page number parameter
         base_url = url.split('?')[0]
 
-        # Store all comment links across all pages
-        all_comment_links = []
+        # Store all comment links across all pages (a dict is an insertion-ordered set)
+        all_comment_links = {}
         current_page = 1
         more_pages = True
+        listing_complete = False
+
+        # Continue pagination after the last page an earlier run finished
+        if self.mode == "resume":
+            last_page, complete = self.state.listing_progress(base_url)
+            all_comment_links = dict.fromkeys(self.state.known_links(base_url))
+            if complete:
+                print(f"Listing already complete ({len(all_comment_links)} comment links known), skipping pagination")
+                more_pages = False
+                listing_complete = True
+            elif last_page:
+                current_page = last_page + 1
+                print(f"Resuming pagination at page {current_page} ({len(all_comment_links)} comment links known)")
 
         # Iterate through all pages
         while more_pages:
@@ -84,42 +176,41 @@ class EPACommentScraper:
 
             # Get the current page
             try:
-                main_page = self.app.scrape_url(
+                # Listing pages change as comments arrive, so they are always refetched (the
+                # cached copy is only used offline); comment pages are what the cache is for
+                main_page = self.scrape(
                     url=page_url,
                     formats=["markdown", "html"],
-                    wait_for=5000
+                    wait_for=5000,
+                    refresh=not self.offline
                 )
 
-                # Extract comment links from this page
+                # Extract new comment links and look for a "Next" page link in one pass
                 page_comment_links = []
+                next_link = False
                 if hasattr(main_page, "html"):
-                    soup = BeautifulSoup(main_page.html, 'html.parser')
-
-                    # Look for comment links
-                    for link in soup.find_all('a', href=True):
-                        if '/comment/EPA-' in link['href']:
-                            # Fix URL format to ensure it's properly formed
-                            if link['href'].startswith('/'):
-                                full_url = f"https://www.regulations.gov{link['href']}"
-                            else:
-                                full_url = link['href']
-
-                            # Ensure we don't have duplicate URLs
-                            if full_url not in page_comment_links and full_url not in all_comment_links:
-                                page_comment_links.append(full_url)
-
-                # If we found links, add them to our master list
-                if page_comment_links:
+                    page_comment_links, next_link = collect_listing_links(main_page.html, current_page, all_comment_links)
+
+                # In incremental mode, reaching comments we already have means the rest are older
+                reached_known = False
+                if self.mode == "incremental" and page_comment_links:
+                    known = self.state.known_among(page_comment_links)
+                    if known:
+                        reached_known = True
+                        page_comment_links = [link for link in page_comment_links if link not in known]
+
+                if self.state:
+                    # Incremental runs start from page 1 again, so they don't move the resume point
+                    self.state.record_page(base_url, page_comment_links,
+                                           page=None if self.mode == "incremental" else current_page)
+
+                # If we found links, they are already in our master list
+                if reached_known:
+                    print(f"Found {len(page_comment_links)} new comment links on page {current_page}, "
+                          f"reached already-scraped comments, stopping pagination")
+                    more_pages = False
+                elif page_comment_links:
                     print(f"Found {len(page_comment_links)} comment links on page {current_page}")
-                    all_comment_links.extend(page_comment_links)
-
-                    # Check if there might be more pages
-                    # Look for "Next" page link or other pagination indicators
-                    next_link = None
-                    for link in soup.find_all('a', href=True):
-                        if 'pageNumber=' in link['href'] and f'pageNumber={current_page+1}' in link['href']:
-                            next_link = link
-                            break
 
                     # If we have a next page link or found a full page of results (likely more pages)
                     if next_link or len(page_comment_links) >= 25:
@@ -127,9 +218,11 @@ class EPACommentScraper:
                     else:
                         print(f"No more pages found after page {current_page}")
                         more_pages = False
+                        listing_complete = True
                 else:
                     print(f"No comment links found on page {current_page}, stopping pagination")
                     more_pages = False
+                    listing_complete = True
 
             except Exception as e:
                 print(f"⚠️ Error processing page {page_url}: {str(e)}")
@@ -137,53 +230,128 @@ class EPACommentScraper:
 
         print(f"Found {len(all_comment_links)} total comment links across all pages")
 
+        if self.state and listing_complete and self.mode != "incremental":
+            self.state.mark_listing_complete(base_url)
+
+        # Resumed and incremental runs only fetch comments not already fetched
+        if self.mode == "full":
+            comment_links = list(all_comment_links)
+        else:
+            comment_links = self.state.pending_links(base_url)
+            print(f"{len(comment_links)} comments still to fetch")
+
         # Limit the number of comments to process if specified
-        comment_links = all_comment_links
         if max_comments and max_comments > 0 and len(comment_links) > max_comments:
             print(f"Limiting to {max_comments} comments (out of {len(comment_links)} found)")
             comment_links = comment_links[:max_comments]
 
         # Now visit each comment link and extract the content
-        all_comments = []
-        for i, comment_link in enumerate(comment_links):
+        comments = self.fetch_comments(comment_links)
+        if self.mode == "full":
+            return comments
+
+        # Return every comment fetched for this docket so far, not just this run's
+        return self.state.fetched_records(base_url)
+
+    def fetch_comment(self, comment_link):
+        """
+        Scrape one comment page and extract its fields
+
+        Fields come from Firecrawl's JSON (LLM) extraction. With extraction
+        "html" they are parsed from the page HTML first, and the LLM
+        extraction is only requested for pages the parser rejects.
+
+        Args:
+            comment_link: URL of the comment page
+
+        Returns:
+            Dictionary of comment fields, including source_url
+        """
+        # Remove any double URL (sometimes the URL is duplicated as https://www.regulations.govhttps://www.regulations.gov/...)
+        if "https://www.regulations.govhttps://www.regulations.gov" in comment_link:
+            comment_link = comment_link.replace("https://www.regulations.govhttps://www.regulations.gov", "https://www.regulations.gov")
+
+        # Page formats fetched along with the extraction, so the raw page is cached too
+        formats = ["markdown", "html", "json"]
+
+        # Fast path: scrape the page without the LLM and parse its markup
+        if self.extraction == "html":
+            comment_page = self.scrape(
+                url=comment_link,
+                formats=["markdown", "html"],
+                wait_for=5000
+            )
             try:
-                # Remove any double URL (sometimes the URL is duplicated as https://www.regulations.govhttps://www.regulations.gov/...)
-                if "https://www.regulations.govhttps://www.regulations.gov" in comment_link:
-                    comment_link = comment_link.replace("https://www.regulations.govhttps://www.regulations.gov", "https://www.regulations.gov")
+                comment_data = parse_comment_page(getattr(comment_page, "html", None), comment_link)
+                comment_data["source_url"] = comment_link
+                return comment_data
+            except CommentParseError as e:
+                print(f"Falling back to LLM extraction for {comment_link}: {e}")
+                # The page itself is already fetched and cached; only ask for the extraction
+                formats = ["json"]
+
+        # Scrape the individual comment page
+        comment_page = self.scrape(
+            url=comment_link,
+            formats=formats,
+            wait_for=5000,
+            json_options={
+                "prompt": """
+                Extract the following information from this EPA comment page:
+                - commenter_name: The name of the person or organization submitting the comment
+                - comment_date: The date the comment was submitted
+                - organization: The organization the commenter represents (if available)
+                - comment_text: The full text of the comment
+                - attachments: List of any attachment filenames and links (if available)
+                - comment_id: The EPA comment ID (format EPA-HQ-OLEM-YYYY-XXXX-NNNN)
+                """
+            }
+        )
 
-                print(f"Processing comment {i+1}/{len(comment_links)}: {comment_link}")
+        if not hasattr(comment_page, "json"):
+            raise ValueError("Failed to extract JSON data")
 
-                # Scrape the individual comment page
-                comment_page = self.app.scrape_url(
-                    url=comment_link,
-                    formats=["markdown", "html", "json"],
-                    wait_for=5000,
-                    json_options={
-                        "prompt": """
-                        Extract the following information from this EPA comment page:
-                        - commenter_name: The name of the person or organization submitting the comment
-                        - comment_date: The date the comment was submitted
-                        - organization: The organization the commenter represents (if available)
-                        - comment_text: The full text of the comment
-                        - attachments: List of any attachment filenames and links (if available)
-                        - comment_id: The EPA comment ID (format EPA-HQ-OLEM-YYYY-XXXX-NNNN)
-                        """
-                    }
-                )
+        comment_data = comment_page.json
+        # Add the source URL to the comment data
+        comment_data["source_url"] = comment_link
+        return comment_data
 
-                if hasattr(comment_page, "json"):
-                    comment_data = comment_page.json
-                    # Add the source URL to the comment data
-                    comment_data["source_url"] = comment_link
-                    all_comments.append(comment_data)
-                    print(f"✅ Extracted data from comment: {comment_link}")
-                else:
-                    print(f"⚠️ Failed to extract JSON data from comment: {comment_link}")
+    def fetch_comments(self, comment_links):
+        """
+        Fetch comment pages, up to self.concurrency at a time
 
-            except Exception as e:
-                print(f"⚠️ Error processing comment {comment_link}: {str(e)}")
+        Args:
+            comment_links: Comment page URLs in listing order
+
+        Returns:
+            List of comment dictionaries in listing order; failed pages are
+            left out and summarised at the end
+        """
+        results = [None] * len(comment_links)
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(self.fetch_comment, link): i for i, link in enumerate(comment_links)}
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                comment_link = comment_links[i]
+                try:
+                    results[i] = future.result()
+                    if self.state:
+                        self.state.mark_fetched(comment_link, results[i])
+                    print(f"✅ [{done}/{len(comment_links)}] Extracted data from comment: {comment_link}")
+                except Exception as e:
+                    errors.append((comment_link, e))
+                    if self.state:
+                        self.state.mark_failed(comment_link, e)
+                    print(f"⚠️ [{done}/{len(comment_links)}] Error processing comment {comment_link}: {str(e)}")
+
+        if errors:
+            print(f"⚠️ {len(errors)} of {len(comment_links)} comments failed:")
+            for comment_link, error in errors:
+                print(f"   {comment_link}: {error}")
 
-        return all_comments
+        return [comment for comment in results if comment is not None]
 
     def save_to_json(self, data, filename):
         """Save data to a JSON file"""
@@ -192,28 +360,25 @@ class EPACommentScraper:
             json.dump(data, f, indent=2)
         return file_path
 
-    def save_to_csv_excel(self, data, base_filename):
-        """Save data to CSV and Excel files if it's a list of records"""
-        results = []
-
-        if not isinstance(data, list) or len(data) == 0:
-            print("⚠️ Data is not in the expected format for CSV/Excel export")
-            return results
-
-        # Convert to DataFrame
-        df = pd.DataFrame(data)
+    def save_records(self, records, base_filename):
+        """Save a list of comment records in the configured record format"""
+        file_path = os.path.join(self.output_dir, f"{base_filename}.{self.record_format}")
+        write_records(file_path, records)
+        return file_path
 
-        # Save to CSV
-        csv_path = os.path.join(self.output_dir, f"{base_filename}.csv")
-        df.to_csv(csv_path, index=False)
-        results.append(csv_path)
+    def save_exports(self, data, base_filename):
+        """
+        Save a list of records in each configured tabular format
 
-        # Save to Excel
-        excel_path = os.path.join(self.output_dir, f"{base_filename}.xlsx")
-        df.to_excel(excel_path, index=False)
-        results.append(excel_path)
+        Returns:
+            Dictionary of output file keys ("csv", "excel", "parquet") to paths
+        """
+        if not isinstance(data, list) or len(data) == 0:
+            print("⚠️ Data is not in the expected format for tabular export")
+            return {}
 
-        return results
+        paths = export_records(data, os.path.join(self.output_dir, base_filename), self.exports)
+        return {EXPORT_KEYS[fmt]: path for fmt, path in paths.items()}
 
     def process_url(self, url, wait_time=5000, max_comments=5):
         """
@@ -234,7 +399,18 @@ class EPACommentScraper:
         Returns:
             Dictionary with paths to output files
         """
-        url_id = url.split("/")[-2] if "/document/" in url else "unknown"
+        output_files, _ = self.process_docket(url, wait_time, max_comments)
+        return output_files
+
+    def process_docket(self, url, wait_time=5000, max_comments=5):
+        """
+        Same as process_url, but also returns the structured comments in memory
+
+        Returns:
+            (dictionary with paths to output files, list of comment dictionaries
+            or None if structured extraction failed)
+        """
+        url_id = url_file_id(url)
         base_filename = f"epa_{url_id}_{self.timestamp}"
 
         # Track output files
@@ -267,90 +443,95 @@ class EPACommentScraper:
             print(f"✅ Markdown content saved to {markdown_path}")
 
         # Step 2: Extract structured data
+        structured_data = None
         try:
             structured_data = self.extract_structured_data(url, max_comments=max_comments)
 
             # Save structured data to JSON
-            structured_json_path = self.save_to_json(
+            structured_json_path = self.save_records(
                 structured_data,
-                f"{base_filename}_structured.json"
+                f"{base_filename}_structured"
             )
             output_files["structured_json"] = structured_json_path
             print(f"✅ Structured data saved to {structured_json_path}")
 
-            # Save to CSV and Excel if possible
+            # Save to CSV, Excel and/or Parquet if possible
             try:
-                export_paths = self.save_to_csv_excel(structured_data, base_filename)
-                if export_paths:
-                    output_files["csv"] = export_paths[0]
-                    output_files["excel"] = export_paths[1]
-                    print(f"✅ Data exported to CSV: {export_paths[0]}")
-                    print(f"✅ Data exported to Excel: {export_paths[1]}")
+                export_paths = self.save_exports(structured_data, base_filename)
+                output_files.update(export_paths)
+                for key, path in export_paths.items():
+                    print(f"✅ Data exported to {key}: {path}")
             except Exception as e:
-                print(f"⚠️ Error creating CSV/Excel: {e}")
+                print(f"⚠️ Error creating tabular exports: {e}")
 
         except Exception as e:
             print(f"⚠️ Error extracting structured data: {e}")
 
-        return output_files
+        return output_files, structured_data
 
-    def process_multiple_urls(self, urls, wait_time=5000, max_comments=5):
+    def process_multiple_urls(self, urls, wait_time=5000, max_comments=5, workers=4):
         """
-        Process multiple URLs and combine results
+        Process multiple URLs concurrently and combine results
+
+        Dockets are scraped on a thread pool; every Firecrawl request still
+        goes through the scraper's shared rate limiter, so adding dockets
+        doesn't raise the request rate. Each docket's comments are kept in
+        memory and merged for the combined output in input order.
 
         Args:
             urls: List of URLs to process
             wait_time: Time to wait for dynamic content (ms)
             max_comments: Maximum number of comments to process per URL (default: 5, None for all)
+            workers: Number of dockets scraped at the same time
 
         Returns:
             Dictionary with paths to output files including combined results
         """
-        all_comments = []
         all_output_files = {"individual": {}, "combined": {}}
+        docket_comments = [None] * len(urls)
 
         # Process each URL
-        for url in tqdm(urls, desc="Processing URLs"):
-            url_output_files = self.process_url(url, wait_time, max_comments)
-            url_id = url.split("/")[-2] if "/document/" in url else "unknown"
-            all_output_files["individual"][url_id] = url_output_files
-
-            # Load structured data if available
-            if "structured_json" in url_output_files:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(urls)))) as executor:
+            futures = {executor.submit(self.process_docket, url, wait_time, max_comments): i for i, url in enumerate(urls)}
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Processing URLs"):
+                i = futures[future]
+                url = urls[i]
+                url_id = url_file_id(url)
                 try:
-                    with open(url_output_files["structured_json"], "r") as f:
-                        structured_data = json.load(f)
-
-                    # Add source URL to each comment
-                    if isinstance(structured_data, list):
-                        for comment in structured_data:
-                            comment["source_url"] = url
-                        all_comments.extend(structured_data)
+                    url_output_files, structured_data = future.result()
                 except Exception as e:
-                    print(f"⚠️ Error loading structured data from {url}: {e}")
+                    print(f"⚠️ Error processing {url}: {e}")
+                    continue
+                all_output_files["individual"][url_id] = url_output_files
+                docket_comments[i] = structured_data
+
+        # Merge in input order, tagging each comment with its docket URL
+        all_comments = []
+        for url, comments in zip(urls, docket_comments):
+            for comment in comments or []:
+                comment["source_url"] = url
+                all_comments.append(comment)
 
         # Save combined results if we have multiple URLs
         if len(urls) > 1 and all_comments:
             combined_filename = f"epa_combined_{self.timestamp}"
 
             # Save combined JSON
-            combined_json_path = self.save_to_json(
+            combined_json_path = self.save_records(
                 all_comments,
-                f"{combined_filename}.json"
+                combined_filename
             )
             all_output_files["combined"]["json"] = combined_json_path
             print(f"✅ Combined data saved to {combined_json_path}")
 
-            # Save combined CSV and Excel
+            # Save combined CSV, Excel and/or Parquet
             try:
-                export_paths = self.save_to_csv_excel(all_comments, combined_filename)
-                if export_paths:
-                    all_output_files["combined"]["csv"] = export_paths[0]
-                    all_output_files["combined"]["excel"] = export_paths[1]
-                    print(f"✅ Combined data exported to CSV: {export_paths[0]}")
-                    print(f"✅ Combined data exported to Excel: {export_paths[1]}")
+                export_paths = self.save_exports(all_comments, combined_filename)
+                all_output_files["combined"].update(export_paths)
+                for key, path in export_paths.items():
+                    print(f"✅ Combined data exported to {key}: {path}")
             except Exception as e:
-                print(f"⚠️ Error creating combined CSV/Excel: {e}")
+                print(f"⚠️ Error creating combined tabular exports: {e}")
 
         return all_output_files
 
@@ -374,16 +555,93 @@ def main():
         default=5000,
         help="Wait time in milliseconds for dynamic content"
     )
+    parser.add_argument(
+        "--format",
+        choices=["json", "jsonl", "jsonl.gz"],
+        default="json",
+        help="File format for structured comment records (default: json)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of comment pages fetched at the same time (default: 1)"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help="Maximum Firecrawl requests per second across all threads (default: no limit)"
+    )
     parser.add_argument(
         "--max-comments",
         type=int,
         default=5,
         help="Maximum number of comments to process per URL (default: 5, 0 for all)"
     )
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run: skip listing pages and comments already recorded in the scrape state"
+    )
+    mode_group.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Refresh a docket: stop paginating at the first already-scraped comment and fetch only new ones "
+             "(assumes the listing shows newest comments first)"
+    )
+    parser.add_argument(
+        "--state",
+        help=f"SQLite scrape state file (default: <output-dir>/{DEFAULT_STATE_FILENAME})"
+    )
+    parser.add_argument(
+        "--extraction",
+        choices=["html", "llm"],
+        default="llm",
+        help="How comment fields are extracted: always use the LLM, or parse the page HTML with LLM fallback "
+             "(default: llm; check the parser with comment_parser.py before switching)"
+    )
+    parser.add_argument(
+        "--export",
+        nargs="*",
+        choices=EXPORT_FORMATS,
+        default=["csv", "xlsx"],
+        help="Tabular exports written next to the JSON records (default: csv xlsx; parquet needs pyarrow; "
+             "pass no values to skip exports)"
+    )
+    parser.add_argument(
+        "--docket-workers",
+        type=int,
+        default=4,
+        help="Number of dockets scraped at the same time when several URLs are given (default: 4)"
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Serve every Firecrawl request from the local response cache; fail on a cache miss"
+    )
     args = parser.parse_args()
 
+    # Responses are cached unless FIRECRAWL_CACHE_PATH is set to an empty value
+    cache = get_default_cache()
+
+    # Progress is always recorded so an interrupted run can be resumed
+    state = ScrapeState(args.state or os.path.join(args.output_dir, DEFAULT_STATE_FILENAME))
+    mode = "resume" if args.resume else "incremental" if args.incremental else "full"
+
     # Initialize scraper
-    scraper = EPACommentScraper(output_dir=args.output_dir)
+    scraper = EPACommentScraper(
+        output_dir=args.output_dir,
+        record_format=args.format,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        state=state,
+        mode=mode,
+        cache=cache,
+        offline=args.offline,
+        extraction=args.extraction,
+        exports=args.export
+    )
 
     # Convert 0 to None for max_comments (to process all comments)
     max_comments = None if args.max_comments == 0 else args.max_comments
@@ -392,8 +650,12 @@ def main():
     if len(args.urls) == 1:
         scraper.process_url(args.urls[0], args.wait_time, max_comments)
     else:
-        scraper.process_multiple_urls(args.urls, args.wait_time, max_comments)
+        scraper.process_multiple_urls(args.urls, args.wait_time, max_comments, workers=args.docket_workers)
 
+    state.close()
+    if cache:
+        cache.print_stats()
+        cache.close()
     print("✅ Scraping completed successfully")
 
 if __name__ == "__main__":
@@ -1,123 +1,296 @@
 import os
 import json
-import requests
-import PyPDF2
-from io import BytesIO
-import time
+import queue
+import argparse
+import threading
 from tqdm import tqdm
+from attachment_downloader import AttachmentDownloader
+from attachment_manifest import AttachmentManifest, DEFAULT_MANIFEST_PATH, file_sha256
+from pdf_extraction import extract_pdf_files, extract_pdf_to_text_file
+from records import RecordWriter, existing_variant, iter_records
 
-def extract_pdf_text(pdf_content):
-    """Extract text from PDF content"""
-    try:
-        pdf_file = BytesIO(pdf_content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page_num in range(len(pdf_reader.pages)):
-            text += pdf_reader.pages[page_num].extract_text() + "\n"
-        return text
-    except Exception as e:
-        print(f"Error extracting text: {e}")
-        return ""
-
-def download_and_process_attachments():
-    # Create directories
-    os.makedirs('../data/attachments', exist_ok=True)
-    os.makedirs('../processed', exist_ok=True)
+DEFAULT_ATTACHMENTS_DIR = '../data/attachments'
 
-    # Load the comment data
-    input_file = '../processed/epa_comments_with_attachment_content_correct.json'
-    output_file = '../processed/comments_with_attachments_updated.json'
+def is_pdf_attachment(attachment):
+    link = attachment.get('link')
+    return bool(link and link.endswith('.pdf'))
 
-    with open(input_file, 'r') as f:
-        comments = json.load(f)
+def attachment_path(comment, attachment, attachments_dir=DEFAULT_ATTACHMENTS_DIR):
+    """Local path an attachment PDF is saved to"""
+    return os.path.join(attachments_dir, f"{comment['comment_id']}_{attachment.get('filename', '').replace(' ', '_')}.pdf")
 
-    # Track statistics
+def download_and_extract_attachments(comments, manifest, on_result, workers=8, rate=2.0, retries=3, extract_workers=None,
+                                     timeout=300, attachments_dir=DEFAULT_ATTACHMENTS_DIR):
+    """
+    Download every PDF attachment concurrently and extract its text in worker processes
+
+    comments can be any iterable (e.g. a stream from iter_records); only the
+    attachment links are kept from it.
+
+    Downloads run on a thread pool and hand each finished file to the
+    extraction pool straight away, so CPU-bound parsing never blocks the
+    network work. Extracted text is written next to each PDF as a .txt file
+    and every step is recorded in the manifest, so attachments finished by an
+    earlier run are skipped and only new or failed ones are fetched again.
+    A PDF with no extractable text is recorded as failed, so it is retried.
+
+    Args:
+        on_result: Called with ((comment index, attachment index), result) as
+            soon as each PDF attachment is done, possibly from the download
+            thread; result is the extracted text file path, or the exception
+            if downloading or extraction failed
+    """
+    # Collect every PDF download up front; attachments sharing a path are fetched once
+    jobs = []
+    job_by_path = {}
+    keys_by_job = []
+    for comment_index, comment in enumerate(comments):
+        for attachment_index, attachment in enumerate(comment.get('attachments') or []):
+            if not is_pdf_attachment(attachment):
+                continue
+
+            path = attachment_path(comment, attachment, attachments_dir)
+            if path not in job_by_path:
+                job_by_path[path] = len(jobs)
+                jobs.append((attachment['link'], path))
+                keys_by_job.append([])
+            keys_by_job[job_by_path[path]].append((comment_index, attachment_index))
+
+    def finish(job_index, result):
+        for key in keys_by_job[job_index]:
+            on_result(key, result)
+
+    # Skip work the manifest says is already done
+    downloaded = queue.Queue()
+    to_download = []
+    to_extract = []
+    for job_index, (link, path) in enumerate(jobs):
+        if manifest.is_extracted(path, link):
+            finish(job_index, manifest.get(path)['text_path'])
+        elif manifest.is_downloaded(path, link):
+            to_extract.append(job_index)
+            downloaded.put((job_index, path))
+        else:
+            to_download.append(job_index)
+
+    remaining = len(to_download) + len(to_extract)
+    print(f"{len(jobs) - remaining} of {len(jobs)} attachments already processed, "
+          f"{len(to_download)} to download, {len(to_extract)} to extract")
+
+    downloader = AttachmentDownloader(workers=workers, rate=rate, retries=retries)
+    progress = tqdm(total=remaining, desc="Downloading and extracting attachments")
+
+    def run_downloads():
+        try:
+            download_jobs = [jobs[job_index] for job_index in to_download]
+            for i, path, error in downloader.download_all(download_jobs):
+                job_index = to_download[i]
+                link = jobs[job_index][0]
+                if error:
+                    manifest.mark_failed(jobs[job_index][1], link, error)
+                    finish(job_index, error)
+                    progress.update(1)
+                else:
+                    manifest.mark_downloaded(path, link, file_sha256(path))
+                    downloaded.put((job_index, path))
+        finally:
+            downloaded.put(None)
+            downloader.close()
+
+    download_thread = threading.Thread(target=run_downloads, daemon=True)
+    download_thread.start()
+
+    try:
+        for job_index, text_path, error in extract_pdf_files(downloaded, extract_workers, timeout,
+                                                             extract=extract_pdf_to_text_file):
+            link, path = jobs[job_index]
+            if error:
+                manifest.mark_failed(path, link, error)
+            else:
+                manifest.mark_extracted(path, link, text_path)
+            finish(job_index, error if error else text_path)
+            progress.update(1)
+        download_thread.join()
+    finally:
+        progress.close()
+
+def add_attachment_contents(comment, comment_index, extracted):
+    """
+    Fill in a comment's attachment_contents and combined_text from extracted text files
+
+    Returns:
+        (attachments seen, attachments with text) for statistics
+    """
     total_attachments = 0
     processed_attachments = 0
 
-    # Process each comment
-    for comment in tqdm(comments, desc="Processing comments"):
-        if not comment.get('attachments'):
+    # Keep the original comment text unchanged
+    original_text = comment['comment_text']
+
+    # Create a new field for attachment contents
+    comment['attachment_contents'] = []
+
+    # Also maintain the combined text for vector search, joined once at the end
+    combined_parts = [original_text]
+
+    for attachment_index, attachment in enumerate(comment['attachments']):
+        total_attachments += 1
+        link = attachment.get('link')
+        if not is_pdf_attachment(attachment):
+            print(f"Skipping non-PDF attachment: {attachment.get('filename')}")
+            attachment['extracted_text'] = ""
+            comment['attachment_contents'].append({
+                'filename': attachment.get('filename', ''),
+                'text': ""
+            })
             continue
 
-        # Keep the original comment text unchanged
-        original_text = comment['comment_text']
+        try:
+            # The PDF was already downloaded and parsed; re-raise its error if either failed
+            text_path = extracted[(comment_index, attachment_index)]
+            if isinstance(text_path, Exception):
+                raise text_path
 
-        # Create a new field for attachment contents
-        comment['attachment_contents'] = []
+            with open(text_path, 'r', encoding='utf-8') as text_file:
+                extracted_text = text_file.read()
 
-        # Also maintain the combined text for vector search
-        combined_text = original_text
+            if extracted_text:
+                # Store the extracted text with the attachment
+                attachment['extracted_text'] = extracted_text
 
-        for attachment in comment['attachments']:
-            total_attachments += 1
-            link = attachment.get('link')
-            if not link or not link.endswith('.pdf'):
-                print(f"Skipping non-PDF attachment: {attachment.get('filename')}")
+                # Add to attachment contents collection
+                comment['attachment_contents'].append({
+                    'filename': attachment.get('filename', ''),
+                    'text': extracted_text
+                })
+
+                # Add to combined text for vector search
+                combined_parts.append(f"\n\n--- ATTACHMENT CONTENT: {attachment['filename']} ---\n\n")
+                combined_parts.append(extracted_text)
+
+                processed_attachments += 1
+                print(f"Added {len(extracted_text)} characters of text from {attachment['filename']}")
+            else:
                 attachment['extracted_text'] = ""
                 comment['attachment_contents'].append({
                     'filename': attachment.get('filename', ''),
                     'text': ""
                 })
-                continue
 
-            try:
-                # Download the PDF
-                print(f"Downloading {link}")
-                response = requests.get(link)
-                response.raise_for_status()
+        except Exception as e:
+            print(f"Error processing {link}: {e}")
+            attachment['extracted_text'] = ""
+            comment['attachment_contents'].append({
+                'filename': attachment.get('filename', ''),
+                'text': ""
+            })
 
-                # Save the PDF locally
-                filename = f"../data/attachments/{comment['comment_id']}_{attachment['filename'].replace(' ', '_')}.pdf"
-                with open(filename, 'wb') as pdf_file:
-                    pdf_file.write(response.content)
+    # Store the combined text in a new field
+    comment['combined_text'] = "".join(combined_parts)
 
-                # Extract text
-                extracted_text = extract_pdf_text(response.content)
+    return total_attachments, processed_attachments
 
-                if extracted_text:
-                    # Store the extracted text with the attachment
-                    attachment['extracted_text'] = extracted_text
+def download_and_process_attachments(workers=8, rate=2.0, retries=3, extract_workers=None, timeout=300,
+                                     manifest_path=DEFAULT_MANIFEST_PATH,
+                                     input_file='../processed/epa_comments_with_attachment_content_correct.json',
+                                     output_file='../processed/comments_with_attachments_updated.json',
+                                     attachments_dir=DEFAULT_ATTACHMENTS_DIR):
+    """Download and extract attachments, writing each comment as soon as its attachments are done
 
-                    # Add to attachment contents collection
-                    comment['attachment_contents'].append({
-                        'filename': attachment.get('filename', ''),
-                        'text': extracted_text
-                    })
+    input_file and output_file may be legacy JSON arrays or (compressed) JSON
+    Lines; the comments are streamed from disk twice rather than held in memory.
+    Downloads and extraction run in a background thread while comments are
+    written in input order, each one once all of its PDF attachments finish.
+    """
+    # Create directories
+    os.makedirs(attachments_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
 
-                    # Add to combined text for vector search
-                    combined_text += f"\n\n--- ATTACHMENT CONTENT: {attachment['filename']} ---\n\n"
-                    combined_text += extracted_text
+    # Load the comment data, preferring a converted JSON Lines copy
+    input_file = existing_variant(input_file)
+    print(f"Reading comments from {input_file}")
 
-                    processed_attachments += 1
-                    print(f"Added {len(extracted_text)} characters of text from {attachment['filename']}")
-                else:
-                    attachment['extracted_text'] = ""
-                    comment['attachment_contents'].append({
-                        'filename': attachment.get('filename', ''),
-                        'text': ""
-                    })
+    # Track statistics
+    total_attachments = 0
+    processed_attachments = 0
 
-                # Be nice to the server
-                time.sleep(1)
+    # Attachment results land here as they finish; the writer waits on each comment's
+    extracted = {}
+    ready = threading.Condition()
+    state = {'done': False, 'error': None}
 
-            except Exception as e:
-                print(f"Error processing {link}: {e}")
-                attachment['extracted_text'] = ""
-                comment['attachment_contents'].append({
-                    'filename': attachment.get('filename', ''),
-                    'text': ""
-                })
+    def on_result(key, result):
+        with ready:
+            extracted[key] = result
+            ready.notify_all()
+
+    manifest = AttachmentManifest(manifest_path)
 
-        # Store the combined text in a new field
-        comment['combined_text'] = combined_text
+    def run_attachments():
+        try:
+            download_and_extract_attachments(iter_records(input_file), manifest, on_result, workers, rate, retries,
+                                             extract_workers, timeout, attachments_dir)
+        except Exception as e:
+            state['error'] = e
+        finally:
+            with ready:
+                state['done'] = True
+                ready.notify_all()
 
-    # Save the updated comments
-    with open(output_file, 'w') as f:
-        json.dump(comments, f, indent=2)
+    attachment_thread = threading.Thread(target=run_attachments, daemon=True)
+    attachment_thread.start()
+
+    try:
+        # Write each comment as soon as it is assembled, so attachment text is
+        # only held for one comment at a time
+        with RecordWriter(output_file) as writer:
+            for comment_index, comment in enumerate(iter_records(input_file)):
+                if comment.get('attachments'):
+                    keys = [(comment_index, attachment_index)
+                            for attachment_index, attachment in enumerate(comment['attachments'])
+                            if is_pdf_attachment(attachment)]
+                    with ready:
+                        ready.wait_for(lambda: state['done'] or all(key in extracted for key in keys))
+                        results = {key: extracted.pop(key) for key in keys if key in extracted}
+                    if len(results) < len(keys):
+                        raise RuntimeError("Attachment processing stopped before every comment was written") \
+                            from state['error']
+
+                    seen, with_text = add_attachment_contents(comment, comment_index, results)
+                    total_attachments += seen
+                    processed_attachments += with_text
+
+                writer.write(comment)
+                writer.flush()
+
+        attachment_thread.join()
+        if state['error']:
+            raise state['error']
+        print(f"Attachment manifest: {manifest.status_counts()}")
+    finally:
+        # After an interrupt the daemon thread may still be using the manifest
+        if not attachment_thread.is_alive():
+            manifest.close()
 
     print(f"Processed {processed_attachments} of {total_attachments} attachments")
     print(f"Enhanced comments saved to {output_file}")
 
 if __name__ == "__main__":
-    download_and_process_attachments()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Download EPA comment attachments and extract their text')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent downloads')
+    parser.add_argument('--rate', type=float, default=2.0, help='Requests per second allowed per host')
+    parser.add_argument('--retries', type=int, default=3, help='Retries per attachment after a failed download')
+    parser.add_argument('--extract-workers', type=int, help='Processes for PDF text extraction (default: CPU count)')
+    parser.add_argument('--timeout', type=float, default=300, help='Seconds allowed to extract text from one PDF')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH,
+                        help='SQLite manifest recording finished attachments, so reruns skip them')
+    parser.add_argument('--input', default='../processed/epa_comments_with_attachment_content_correct.json',
+                        help='Comments file (.json array or .jsonl/.jsonl.gz)')
+    parser.add_argument('--output', default='../processed/comments_with_attachments_updated.json',
+                        help='Output file; use .jsonl or .jsonl.gz for JSON Lines')
+    parser.add_argument('--attachments-dir', default=DEFAULT_ATTACHMENTS_DIR,
+                        help='Directory the PDFs and their extracted .txt files are saved to')
+    args = parser.parse_args()
+
+    download_and_process_attachments(args.workers, args.rate, args.retries, args.extract_workers, args.timeout,
+                                     args.manifest, args.input, args.output, args.attachments_dir)
\ No newline at end of file
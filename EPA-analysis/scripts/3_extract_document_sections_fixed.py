@@ -1,152 +1,146 @@
 import os
 import re
+import glob
 import uuid
 import json
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from bisect import bisect_left, bisect_right
 from pathlib import Path
+from section_tree import build_section_tree, load_sections, normalize_markdown, strip_span, heading_line_starts
+from attachment_manifest import file_sha256
+from records import RecordWriter
+
+DEFAULT_BATCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processed', 'document_sections')
+BATCH_MANIFEST = 'manifest.json'
+
+# Compiled once; each is matched at a line start found by the tokenizer, so none needs ^
+GENERAL_INFORMATION_HEADINGS = ('### I. General Information', '# I. General Information')
+HEADING_STYLES = (
+    # (main section pattern, subsection pattern); "#" is the fallback when no "###" main sections exist
+    (re.compile(r'### ([IVXLCDM]+)\.\s+([^\n]+)'), re.compile(r'#### ([A-Z])\.\s+([^\n]+)')),
+    (re.compile(r'# ([IVXLCDM]+)\.\s+([^\n]+)'), re.compile(r'# ([A-Z])\.\s+([^\n]+)')),
+)
+REGULATORY_MARKER = re.compile(r'# PART \d+--')
+
+def match_headings(pattern, text, positions, end=None):
+    """
+    Match pattern at each heading line start in positions, in order
+
+    A heading's title may run onto the next line, so a line start inside the
+    previous match is skipped rather than matched as a heading of its own.
+    """
+    end = len(text) if end is None else end
+    matches = []
+    last_end = -1
+    for pos in positions:
+        if pos < last_end:
+            continue
+        match = pattern.match(text, pos, end)
+        if match:
+            matches.append(match)
+            last_end = match.end()
+    return matches
+
+def tokenize_sections(text):
+    """
+    Find the section tree of normalized markdown in one pass over its heading lines
+
+    The only full scan of the document collects the offsets of lines starting
+    with '#'; every heading rule is then tried at those offsets with a
+    precompiled pattern. No section text is copied: each node carries a
+    (start, end) span into text, already trimmed of surrounding whitespace.
+
+    Returns:
+        List of nodes in output order: dictionaries with section_number,
+        section_title, hierarchy_level, span and parent (index of the parent
+        node or None)
+    """
+    starts = heading_line_starts(text)
+    nodes = []
+
+    # Everything before "I. General Information" becomes the introduction
+    main_start = None
+    for heading in GENERAL_INFORMATION_HEADINGS:
+        main_start = next((pos for pos in starts if text.startswith(heading, pos)), None)
+        if main_start is not None:
+            break
+
+    if main_start is None:
+        nodes.append({'section_number': 'INTRO', 'section_title': 'Complete Document',
+                      'hierarchy_level': 0, 'span': strip_span(text, 0, len(text)), 'parent': None})
+        return nodes
+
+    intro_span = strip_span(text, 0, main_start)
+    if intro_span[0] < intro_span[1]:
+        nodes.append({'section_number': 'INTRO', 'section_title': 'Document Header and Supplementary Information',
+                      'hierarchy_level': 0, 'span': intro_span, 'parent': None})
+
+    candidates = starts[bisect_left(starts, main_start):]
+
+    # Main sections (I, II, III, ...) in the first heading style that has any; its subsections use the same style
+    mains, sub_pattern = [], None
+    for style_main_pattern, style_sub_pattern in HEADING_STYLES:
+        mains = match_headings(style_main_pattern, text, candidates)
+        if mains:
+            sub_pattern = style_sub_pattern
+            break
+
+    regulatory_starts = [pos for pos in candidates if REGULATORY_MARKER.match(text, pos)]
+
+    main_nodes = []
+    for i, match in enumerate(mains):
+        if i < len(mains) - 1:
+            end = mains[i + 1].start()
+        else:
+            # The last section stops at the regulatory text, if any
+            end = next((pos for pos in regulatory_starts if pos > match.start()), len(text))
+        main_nodes.append(len(nodes))
+        nodes.append({'section_number': match.group(1), 'section_title': match.group(2).strip(),
+                      'hierarchy_level': 1, 'span': strip_span(text, match.start(), end), 'parent': None})
+
+    # Subsections (A, B, C, ...) within each main section's span
+    for parent in main_nodes:
+        section_start, section_end = nodes[parent]['span']
+        section_starts = starts[bisect_left(starts, section_start):bisect_left(starts, section_end)]
+        subs = match_headings(sub_pattern, text, section_starts, section_end)
+
+        for j, match in enumerate(subs):
+            end = subs[j + 1].start() if j < len(subs) - 1 else section_end
+            nodes.append({'section_number': match.group(1), 'section_title': match.group(2).strip(),
+                          'hierarchy_level': 2, 'span': strip_span(text, match.start(), end), 'parent': parent})
+
+    # Regulatory text runs from the first PART marker to the next heading line
+    if regulatory_starts:
+        start = regulatory_starts[0]
+        end = next((pos for pos in starts[bisect_right(starts, start):]), len(text))
+        nodes.append({'section_number': 'REGULATORY', 'section_title': 'Regulatory Text Amendments',
+                      'hierarchy_level': 1, 'span': strip_span(text, start, end), 'parent': None})
+
+    return nodes
 
 def extract_epa_sections_fixed(markdown_text):
     """
     Extract sections from EPA Federal Register markdown, properly handling the introductory content.
     Everything before "I. General Information" gets consolidated into a single intro section.
     """
-    sections = []
+    text = normalize_markdown(markdown_text)
+    nodes = tokenize_sections(text)
 
-    # Split the markdown by pages and normalize
-    pages = re.split(r'---\n', markdown_text)
-    text = '\n'.join(pages)
-    text = re.sub(r'\r\n', '\n', text)
-
-    # Find the start of "I. General Information"
-    main_sections_start = re.search(r'^### I\. General Information', text, re.MULTILINE)
-    if not main_sections_start:
-        # Try alternative patterns
-        main_sections_start = re.search(r'^# I\. General Information', text, re.MULTILINE)
-
-    if main_sections_start:
-        # Everything before "I. General Information" becomes the introduction
-        intro_text = text[:main_sections_start.start()].strip()
-        remaining_text = text[main_sections_start.start():]
-
-        if intro_text:
-            # Create consolidated introduction section
-            intro_section = {
-                'section_id': str(uuid.uuid4()),
-                'section_number': 'INTRO',
-                'section_title': 'Document Header and Supplementary Information',
-                'section_text': intro_text,
-                'hierarchy_level': 0,
-                'parent_section_id': None
-            }
-            sections.append(intro_section)
-    else:
-        # If we can't find the main sections, treat the whole document as intro
-        remaining_text = text
-        intro_section = {
-            'section_id': str(uuid.uuid4()),
-            'section_number': 'INTRO',
-            'section_title': 'Complete Document',
-            'section_text': text.strip(),
-            'hierarchy_level': 0,
-            'parent_section_id': None
-        }
-        sections.append(intro_section)
-        return sections
-
-    # Now parse the main numbered sections (I, II, III, etc.)
-    main_section_pattern = r'^### ([IVXLCDM]+)\.\s+([^\n]+)'
-    sub_section_pattern = r'^#### ([A-Z])\.\s+([^\n]+)'
-
-    # Find all main sections
-    main_sections = list(re.finditer(main_section_pattern, remaining_text, re.MULTILINE))
-
-    # If no main sections found with ###, try with #
-    if not main_sections:
-        main_section_pattern = r'^# ([IVXLCDM]+)\.\s+([^\n]+)'
-        sub_section_pattern = r'^# ([A-Z])\.\s+([^\n]+)'
-        main_sections = list(re.finditer(main_section_pattern, remaining_text, re.MULTILINE))
-
-    parent_sections = {}  # Store section_id by section number for parent lookup
-
-    # Process main sections
-    for i, match in enumerate(main_sections):
-        section_number = match.group(1)
-        section_title = match.group(2).strip()
-        start_pos = match.start()
-
-        # Determine where this section ends
-        if i < len(main_sections) - 1:
-            end_pos = main_sections[i + 1].start()
-        else:
-            # For the last section, find regulatory text or end of document
-            regulatory_text = re.search(r'^# PART \d+--', remaining_text[start_pos:], re.MULTILINE)
-            if regulatory_text:
-                end_pos = start_pos + regulatory_text.start()
-            else:
-                end_pos = len(remaining_text)
-
-        # Extract section text
-        section_text = remaining_text[start_pos:end_pos].strip()
-
-        # Create main section
-        section_id = str(uuid.uuid4())
-        section = {
+    # Section text is only copied out of the document here, once per section
+    section_ids = [str(uuid.uuid4()) for _ in nodes]
+    sections = []
+    for node, section_id in zip(nodes, section_ids):
+        start, end = node['span']
+        sections.append({
             'section_id': section_id,
-            'section_number': section_number,
-            'section_title': section_title,
-            'section_text': section_text,
-            'hierarchy_level': 1,
-            'parent_section_id': None
-        }
-
-        sections.append(section)
-        parent_sections[section_number] = section_id
-
-    # Now find and process subsections within each main section
-    for main_section in sections[1:]:  # Skip the intro section
-        section_text = main_section['section_text']
-        subsections = list(re.finditer(sub_section_pattern, section_text, re.MULTILINE))
-
-        for j, sub_match in enumerate(subsections):
-            sub_section_number = sub_match.group(1)
-            sub_section_title = sub_match.group(2).strip()
-            sub_start_pos = sub_match.start()
-
-            # Determine where this subsection ends
-            if j < len(subsections) - 1:
-                sub_end_pos = subsections[j + 1].start()
-            else:
-                sub_end_pos = len(section_text)
-
-            # Extract subsection text
-            subsection_text = section_text[sub_start_pos:sub_end_pos].strip()
-
-            # Create subsection
-            subsection = {
-                'section_id': str(uuid.uuid4()),
-                'section_number': sub_section_number,
-                'section_title': sub_section_title,
-                'section_text': subsection_text,
-                'hierarchy_level': 2,
-                'parent_section_id': main_section['section_id']
-            }
-
-            sections.append(subsection)
-
-    # Add regulatory text section if it exists
-    regulatory_match = re.search(r'(^# PART \d+--.*?)(?=^#|\Z)', remaining_text, re.DOTALL | re.MULTILINE)
-    if regulatory_match:
-        regulatory_text = regulatory_match.group(1).strip()
-        regulatory_section = {
-            'section_id': str(uuid.uuid4()),
-            'section_number': 'REGULATORY',
-            'section_title': 'Regulatory Text Amendments',
-            'section_text': regulatory_text,
-            'hierarchy_level': 1,
-            'parent_section_id': None
-        }
-        sections.append(regulatory_section)
-
+            'section_number': node['section_number'],
+            'section_title': node['section_title'],
+            'section_text': text[start:end],
+            'hierarchy_level': node['hierarchy_level'],
+            'parent_section_id': section_ids[node['parent']] if node['parent'] is not None else None
+        })
     return sections
 
 def clean_sections(sections):
@@ -174,21 +168,222 @@ def clean_sections(sections):
 
     return cleaned_sections
 
+def resolve_inputs(patterns):
+    """Expand directories (every *.md inside) and glob patterns into a sorted, de-duplicated list of files"""
+    paths = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.md'))
+        elif glob.has_magic(pattern):
+            matches = glob.glob(pattern, recursive=True)
+        else:
+            matches = [pattern]
+        for path in sorted(matches):
+            paths.setdefault(os.path.abspath(path), path)
+    return list(paths.values())
+
+def document_id_for(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def extract_document(input_path, output_path, output_format):
+    """Extract one document to output_path (runs in a worker process); returns its section count by level"""
+    with open(input_path, 'r', encoding='utf-8') as f:
+        markdown_text = f.read()
+
+    if output_format == 'tree':
+        sections = build_section_tree(markdown_text)
+        payload = sections
+        sections = sections['sections']
+    else:
+        sections = payload = clean_sections(extract_epa_sections_fixed(markdown_text))
+
+    partial_path = f"{output_path}.part"
+    with open(partial_path, 'w', encoding='utf-8') as f:
+        if output_format == 'tree':
+            json.dump(payload, f)
+        else:
+            json.dump(payload, f, indent=2)
+    os.replace(partial_path, output_path)
+
+    level_counts = {}
+    for section in sections:
+        level_counts[section['hierarchy_level']] = level_counts.get(section['hierarchy_level'], 0) + 1
+    return level_counts
+
+def load_batch_manifest(output_dir):
+    path = os.path.join(output_dir, BATCH_MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_batch_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, BATCH_MANIFEST)
+    with open(f"{path}.part", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.part", path)
+
+def process_batch(input_paths, output_dir, output_format='sections', combined=None, workers=None, force=False):
+    """
+    Extract sections from many documents in a process pool
+
+    Each document is written to output_dir/<document_id>.json, where
+    document_id is the file name without its extension. A manifest in
+    output_dir keeps each document's content hash, so documents unchanged
+    since the last run (same hash and output format) are skipped.
+
+    Args:
+        input_paths: Markdown files to process
+        output_dir: Directory for per-document outputs and the manifest
+        output_format: "sections" or "tree" (see --format)
+        combined: Optional .jsonl/.jsonl.gz path collecting every section of
+            every document, each with a document_id field
+        workers: Worker processes (default: CPU count)
+        force: Reprocess documents even if unchanged
+
+    Returns:
+        Dictionary of {document_id: output path}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_batch_manifest(output_dir)
+
+    documents = {}
+    for path in input_paths:
+        document_id = document_id_for(path)
+        if document_id in documents:
+            raise ValueError(f"Two input documents are both named {document_id}: {documents[document_id]} and {path}")
+        documents[document_id] = path
+
+    pending = {}
+    skipped = 0
+    for document_id, path in documents.items():
+        content_hash = file_sha256(path)
+        output_path = os.path.join(output_dir, f"{document_id}.json")
+        entry = manifest.get(document_id)
+        if (not force and entry and entry['sha256'] == content_hash and entry['format'] == output_format
+                and os.path.exists(output_path)):
+            skipped += 1
+            continue
+        pending[document_id] = (path, output_path, content_hash)
+
+    print(f"{len(documents)} documents: {len(pending)} to extract, {skipped} unchanged since the last run")
+
+    failures = []
+    start = time.perf_counter()
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            futures = {
+                executor.submit(extract_document, path, output_path, output_format): document_id
+                for document_id, (path, output_path, _) in pending.items()
+            }
+            for future in as_completed(futures):
+                document_id = futures[future]
+                path, output_path, content_hash = pending[document_id]
+                try:
+                    level_counts = future.result()
+                except Exception as e:
+                    print(f"❌ {path}: {e}")
+                    failures.append(document_id)
+                    manifest.pop(document_id, None)
+                    continue
+                manifest[document_id] = {
+                    'source': os.path.abspath(path),
+                    'sha256': content_hash,
+                    'format': output_format,
+                    'output': os.path.abspath(output_path),
+                    'sections': sum(level_counts.values()),
+                }
+                print(f"✅ {document_id}: {sum(level_counts.values())} sections "
+                      f"(levels {', '.join(f'{level}: {count}' for level, count in sorted(level_counts.items()))})")
+                # Record progress as documents finish so an interrupted run keeps its work
+                save_batch_manifest(output_dir, manifest)
+
+    seconds = time.perf_counter() - start
+    print(f"Extracted {len(pending) - len(failures)} documents in {seconds:.1f}s, {len(failures)} failed")
+
+    outputs = {document_id: os.path.join(output_dir, f"{document_id}.json")
+               for document_id in documents if document_id not in failures}
+
+    if combined:
+        # Rebuilt from the per-document outputs, so skipped documents are included without re-parsing
+        with RecordWriter(combined) as writer:
+            for document_id, output_path in outputs.items():
+                for section in load_sections(output_path):
+                    writer.write({'document_id': document_id, **section})
+        print(f"Combined {writer.count} sections from {len(outputs)} documents into {combined}")
+
+    return outputs
+
+def write_section_tree(markdown_text, output):
+    """Save the full-depth section tree as spans and compare its size with the sections format"""
+    document = build_section_tree(markdown_text)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(document, f)
+
+    sections = document['sections']
+    print(f"Processed {len(sections)} sections from EPA document")
+    print(f"Output saved to {output}")
+
+    legacy_size = len(json.dumps(clean_sections(extract_epa_sections_fixed(markdown_text)), indent=2))
+    tree_size = os.path.getsize(output)
+    print(f"Tree JSON: {tree_size / 1024:.0f} KB vs {legacy_size / 1024:.0f} KB in the sections format "
+          f"({legacy_size / tree_size:.1f}x smaller)")
+
+    level_counts = {}
+    for section in sections:
+        level_counts[section['hierarchy_level']] = level_counts.get(section['hierarchy_level'], 0) + 1
+    print("\nSection hierarchy summary:")
+    for level, count in sorted(level_counts.items()):
+        print(f"Level {level}: {count} sections")
+
+    print("\nSection overview:")
+    for section in sections[:20]:
+        print(f"{'  ' * section['hierarchy_level']}{section['hierarchy_path']}: {section['section_title'][:80]}")
+
 def main():
     parser = argparse.ArgumentParser(description='Process EPA Federal Register document into structured sections with proper intro handling')
-    parser.add_argument('input_file', help='Path to the markdown file to process')
+    parser.add_argument('inputs', nargs='*', metavar='input',
+                        help='Markdown file to process; several files, directories or glob patterns run in batch mode')
     parser.add_argument('--output', '-o', help='Output JSON file path', default='../processed/epa_document_sections_fixed.json')
+    parser.add_argument('--format', choices=['sections', 'tree'], default='sections',
+                        help='sections: two-level list with copied section text (default); '
+                             'tree: every heading level, stored as spans into one copy of the document')
+    parser.add_argument('--output-dir', help=f'Batch mode: directory for per-document outputs (default: {DEFAULT_BATCH_DIR})')
+    parser.add_argument('--combined', help='Batch mode: also write every section to one .jsonl/.jsonl.gz file with a document_id field')
+    parser.add_argument('--workers', type=int, help='Batch mode: worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Batch mode: reprocess documents even if unchanged since the last run')
 
     args = parser.parse_args()
 
+    if not args.inputs:
+        parser.error('an input file is required')
+
+    input_paths = resolve_inputs(args.inputs)
+    batch = (args.output_dir or args.combined or len(input_paths) != 1
+             or any(os.path.isdir(pattern) or glob.has_magic(pattern) for pattern in args.inputs))
+    if batch:
+        if not input_paths:
+            parser.error(f"no documents match {' '.join(args.inputs)}")
+        try:
+            process_batch(input_paths, args.output_dir or DEFAULT_BATCH_DIR, args.format,
+                          args.combined, args.workers, args.force)
+        except ValueError as e:
+            parser.error(str(e))
+        return
+    input_file = input_paths[0]
+
     # Create output directory if it doesn't exist
     output_path = Path(args.output)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Read the markdown file
-    with open(args.input_file, 'r', encoding='utf-8') as f:
+    with open(input_file, 'r', encoding='utf-8') as f:
         markdown_text = f.read()
 
+    if args.format == 'tree':
+        write_section_tree(markdown_text, args.output)
+        return
+
     # Extract sections using the fixed EPA-specific extractor
     sections = extract_epa_sections_fixed(markdown_text)
 
@@ -1,145 +1,112 @@
 import os
-import json
-import openai
-import numpy as np
+import argparse
 import supabase
 from dotenv import load_dotenv
+from concurrent.futures import Future, ThreadPoolExecutor
 from tqdm import tqdm
+from embeddings import get_chunked_embeddings, print_cache_stats
+from records import existing_variant, iter_batches, iter_records
+from section_tree import load_sections
+from load_jobs import add_job_arguments, jobs_from_args
+from supabase_rows import section_levels, upsert_comment_batch, upsert_section_batch
 
 # Load environment variables
 load_dotenv()
 
-# Setup OpenAI and Supabase clients
-openai.api_key = os.getenv('OPENAI_API_KEY')
+# Setup Supabase client
 supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_SERVICE_KEY')
 sb_client = supabase.create_client(supabase_url, supabase_key)
 
-def get_embedding(text):
-    """Generate embedding vector for text using OpenAI's embedding API"""
-    if not text.strip():
-        return []
-
-    # Be more aggressive with truncation - 1 token is roughly 4 chars for English text
-    # Using 7000 tokens (instead of 8192) to be safe
-    max_tokens = 7000
-    max_chars = max_tokens * 4
-
-    if len(text) > max_chars:
-        # Truncate text to avoid exceeding token limit
-        text = text[:max_chars]
-        # Further ensure we're within limits by truncating at the last complete sentence
-        last_period = text.rfind('.')
-        if last_period > max_chars * 0.8:  # If we find a period in the last 20% of the text
-            text = text[:last_period + 1]
-
-    try:
-        response = openai.Embedding.create(
-            input=text,
-            model="text-embedding-ada-002"
-        )
-        return response['data'][0]['embedding']
-    except openai.error.InvalidRequestError as e:
-        # If we still hit token limits, truncate more aggressively
-        if "maximum context length" in str(e):
-            print(f"Warning: Text still too long, truncating more aggressively")
-            # Try with half the text
-            return get_embedding(text[:len(text)//2])
-        else:
-            # Re-raise if it's a different error
-            raise
-
-def upsert_documents_to_supabase(documents, proposal_id, batch_size=10):
-    """Insert documents into Supabase with embeddings"""
-    for i in tqdm(range(0, len(documents), batch_size), desc="Uploading batches to Supabase"):
-        batch = documents[i:i+batch_size]
-
-        # Prepare batch data
-        rows = []
-        for doc in batch:
-            # Use combined_text for embedding if available, otherwise use comment_text
-            text_for_embedding = doc.get('combined_text', doc['comment_text'])
-            embedding = get_embedding(text_for_embedding)
-
-            # Prepare row data
-            row = {
-                'comment_id': doc['comment_id'],
-                'commenter_name': doc['commenter_name'],
-                'organization': doc.get('organization', ''),
-                'comment_date': doc['comment_date'],
-                'comment_text': doc['comment_text'],
-                'has_attachments': len(doc.get('attachments', [])) > 0,
-                'attachment_count': len(doc.get('attachment_contents', [])),
-                'attachment_contents': json.dumps(doc.get('attachment_contents', [])),
-                'combined_text': doc.get('combined_text', doc['comment_text']),
-                'source_url': doc.get('source_url', ''),
-                'embedding': embedding,
-                'proposal_id': proposal_id
-            }
-            rows.append(row)
-
-        # Upsert batch to Supabase
-        try:
-            result = sb_client.table('epa_comments').upsert(rows).execute()
-            if hasattr(result, 'error') and result.error:
-                print(f"Error uploading batch: {result.error}")
-        except Exception as e:
-            print(f"Error uploading batch: {e}")
-
-def insert_document_sections(sections, proposal_id, batch_size=10):
-    """Insert document sections into Supabase with embeddings"""
-    for i in tqdm(range(0, len(sections), batch_size), desc="Uploading section batches to Supabase"):
-        batch = sections[i:i+batch_size]
-
-        # Prepare batch data
-        rows = []
-        for section in batch:
-            embedding = get_embedding(section['section_text'])
-
-            # Prepare row data
-            row = {
-                'section_id': section['section_id'],
-                'section_number': section.get('section_number', ''),
-                'section_title': section.get('section_title', ''),
-                'section_text': section['section_text'],
-                'parent_section_id': section.get('parent_section_id'),
-                'hierarchy_level': section.get('hierarchy_level', 1),
-                'hierarchy_path': section.get('hierarchy_path', ''),
-                'proposal_id': proposal_id
-            }
-
-            # Only add embedding if it's not empty
-            if embedding:
-                row['embedding'] = embedding
-
-            rows.append(row)
-
-        # Upsert batch to Supabase
-        try:
-            result = sb_client.table('document_sections').upsert(rows).execute()
-            if hasattr(result, 'error') and result.error:
-                print(f"Error uploading batch: {result.error}")
-        except Exception as e:
-            print(f"Error uploading batch: {e}")
-
-def load_document_sections():
+def submit_uploads(upload_pool, upload, batches):
+    """
+    Start upload(*args) for each args tuple in batches on upload_pool
+
+    Without a pool the uploads run right away. Returns the futures to pass to
+    wait_uploads.
+    """
+    if upload_pool is None:
+        futures = []
+        for args in batches:
+            future = Future()
+            future.set_result(upload(*args))
+            futures.append(future)
+        return futures
+    return [upload_pool.submit(upload, *args) for args in batches]
+
+def wait_uploads(futures):
+    """Wait for uploads started by submit_uploads; returns how many of them failed"""
+    return sum(1 for future in futures if not future.result())
+
+def upsert_documents_to_supabase(documents, proposal_id, batch_size=10, embed_batch_size=500, upload_pool=None):
+    """Insert documents into Supabase with embeddings
+
+    documents can be any iterable, e.g. a stream from iter_records. Embeddings
+    for embed_batch_size documents are requested together, then uploaded in
+    batches of batch_size. With an upload_pool, a group's uploads run there
+    while the next group is embedded.
+
+    Returns:
+        Number of upload batches that failed
+    """
+    failed = 0
+    pending = []
+    for group in tqdm(iter_batches(documents, embed_batch_size), desc=f"Uploading comment batches for {proposal_id}"):
+        # Use combined_text for embedding if available, otherwise use comment_text; all of it is
+        # embedded in chunks, so attachments past the first pages count too
+        embedded = get_chunked_embeddings([doc.get('combined_text', doc['comment_text']) for doc in group])
+
+        # Only one group waits for upload at a time
+        failed += wait_uploads(pending)
+        pending = submit_uploads(upload_pool, upsert_comment_batch,
+                                 [(sb_client, group[j:j+batch_size], embedded[j:j+batch_size], proposal_id)
+                                  for j in range(0, len(group), batch_size)])
+    return failed + wait_uploads(pending)
+
+def insert_document_sections(sections, proposal_id, batch_size=10, upload_pool=None):
+    """
+    Insert document sections into Supabase with embeddings
+
+    Each level of the section tree is uploaded once the level above it is
+    stored, since sections reference their parent; its batches share the
+    upload_pool. A failed batch stops the upload before its subsections.
+
+    Returns:
+        True if every section was stored
+    """
+    levels = section_levels(sections)
+    # Sections are few enough to embed up front in a handful of requests
+    embedded = get_chunked_embeddings([section['section_text'] for level in levels for section in level])
+
+    print(f"Uploading {len(sections)} sections in {len(levels)} levels for {proposal_id}")
+    start = 0
+    for depth, level in enumerate(levels):
+        vectors = embedded[start:start+len(level)]
+        start += len(level)
+        batches = [(sb_client, level[i:i+batch_size], vectors[i:i+batch_size], proposal_id)
+                   for i in range(0, len(level), batch_size)]
+        failed = wait_uploads(submit_uploads(upload_pool, upsert_section_batch, batches))
+        if failed:
+            print(f"{failed} of {len(batches)} section batches at depth {depth} failed for {proposal_id}")
+            return False
+    return True
+
+def load_document_sections(sections_file, proposal_id, batch_size=10, upload_pool=None):
     """Load document sections from JSON file and upload to Supabase"""
-    sections_file = 'processed/epa_document_sections_fixed.json'
-    proposal_id = 'f8a686ba-fe45-48b7-a85f-df31540bb7d9'
-
     print(f"Loading document sections from {sections_file}")
     print(f"Using proposal ID: {proposal_id}")
 
     try:
-        with open(sections_file, 'r') as f:
-            sections = json.load(f)
+        sections = load_sections(existing_variant(sections_file))
 
         print(f"Found {len(sections)} document sections to load")
 
         # Upload sections to Supabase with the specific proposal ID
-        insert_document_sections(sections, proposal_id)
+        if not insert_document_sections(sections, proposal_id, batch_size, upload_pool):
+            print(f"Document sections for {proposal_id} were not all uploaded")
+            return False
 
-        print("Document sections uploaded successfully!")
+        print(f"Document sections for {proposal_id} uploaded successfully!")
         return True
     except FileNotFoundError:
         print(f"Document sections file not found: {sections_file}")
@@ -148,64 +115,70 @@ def load_document_sections():
         print(f"Error loading document sections: {e}")
         return False
 
-def main():
-    print("Welcome to the EPA comment and document loader")
-    print("1. Load document sections")
-    print("2. Load comments")
-    print("3. Load both document sections and comments")
-    print("4. Exit")
-
-    # Define the proposal ID for both document sections and comments
-    proposal_id = 'f8a686ba-fe45-48b7-a85f-df31540bb7d9'
-
-    choice = input("Enter your choice (1-4): ")
-
-    if choice == '1':
-        load_document_sections()
-    elif choice == '2':
-        # Load the enhanced comments with attachment content
-        comments_file = 'processed/epa_comments_with_attachment_content_correct.json'
-        print(f"Loading comments from {comments_file}")
-        print(f"Using proposal ID: {proposal_id}")
-
-        with open(comments_file, 'r') as f:
-            comments = json.load(f)
-
-        print(f"Found {len(comments)} comments to load")
-
-        # Count comments with attachments
-        comments_with_attachments = sum(1 for c in comments if len(c.get('attachment_contents', [])) > 0)
-        print(f"Of these, {comments_with_attachments} comments have attachments")
-
-        # Upload comments to Supabase
-        upsert_documents_to_supabase(comments, proposal_id)
-
-        print("Comments uploaded successfully!")
-    elif choice == '3':
-        success = load_document_sections()
-        if success:
-            # Load comments after sections are loaded
-            comments_file = 'processed/epa_comments_with_attachment_content_correct.json'
-            print(f"Loading comments from {comments_file}")
-            print(f"Using proposal ID: {proposal_id}")
+def load_comments(comments_file, proposal_id, batch_size=10, embed_batch_size=500, upload_pool=None):
+    """Stream comments from a JSON or JSON Lines file and upload them to Supabase"""
+    comments_file = existing_variant(comments_file)
+    print(f"Loading comments from {comments_file}")
+    print(f"Using proposal ID: {proposal_id}")
 
-            with open(comments_file, 'r') as f:
-                comments = json.load(f)
+    # Count while streaming so the file is only read once
+    counts = {'comments': 0, 'with_attachments': 0}
 
-            print(f"Found {len(comments)} comments to load")
+    def counted(comments):
+        for comment in comments:
+            counts['comments'] += 1
+            if len(comment.get('attachment_contents', [])) > 0:
+                counts['with_attachments'] += 1
+            yield comment
 
-            # Count comments with attachments
-            comments_with_attachments = sum(1 for c in comments if len(c.get('attachment_contents', [])) > 0)
-            print(f"Of these, {comments_with_attachments} comments have attachments")
+    # Upload comments to Supabase
+    try:
+        failed = upsert_documents_to_supabase(counted(iter_records(comments_file)), proposal_id,
+                                              batch_size, embed_batch_size, upload_pool)
+    except FileNotFoundError:
+        print(f"Comments file not found: {comments_file}")
+        return False
+    except Exception as e:
+        # A bad record or a failed request ends this proposal's load, not the others'
+        print(f"Error loading comments for {proposal_id}: {e}")
+        return False
 
-            # Upload comments to Supabase
-            upsert_documents_to_supabase(comments, proposal_id)
+    print(f"Loaded {counts['comments']} comments for {proposal_id}")
+    print(f"Of these, {counts['with_attachments']} comments have attachments")
+    if failed:
+        # Rows are upserted, so running the load again is safe
+        print(f"{failed} comment batches failed to upload; run the load again to retry them")
+        return False
+    print("Comments uploaded successfully!")
+    return True
+
+def load_proposal(job, batch_size=10, embed_batch_size=500, upload_pool=None):
+    """Load the sections and then the comments of one {'proposal_id', 'sections', 'comments'} job"""
+    if job['sections']:
+        if not load_document_sections(job['sections'], job['proposal_id'], batch_size, upload_pool):
+            # Comments are matched against the sections, so don't load them without
+            return False
+    if job['comments']:
+        return load_comments(job['comments'], job['proposal_id'], batch_size, embed_batch_size, upload_pool)
+    return True
 
-            print("Comments uploaded successfully!")
-    elif choice == '4':
-        print("Exiting...")
-    else:
-        print("Invalid choice. Exiting...")
+def main():
+    parser = argparse.ArgumentParser(description='Upload comments and document sections to Supabase with embeddings')
+    add_job_arguments(parser, 'Upsert requests in flight at once, shared by all proposals (default: 4)')
+    args = parser.parse_args()
+    jobs = jobs_from_args(parser, args)
+
+    # One Supabase client and embedding cache serve every proposal; the upload pool caps the requests in flight
+    with ThreadPoolExecutor(max_workers=args.workers) as upload_pool:
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            results = list(executor.map(
+                lambda job: load_proposal(job, args.batch_size, args.embed_batch_size, upload_pool), jobs))
+
+    print_cache_stats()
+    failed = [job['proposal_id'] for job, ok in zip(jobs, results) if not ok]
+    if failed:
+        print(f"Loading failed for {len(failed)} of {len(jobs)} proposals: {', '.join(failed)}")
+        raise SystemExit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
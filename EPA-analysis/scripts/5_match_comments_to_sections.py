@@ -1,9 +1,15 @@
 import os
 import json
+import time
+import argparse
 import supabase
 import numpy as np
 from dotenv import load_dotenv
 from tqdm import tqdm
+from section_index import load_or_build_index, recall_report
+from section_matching import (build_embedding_matrix, build_proposal_mask, fetch_server_matches, parse_embedding,
+                              server_match_records, top_k_chunk_matches, top_k_section_matches)
+from supabase_rows import fetch_all_rows
 
 # Load environment variables
 load_dotenv()
@@ -13,44 +19,6 @@ supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_SERVICE_KEY')
 sb_client = supabase.create_client(supabase_url, supabase_key)
 
-def vector_search_similarity(comment_embedding, section_embedding):
-    """Calculate cosine similarity between two embedding vectors"""
-    if not comment_embedding or not section_embedding:
-        return 0.0
-
-    # Check if embeddings are strings (from database) and convert to lists
-    if isinstance(comment_embedding, str):
-        try:
-            # Try parsing as a JSON string
-            comment_embedding = json.loads(comment_embedding)
-        except:
-            # If not JSON, try parsing as a string representation of a list
-            comment_embedding = comment_embedding.strip('[]').split(',')
-            comment_embedding = [float(x.strip()) for x in comment_embedding if x.strip()]
-
-    if isinstance(section_embedding, str):
-        try:
-            # Try parsing as a JSON string
-            section_embedding = json.loads(section_embedding)
-        except:
-            # If not JSON, try parsing as a string representation of a list
-            section_embedding = section_embedding.strip('[]').split(',')
-            section_embedding = [float(x.strip()) for x in section_embedding if x.strip()]
-
-    # Convert to numpy arrays
-    vec1 = np.array(comment_embedding, dtype=np.float32)
-    vec2 = np.array(section_embedding, dtype=np.float32)
-
-    # Calculate cosine similarity
-    dot_product = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-
-    return dot_product / (norm1 * norm2)
-
 def build_section_hierarchy(sections):
     """Build a map of section hierarchy relationships"""
     # Create a map of section_id to its details
@@ -151,86 +119,174 @@ def filter_hierarchical_matches(matches, section_map, ancestor_map):
 
     return filtered_matches
 
-def match_comments_to_sections(proposal_id=None, threshold=0.75, max_matches=5):
-    """Match EPA comments to document sections based on vector similarity"""
+def fetch_table(table, key_field, columns='*', proposal_id=None):
+    """Fetch every row of a table ordered by its key, optionally limited to one proposal"""
+    def query():
+        query = sb_client.table(table).select(columns)
+        if proposal_id:
+            query = query.eq('proposal_id', proposal_id)
+        return query.order(key_field)
 
+    return fetch_all_rows(query)
+
+def fetch_comments_and_sections(proposal_id=None):
+    """Fetch comments and document sections, optionally limited to one proposal"""
     if proposal_id:
         print(f"Fetching comments for proposal {proposal_id} from Supabase...")
-        comments_response = sb_client.table('epa_comments').select('*').eq('proposal_id', proposal_id).execute()
+        comments = fetch_table('epa_comments', 'comment_id', proposal_id=proposal_id)
 
         print(f"Fetching document sections for proposal {proposal_id} from Supabase...")
-        sections_response = sb_client.table('document_sections').select('*').eq('proposal_id', proposal_id).execute()
+        sections = fetch_table('document_sections', 'section_id', proposal_id=proposal_id)
     else:
         print("Fetching all comments from Supabase...")
-        comments_response = sb_client.table('epa_comments').select('*').execute()
+        comments = fetch_table('epa_comments', 'comment_id')
 
         print("Fetching all document sections from Supabase...")
-        sections_response = sb_client.table('document_sections').select('*').execute()
-
-    comments = comments_response.data
-    sections = sections_response.data
+        sections = fetch_table('document_sections', 'section_id')
+
+    return comments, sections
+
+def build_comment_and_section_matrices(comments, sections):
+    """Parse every embedding once into normalized comment and section matrices"""
+    comment_vectors = [parse_embedding(comment['embedding']) for comment in comments]
+    section_vectors = [parse_embedding(section['embedding']) for section in sections]
+    dim = max((len(vector) for vector in comment_vectors + section_vectors), default=0)
+    return build_embedding_matrix(comment_vectors, dim), build_embedding_matrix(section_vectors, dim)
+
+def fetch_chunks(table, key_field, proposal_id=None):
+    """Fetch stored chunk embeddings, optionally limited to one proposal"""
+    def query():
+        query = sb_client.table(table).select(f'{key_field},chunk_index,embedding')
+        if proposal_id:
+            query = query.eq('proposal_id', proposal_id)
+        # A long proposal has far more chunks than one response holds
+        return query.order(key_field).order('chunk_index')
+
+    return fetch_all_rows(query)
+
+def build_chunk_matrix(items, key_field, chunk_rows, dim):
+    """Stack each item's chunk embeddings, in item order, into a normalized matrix plus row offsets
+
+    Items without stored chunks (uploaded before chunking) use their own embedding as a single chunk.
+    """
+    grouped = {}
+    for row in sorted(chunk_rows, key=lambda row: row['chunk_index']):
+        grouped.setdefault(row[key_field], []).append(parse_embedding(row['embedding']))
+
+    vectors = []
+    offsets = [0]
+    for item in items:
+        vectors.extend(grouped.get(item[key_field]) or [parse_embedding(item['embedding'])])
+        offsets.append(len(vectors))
+    return build_embedding_matrix(vectors, dim), np.array(offsets)
+
+def python_matches(proposal_id=None, threshold=0.75, max_matches=5, index='exact', nlist=None, nprobe=8,
+                   similarity='pooled', data=None):
+    """Score comments against sections in Python after fetching both with their embeddings
+
+    Args:
+        data: Optional (comments, sections) already returned by fetch_comments_and_sections
+
+    Returns:
+        (matches, sections): one {'comment_id', 'section_id', 'similarity_score',
+        'proposal_id'} dictionary per raw match, and the sections
+    """
+    comments, sections = data or fetch_comments_and_sections(proposal_id)
 
     print(f"Matching {len(comments)} comments to {len(sections)} sections...")
 
     if proposal_id:
         print(f"All matching will be within proposal: {proposal_id}")
 
-    # Build section hierarchy maps
-    print("Building section hierarchy maps...")
-    section_map, parent_child_map, ancestor_map = build_section_hierarchy(sections)
+    # Parse every embedding once into normalized matrices
+    print("Building embedding matrices...")
+    comment_matrix, section_matrix = build_comment_and_section_matrices(comments, sections)
+
+    if similarity == 'max-chunk':
+        if index == 'ivf':
+            print("Max-over-chunks similarity uses exact search")
+        print("Fetching chunk embeddings...")
+        dim = comment_matrix.shape[1]
+        comment_chunks, comment_offsets = build_chunk_matrix(
+            comments, 'comment_id', fetch_chunks('epa_comment_chunks', 'comment_id', proposal_id), dim)
+        section_chunks, section_offsets = build_chunk_matrix(
+            sections, 'section_id', fetch_chunks('document_section_chunks', 'section_id', proposal_id), dim)
+        print(f"Scoring {comment_chunks.shape[0]} comment chunks against {section_chunks.shape[0]} section chunks...")
+        pair_mask = build_proposal_mask(comments, sections)
+        matches_by_comment = top_k_chunk_matches(comment_chunks, comment_offsets, section_chunks, section_offsets,
+                                                 threshold, max_matches, pair_mask)
+    elif index == 'ivf' and proposal_id and sections:
+        section_index = load_or_build_index(proposal_id, section_matrix, [s['section_id'] for s in sections],
+                                            nlist=nlist, nprobe=nprobe)
+        print(f"Searching IVF index ({section_index.nlist} lists, nprobe={nprobe})...")
+        matches_by_comment = section_index.search(comment_matrix, section_matrix, threshold, max_matches, nprobe)
+    else:
+        if index == 'ivf':
+            print("IVF index needs a proposal_id, using exact search")
+        pair_mask = build_proposal_mask(comments, sections)
+        matches_by_comment = top_k_section_matches(comment_matrix, section_matrix, threshold, max_matches, pair_mask)
 
     # Create a list to store matches
     all_matches = []
 
     # Process each comment
-    for comment in tqdm(comments, desc="Processing comments"):
+    for comment_index, top_matches in tqdm(matches_by_comment, total=len(comments), desc="Processing comments"):
+        comment = comments[comment_index]
         # Use the string comment_id field (not the UUID id field)
         comment_str_id = comment['comment_id']
-        comment_embedding = comment['embedding']
         comment_proposal_id = comment.get('proposal_id')
 
-        # Find matching sections
-        section_matches = []
-        for section in sections:
-            section_id = section['section_id']
-            section_title = section.get('section_title', '')
-            section_number = section.get('section_number', '')
-            section_embedding = section['embedding']
-            section_proposal_id = section.get('proposal_id')
-
-            # Skip if proposal_ids don't match (additional safety check)
-            if comment_proposal_id and section_proposal_id and comment_proposal_id != section_proposal_id:
-                continue
-
-            # Calculate similarity
-            similarity = vector_search_similarity(comment_embedding, section_embedding)
-
-            # If similarity is above threshold, add to matches
-            if similarity >= threshold:
-                section_matches.append({
-                    'section_id': section_id,
-                    'section_title': section_title,
-                    'section_number': section_number,
-                    'similarity_score': float(similarity)
-                })
-
-        # Sort matches by similarity score (descending)
-        section_matches.sort(key=lambda x: x['similarity_score'], reverse=True)
-
-        # Take top N matches
-        top_matches = section_matches[:max_matches]
-
         # Add to results
-        for match in top_matches:
+        for section_index, similarity in top_matches:
             all_matches.append({
                 'comment_id': comment_str_id,  # Use string comment ID for foreign key
-                'section_id': match['section_id'],
-                'similarity_score': match['similarity_score'],
+                'section_id': sections[section_index]['section_id'],
+                'similarity_score': similarity,
                 'proposal_id': proposal_id if proposal_id else comment_proposal_id
             })
 
+    return all_matches, sections
+
+def server_matches(proposal_id, threshold=0.75, max_matches=5, exact=False, ef_search=100):
+    """Match one proposal's comments to its sections in Postgres; same return value as python_matches"""
+    print(f"Matching comments to sections in Postgres ({'exact scan' if exact else f'HNSW index, ef_search={ef_search}'})...")
+    matches_by_comment = fetch_server_matches(sb_client, proposal_id, threshold, max_matches, exact, ef_search)
+    all_matches = server_match_records(matches_by_comment, proposal_id)
+
+    # The hierarchy filter only needs the section tree, not the text or embeddings
+    sections = fetch_table('document_sections', 'section_id', 'section_id,parent_section_id', proposal_id)
+    print(f"Matched {len(matches_by_comment)} comments to {len(sections)} sections")
+    return all_matches, sections
+
+def match_comments_to_sections(proposal_id=None, threshold=0.75, max_matches=5, index='exact', nlist=None, nprobe=8,
+                               similarity='pooled', mode='python', exact=False, ef_search=100):
+    """Match EPA comments to document sections based on vector similarity
+
+    index='ivf' searches a persisted approximate index per proposal instead of
+    scoring every section; it needs a proposal_id and falls back to exact otherwise.
+    similarity='max-chunk' scores each pair by its most similar comment chunk
+    and section chunk instead of the pooled embeddings (exact search only).
+    mode='server' runs the top-k search in Postgres (see server_matches); it
+    needs a proposal_id and pooled similarity, and falls back to Python otherwise.
+    """
+    if mode == 'server' and similarity != 'pooled':
+        print("Server-side matching scores pooled embeddings, using the Python path")
+        mode = 'python'
+    if mode == 'server' and not proposal_id:
+        print("Server-side matching needs a proposal_id, using the Python path")
+        mode = 'python'
+
+    if mode == 'server':
+        all_matches, sections = server_matches(proposal_id, threshold, max_matches, exact, ef_search)
+    else:
+        all_matches, sections = python_matches(proposal_id, threshold, max_matches, index, nlist, nprobe, similarity)
+
     print(f"Found {len(all_matches)} raw comment-section matches above threshold {threshold}")
 
+    # Build section hierarchy maps
+    print("Building section hierarchy maps...")
+    section_map, parent_child_map, ancestor_map = build_section_hierarchy(sections)
+
     # Filter matches to avoid parent-child redundancy
     filtered_matches = filter_hierarchical_matches(all_matches, section_map, ancestor_map)
     print(f"After hierarchical filtering: {len(filtered_matches)} unique matches")
@@ -240,6 +296,79 @@ def match_comments_to_sections(proposal_id=None, threshold=0.75, max_matches=5):
 
     return filtered_matches
 
+def compare_match_modes(proposal_id, threshold=0.75, max_matches=5, ef_search=100, tolerance=1e-4):
+    """Check server-side matching against the Python path for one proposal and time both
+
+    The exact server scan must return the Python path's matches; scores may
+    differ by float rounding up to tolerance, and pairs that close to the
+    threshold or to a tie may swap. The HNSW index is reported as recall
+    against the Python path. Nothing is uploaded.
+
+    Returns:
+        Dictionary with the number of mismatching comments for the exact scan
+        and the recall of the index
+    """
+    def by_comment(matches):
+        grouped = {}
+        for match in matches:
+            grouped.setdefault(match['comment_id'], {})[match['section_id']] = match['similarity_score']
+        return grouped
+
+    def same_matches(want, got):
+        """Equal match sets, allowing swaps of pairs scoring within tolerance of the k-th best or the threshold"""
+        cutoff = min(want.values()) if want and len(want) >= max_matches else threshold
+        scores = {**want, **got}
+        return all(abs(scores[section_id] - cutoff) <= tolerance for section_id in set(want) ^ set(got))
+
+    print(f"Comparing match modes for proposal {proposal_id}")
+    start = time.perf_counter()
+    data = fetch_comments_and_sections(proposal_id)
+    fetched = time.perf_counter() - start
+    transferred = sum(len(json.dumps(rows)) for rows in data)
+    reference, _ = python_matches(proposal_id, threshold, max_matches, data=data)
+    python_time = time.perf_counter() - start
+
+    timings = {}
+    results = {}
+    for label, exact in (('server exact', True), ('server hnsw', False)):
+        start = time.perf_counter()
+        matches = fetch_server_matches(sb_client, proposal_id, threshold, max_matches, exact, ef_search)
+        timings[label] = time.perf_counter() - start
+        results[label] = {comment_id: dict(top) for comment_id, top in matches.items() if top}
+
+    expected = by_comment(reference)
+    exact_results = results['server exact']
+    mismatches = 0
+    max_difference = 0.0
+    for comment_id in set(expected) | set(exact_results):
+        want, got = expected.get(comment_id, {}), exact_results.get(comment_id, {})
+        for section_id in set(want) & set(got):
+            max_difference = max(max_difference, abs(want[section_id] - got[section_id]))
+        if not same_matches(want, got):
+            mismatches += 1
+
+    found = sum(len(set(want) & set(results['server hnsw'].get(comment_id, {}))) for comment_id, want in expected.items())
+    total = sum(len(want) for want in expected.values())
+    recall = found / total if total else 1.0
+
+    print(f"Python path: {python_time:.2f}s ({fetched:.2f}s fetching {transferred / 1e6:.1f} MB of rows), "
+          f"{len(reference)} matches")
+    for label, elapsed in timings.items():
+        count = sum(len(top) for top in results[label].values())
+        print(f"{label}: {elapsed:.2f}s, {count} matches")
+    print(f"Exact server scan: {mismatches} comments with different matches, largest score difference {max_difference:.2e}")
+    print(f"HNSW index (ef_search={ef_search}): recall {recall:.1%} against the Python path")
+    return {'mismatches': mismatches, 'recall': recall}
+
+def report_index_recall(proposal_id, threshold=0.75, max_matches=5, nlist=None):
+    """Print recall and latency of the IVF index against exact search for one proposal"""
+    comments, sections = fetch_comments_and_sections(proposal_id)
+    comment_matrix, section_matrix = build_comment_and_section_matrices(comments, sections)
+
+    print(f"Recall report for proposal {proposal_id}: {len(comments)} comments, {len(sections)} sections")
+    return recall_report(comment_matrix, section_matrix, [s['section_id'] for s in sections],
+                         top_k_section_matches, threshold, max_matches, nlist_values=(nlist,))
+
 def upload_matches_to_supabase(matches, proposal_id=None, batch_size=50):
     """Upload comment-section matches to Supabase"""
     print(f"Uploading {len(matches)} matches to Supabase...")
@@ -326,6 +455,27 @@ def analyze_match_results():
         print(f"{i}. {info['section_number']} {info['section_title']}: {count} comments")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Match EPA comments to document sections for every proposal')
+    parser.add_argument('--threshold', type=float, default=0.70, help='Minimum cosine similarity for a match')
+    parser.add_argument('--max-matches', type=int, default=5, help='Maximum matches kept per comment')
+    parser.add_argument('--index', choices=['exact', 'ivf'], default='exact',
+                        help='Search every section (exact) or a persisted approximate index per proposal (ivf)')
+    parser.add_argument('--nlist', type=int, help='Number of IVF lists (default: about 4 * sqrt(sections))')
+    parser.add_argument('--nprobe', type=int, default=8, help='Number of IVF lists scanned per comment')
+    parser.add_argument('--similarity', choices=['pooled', 'max-chunk'], default='pooled',
+                        help='Score pairs by their pooled embeddings (default) or by their most similar chunks')
+    parser.add_argument('--recall-report', action='store_true',
+                        help='Print IVF recall and latency against exact search instead of matching')
+    parser.add_argument('--mode', choices=['python', 'server'], default='python',
+                        help='Score pairs in Python after fetching every embedding (default) or run the top-k '
+                             'search in Postgres with match_comment_sections')
+    parser.add_argument('--server-scan', choices=['index', 'exact'], default='index',
+                        help='Server mode: search the HNSW index (default) or scan every section of the proposal')
+    parser.add_argument('--ef-search', type=int, default=100, help='Server mode: HNSW candidate list size')
+    parser.add_argument('--compare-modes', action='store_true',
+                        help='Check server-side matching against the Python path and time both instead of matching')
+    args = parser.parse_args()
+
     print("Starting automatic matching for all proposals...")
 
     # Get all unique proposal IDs from both comments and sections
@@ -350,13 +500,27 @@ if __name__ == "__main__":
         print("No proposal IDs found with both comments and sections. Nothing to match.")
         exit()
 
+    if args.recall_report:
+        for proposal_id in common_proposal_ids:
+            report_index_recall(proposal_id, args.threshold, args.max_matches, args.nlist)
+        exit()
+
+    if args.compare_modes:
+        for proposal_id in common_proposal_ids:
+            compare_match_modes(proposal_id, args.threshold, args.max_matches, args.ef_search)
+        exit()
+
     # Process each proposal ID
     all_matches = []
     for i, proposal_id in enumerate(common_proposal_ids, 1):
         print(f"\n--- Processing proposal {i}/{len(common_proposal_ids)}: {proposal_id} ---")
 
         # Match comments to sections within this proposal
-        matches = match_comments_to_sections(proposal_id=proposal_id, threshold=0.70)
+        matches = match_comments_to_sections(proposal_id=proposal_id, threshold=args.threshold,
+                                             max_matches=args.max_matches, index=args.index,
+                                             nlist=args.nlist, nprobe=args.nprobe, similarity=args.similarity,
+                                             mode=args.mode, exact=args.server_scan == 'exact',
+                                             ef_search=args.ef_search)
         all_matches.extend(matches)
 
         print(f"Completed proposal {proposal_id}: {len(matches)} matches")
@@ -1,18 +1,18 @@
 #!/usr/bin/env python3
 
 import re
-import json
 from collections import OrderedDict
+from records import existing_variant, iter_records
 
 def load_commenter_info():
     """Load commenter information from the original JSON data."""
     try:
-        with open('../processed/epa_comments_with_attachment_content_correct.json', 'r') as f:
-            comments_data = json.load(f)
+        # Stream the comments; only the commenter fields are kept
+        comments_file = existing_variant('../processed/epa_comments_with_attachment_content_correct.json')
 
         # Create a lookup dictionary by comment ID
         commenter_info = {}
-        for comment in comments_data:
+        for comment in iter_records(comments_file):
             comment_id = comment.get('comment_id')
             if comment_id:
                 commenter_info[comment_id] = {
@@ -21,7 +21,7 @@ def load_commenter_info():
                     'date': comment.get('comment_date', 'Unknown date')
                 }
         return commenter_info
-    except (FileNotFoundError, json.JSONDecodeError):
+    except (FileNotFoundError, ValueError):
         print("Warning: Could not load commenter information. Will proceed without it.")
         return {}
 
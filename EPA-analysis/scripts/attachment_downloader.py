@@ -0,0 +1,103 @@
+import os
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from rate_limit import HostRateLimiter
+
+# Status codes worth retrying; anything else in the 4xx range fails immediately
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class AttachmentDownloader:
+    """
+    Download attachments concurrently over a shared, pooled HTTP session
+
+    Each request first takes a token from a per-host rate limiter, failed
+    requests are retried with exponential backoff, and response bodies are
+    streamed to disk rather than held in memory.
+    """
+
+    def __init__(self, workers=8, rate=2.0, burst=2, retries=3, backoff=1.0, timeout=60, chunk_size=64 * 1024):
+        """
+        Args:
+            workers: Number of concurrent downloads
+            rate: Requests per second allowed per host
+            burst: Requests each host may receive back to back
+            retries: Retries after the first failed attempt
+            backoff: Base delay in seconds, doubled on each retry
+            timeout: Connect/read timeout per request in seconds
+            chunk_size: Bytes per streamed write
+        """
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.limiter = HostRateLimiter(rate, burst)
+
+        # Share connections across worker threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def download(self, url, path):
+        """
+        Download one URL to path, retrying transient failures
+
+        The body is written to a temporary file that is renamed into place on
+        success, so a partial download never looks complete.
+
+        Returns:
+            The path written
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        partial_path = f"{path}.part"
+
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire(url)
+            try:
+                with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                    if response.status_code in RETRY_STATUSES:
+                        raise requests.HTTPError(f"{response.status_code} for {url}", response=response)
+                    response.raise_for_status()
+
+                    with open(partial_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            f.write(chunk)
+
+                os.replace(partial_path, path)
+                return path
+            except requests.RequestException as e:
+                status = e.response.status_code if e.response is not None else None
+                retryable = status is None or status in RETRY_STATUSES
+                if not retryable or attempt == self.retries:
+                    if os.path.exists(partial_path):
+                        os.remove(partial_path)
+                    raise
+
+                delay = self.backoff * (2 ** attempt)
+                print(f"Retrying {url} in {delay:.1f}s after error: {e}")
+                time.sleep(delay)
+
+    def download_all(self, jobs):
+        """
+        Download many (url, path) jobs concurrently
+
+        Args:
+            jobs: List of (url, path) tuples
+
+        Yields:
+            (job_index, path, error) as each download finishes; error is None on success
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.download, url, path): i for i, (url, path) in enumerate(jobs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    yield i, future.result(), None
+                except Exception as e:
+                    yield i, None, e
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,102 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processed', 'attachment_manifest.sqlite')
+
+# Attachment states, in pipeline order
+DOWNLOADED = 'downloaded'
+EXTRACTED = 'extracted'
+FAILED = 'failed'
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Hash a file on disk without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class AttachmentManifest:
+    """
+    SQLite record of every attachment's download and extraction status
+
+    One row per local attachment path with its URL, content hash, extracted
+    text path and status, updated as work completes so a rerun can skip
+    anything already done.
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS attachments (
+                local_path TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                content_hash TEXT,
+                text_path TEXT,
+                status TEXT NOT NULL,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, local_path):
+        """Return the manifest row for a local path as a dictionary, or None"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM attachments WHERE local_path = ?', (local_path,)).fetchone()
+        return dict(row) if row else None
+
+    def _upsert(self, local_path, url, status, content_hash=None, text_path=None, error=None):
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO attachments (local_path, url, content_hash, text_path, status, error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(local_path) DO UPDATE SET
+                    url = excluded.url,
+                    content_hash = COALESCE(excluded.content_hash, attachments.content_hash),
+                    text_path = excluded.text_path,
+                    status = excluded.status,
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+            ''', (local_path, url, content_hash, text_path, status, error, time.time()))
+            self._conn.commit()
+
+    def mark_downloaded(self, local_path, url, content_hash):
+        self._upsert(local_path, url, DOWNLOADED, content_hash=content_hash)
+
+    def mark_extracted(self, local_path, url, text_path):
+        self._upsert(local_path, url, EXTRACTED, text_path=text_path)
+
+    def mark_failed(self, local_path, url, error):
+        self._upsert(local_path, url, FAILED, error=str(error))
+
+    def is_extracted(self, local_path, url):
+        """True if this URL was already downloaded to local_path and its text extracted"""
+        entry = self.get(local_path)
+        return bool(entry and entry['status'] == EXTRACTED and entry['url'] == url
+                    and entry['text_path'] and os.path.exists(entry['text_path']))
+
+    def is_downloaded(self, local_path, url):
+        """True if this URL's file is on disk and unchanged since it was downloaded"""
+        entry = self.get(local_path)
+        return bool(entry and entry['status'] in (DOWNLOADED, EXTRACTED) and entry['url'] == url
+                    and entry['content_hash'] and os.path.exists(local_path)
+                    and file_sha256(local_path) == entry['content_hash'])
+
+    def status_counts(self):
+        """Return {status: count} across the manifest"""
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM attachments GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,59 @@
+import os
+import time
+import argparse
+import importlib.util
+from legacy_section_extractor import extract_epa_sections_legacy, same_sections, synthetic_federal_register
+
+def load_extractor():
+    """extract_epa_sections_fixed from the step 3 script, which can't be imported by name"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '3_extract_document_sections_fixed.py')
+    spec = importlib.util.spec_from_file_location('extract_document_sections_fixed', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.extract_epa_sections_fixed
+
+def benchmark_extractors(documents, repeat=3):
+    """
+    Time the legacy and single-pass extractors on (name, markdown) documents
+
+    Each extractor runs repeat times per document and the best time counts.
+    The last column checks that both produced the same sections, ignoring
+    their random IDs.
+    """
+    extract_epa_sections_fixed = load_extractor()
+    print(f"{'document':<28} {'size (MB)':>9} {'sections':>8} {'legacy (s)':>10} {'one-pass (s)':>12} {'speedup':>7} {'same':>5}")
+    for name, markdown_text in documents:
+        timings = {}
+        results = {}
+        for label, extract in (('legacy', extract_epa_sections_legacy), ('one-pass', extract_epa_sections_fixed)):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results[label] = extract(markdown_text)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[label] = best
+
+        print(f"{name[:28]:<28} {len(markdown_text) / 1024 / 1024:>9.2f} {len(results['one-pass']):>8} "
+              f"{timings['legacy']:>10.3f} {timings['one-pass']:>12.3f} "
+              f"{timings['legacy'] / timings['one-pass']:>6.1f}x {str(same_sections(results['legacy'], results['one-pass'])):>5}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the legacy and single-pass section extractors')
+    parser.add_argument('markdown', nargs='?', default='../data/documents/doc2.md',
+                        help='Federal Register markdown to time besides the synthetic document')
+    parser.add_argument('--synthetic-mb', type=float, default=50,
+                        help='Size of the synthetic Federal Register document in MB (default: 50)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per extractor and document (default: 3)')
+    args = parser.parse_args()
+
+    documents = []
+    if os.path.exists(args.markdown):
+        with open(args.markdown, 'r', encoding='utf-8') as f:
+            documents.append((os.path.basename(args.markdown), f.read()))
+    else:
+        print(f"{args.markdown} not found, timing the synthetic document only")
+    documents.append((f"synthetic ({args.synthetic_mb:g} MB)",
+                      synthetic_federal_register(int(args.synthetic_mb * 1024 * 1024))))
+
+    benchmark_extractors(documents, args.repeat)
@@ -0,0 +1,74 @@
+import time
+import argparse
+import PyPDF2
+from io import BytesIO, StringIO
+from pdf_extraction import extract_pdf_text
+
+def replicate_pdf(pdf_path, copies):
+    """Build an in-memory PDF containing the pages of pdf_path repeated `copies` times"""
+    reader = PyPDF2.PdfReader(pdf_path)
+    writer = PyPDF2.PdfWriter()
+    for _ in range(copies):
+        for page in reader.pages:
+            writer.add_page(page)
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+def benchmark_text_accumulation(pdf_path, copies_list=(1, 2, 4, 8, 16)):
+    """
+    Time text accumulation strategies and full extraction as a document grows
+
+    Page texts are extracted once and then accumulated `copies` times with the
+    old `text += page_text + "\\n"` loop, list-join and io.StringIO, isolating
+    the string building cost. extract_pdf_text is then timed on the PDF
+    replicated `copies` times.
+    """
+    page_texts = [page.extract_text() for page in PyPDF2.PdfReader(pdf_path).pages]
+    print(f"{pdf_path}: {len(page_texts)} pages, {sum(len(t) for t in page_texts)} characters")
+    print(f"{'copies':>6} {'pages':>6} {'+= (s)':>9} {'join (s)':>9} {'StringIO (s)':>13} {'extract (s)':>12}")
+
+    for copies in copies_list:
+        pages = page_texts * copies
+
+        start = time.perf_counter()
+        text = ""
+        for page_text in pages:
+            text += page_text + "\n"
+        concat_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parts = []
+        for page_text in pages:
+            parts.append(page_text)
+            parts.append("\n")
+        joined = "".join(parts)
+        join_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        buffer = StringIO()
+        for page_text in pages:
+            buffer.write(page_text)
+            buffer.write("\n")
+        buffered = buffer.getvalue()
+        stringio_seconds = time.perf_counter() - start
+
+        assert text == joined == buffered
+
+        pdf_content = replicate_pdf(pdf_path, copies)
+        start = time.perf_counter()
+        extract_pdf_text(pdf_content)
+        extract_seconds = time.perf_counter() - start
+
+        print(f"{copies:>6} {len(pages):>6} {concat_seconds:>9.4f} {join_seconds:>9.4f} "
+              f"{stringio_seconds:>13.4f} {extract_seconds:>12.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark PDF text accumulation')
+    parser.add_argument('pdf', nargs='?', default='../data/documents/EPA-HQ-OLEM-2017-0463-0001_content.pdf',
+                        help='PDF to replicate')
+    parser.add_argument('--copies', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                        help='Replication factors to time')
+    args = parser.parse_args()
+
+    benchmark_text_accumulation(args.pdf, args.copies)
@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from embeddings import get_chunked_embeddings, print_cache_stats
+from records import existing_variant, iter_batches, iter_records
+from section_tree import load_sections
+from load_jobs import add_job_arguments, jobs_from_args
+from supabase_rows import section_levels
+
+# Direct Postgres access needs psycopg 3; without it only --dry-run is available
+try:
+    import psycopg
+    from psycopg import sql
+except ImportError:
+    psycopg = None
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_BATCH_SIZE = 500
+
+COMMENT_COLUMNS = ('comment_id', 'commenter_name', 'organization', 'comment_date', 'comment_text',
+                   'has_attachments', 'attachment_count', 'attachment_contents', 'combined_text',
+                   'source_url', 'embedding', 'proposal_id')
+SECTION_COLUMNS = ('section_id', 'section_number', 'section_title', 'section_text', 'parent_section_id',
+                   'hierarchy_level', 'hierarchy_path', 'embedding', 'proposal_id')
+CHUNK_COLUMNS = ('chunk_index', 'start_char', 'end_char', 'token_count', 'embedding', 'proposal_id')
+
+def vector_literal(vector):
+    """pgvector text representation of an embedding ('[0.1,0.2,...]'), or None for an empty one"""
+    if not len(vector):
+        return None
+    return '[' + ','.join(map(repr, map(float, vector))) + ']'
+
+def comment_row(doc, vectors, proposal_id):
+    """epa_comments row for a comment, with the same fields 4_upload_to_database.py upserts"""
+    return {
+        'comment_id': doc['comment_id'],
+        'commenter_name': doc['commenter_name'],
+        'organization': doc.get('organization', ''),
+        # COPY rejects '' for a DATE column where PostgREST would have failed the whole batch
+        'comment_date': doc['comment_date'] or None,
+        'comment_text': doc['comment_text'],
+        'has_attachments': len(doc.get('attachments', [])) > 0,
+        'attachment_count': len(doc.get('attachment_contents', [])),
+        'attachment_contents': json.dumps(doc.get('attachment_contents', [])),
+        'combined_text': doc.get('combined_text', doc['comment_text']),
+        'source_url': doc.get('source_url', ''),
+        'embedding': vector_literal(vectors['embedding']),
+        'proposal_id': proposal_id
+    }
+
+def section_row(section, vectors, proposal_id):
+    """document_sections row for a section, with the same fields 4_upload_to_database.py upserts"""
+    return {
+        'section_id': section['section_id'],
+        'section_number': section.get('section_number', ''),
+        'section_title': section.get('section_title', ''),
+        'section_text': section['section_text'],
+        'parent_section_id': section.get('parent_section_id'),
+        'hierarchy_level': section.get('hierarchy_level', 1),
+        'hierarchy_path': section.get('hierarchy_path', ''),
+        'embedding': vector_literal(vectors['embedding']),
+        'proposal_id': proposal_id
+    }
+
+# What each kind of record is embedded from and where it goes
+TABLES = {
+    'sections': {
+        'table': 'document_sections', 'key': 'section_id', 'columns': SECTION_COLUMNS,
+        'chunk_table': 'document_section_chunks', 'row': section_row,
+        'text': lambda section: section['section_text'],
+    },
+    'comments': {
+        'table': 'epa_comments', 'key': 'comment_id', 'columns': COMMENT_COLUMNS,
+        'chunk_table': 'epa_comment_chunks', 'row': comment_row,
+        'text': lambda doc: doc.get('combined_text', doc['comment_text']),
+    },
+}
+
+def chunk_rows(key_field, key, chunks, proposal_id):
+    """Chunk table rows for the chunks of one comment or section"""
+    return [{
+        key_field: key,
+        'chunk_index': chunk['chunk_index'],
+        'start_char': chunk['start_char'],
+        'end_char': chunk['end_char'],
+        'token_count': chunk['token_count'],
+        'embedding': vector_literal(chunk['embedding']),
+        'proposal_id': proposal_id
+    } for chunk in chunks if chunk['embedding']]
+
+class PostgresSink:
+    """
+    Write batches straight to Postgres with COPY
+
+    Rows are copied in text format, embeddings as pgvector literals, into a
+    temporary staging table and moved into the target with one INSERT ...
+    ON CONFLICT, so reloading a file updates rows instead of failing. The
+    chunks of the batch replace any stored earlier, in the same transaction.
+    """
+
+    def __init__(self, dsn):
+        if psycopg is None:
+            raise RuntimeError("psycopg is not installed; run pip install 'psycopg[binary]' or use --dry-run")
+        self.conn = psycopg.connect(dsn, autocommit=True)
+
+    def _copy(self, cursor, table, columns, rows):
+        statement = sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(table), sql.SQL(', ').join(map(sql.Identifier, columns)))
+        with cursor.copy(statement) as copy:
+            for row in rows:
+                copy.write_row([row[column] for column in columns])
+
+    def write_batch(self, table, key, columns, rows, chunk_table, chunks):
+        stage = f"{table}_stage"
+        column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+        updates = sql.SQL(', ').join(sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column))
+                                     for column in columns if column != key)
+        with self.conn.transaction(), self.conn.cursor() as cursor:
+            cursor.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(
+                sql.Identifier(stage), sql.Identifier(table)))
+            self._copy(cursor, stage, columns, rows)
+            cursor.execute(sql.SQL("INSERT INTO {table} ({columns}) SELECT {columns} FROM {stage} "
+                                   "ON CONFLICT ({key}) DO UPDATE SET {updates}").format(
+                table=sql.Identifier(table), columns=column_list, stage=sql.Identifier(stage),
+                key=sql.Identifier(key), updates=updates))
+            # Drop chunks from an earlier upload first; the text may now split differently
+            cursor.execute(sql.SQL("DELETE FROM {chunks} USING {stage} WHERE {chunks}.{key} = {stage}.{key}").format(
+                chunks=sql.Identifier(chunk_table), stage=sql.Identifier(stage), key=sql.Identifier(key)))
+            if chunks:
+                self._copy(cursor, chunk_table, (key,) + CHUNK_COLUMNS, chunks)
+
+    def close(self):
+        self.conn.close()
+
+class MemorySink:
+    """
+    In-process stand-in for PostgresSink with the same upsert semantics
+
+    Tables are dictionaries keyed like their primary keys, so a load can be
+    run and checked (or timed without the database) with no Postgres server.
+    Batches are written one at a time, like transactions, so proposals can
+    share one sink.
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self._lock = threading.Lock()
+
+    def write_batch(self, table, key, columns, rows, chunk_table, chunks):
+        with self._lock:
+            self._write_batch(table, key, columns, rows, chunk_table, chunks)
+
+    def _write_batch(self, table, key, columns, rows, chunk_table, chunks):
+        target = self.tables.setdefault(table, {})
+        for row in rows:
+            target[row[key]] = {column: row[column] for column in columns}
+        stored = self.tables.setdefault(chunk_table, {})
+        keys = {row[key] for row in rows}
+        for stored_key in [stored_key for stored_key in stored if stored_key[0] in keys]:
+            del stored[stored_key]
+        for chunk in chunks:
+            stored[(chunk[key], chunk['chunk_index'])] = chunk
+
+    def close(self):
+        pass
+
+def pipelined(batches, embed, prefetch=2):
+    """
+    Yield (batch, embed(batch)) for each batch, embedding up to prefetch
+    batches ahead in a background thread while the caller uploads
+
+    Embedding requests and database writes both wait on the network, so a
+    single worker thread is enough to keep both busy.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, executor.submit(embed, batch)))
+            if len(pending) > prefetch:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+def bulk_load(sink, records, kind, proposal_id, batch_size=DEFAULT_BATCH_SIZE, prefetch=2):
+    """
+    Embed records and write them to sink in batches of batch_size
+
+    Args:
+        sink: PostgresSink or MemorySink
+        records: Iterable of comments or sections, e.g. a stream from iter_records
+        kind: "comments" or "sections"
+        proposal_id: Proposal the rows belong to
+        batch_size: Records per embedding call and per COPY transaction
+        prefetch: Batches embedded ahead of the one being written
+
+    Returns:
+        Dictionary with rows, chunks, embed_wait and write timings (seconds)
+    """
+    spec = TABLES[kind]
+    stats = {'rows': 0, 'chunks': 0, 'embed_wait': 0.0, 'write': 0.0}
+
+    def embed(batch):
+        return get_chunked_embeddings([spec['text'](record) for record in batch])
+
+    results = pipelined(iter_batches(records, batch_size), embed, prefetch)
+    while True:
+        start = time.perf_counter()
+        try:
+            batch, embedded = next(results)
+        except StopIteration:
+            break
+        stats['embed_wait'] += time.perf_counter() - start
+
+        # A key repeated within one batch would make ON CONFLICT update the same row twice; the last copy wins
+        rows = {}
+        for record, vectors in zip(batch, embedded):
+            rows[record[spec['key']]] = (spec['row'](record, vectors, proposal_id), vectors)
+        chunks = [chunk for key, (_, vectors) in rows.items()
+                  for chunk in chunk_rows(spec['key'], key, vectors['chunks'], proposal_id)]
+
+        start = time.perf_counter()
+        sink.write_batch(spec['table'], spec['key'], spec['columns'], [row for row, _ in rows.values()],
+                         spec['chunk_table'], chunks)
+        stats['write'] += time.perf_counter() - start
+        stats['rows'] += len(rows)
+        stats['chunks'] += len(chunks)
+        print(f"{proposal_id} {spec['table']}: {stats['rows']} rows, {stats['chunks']} chunks written")
+    return stats
+
+def print_load_stats(kind, stats, elapsed):
+    rate = stats['rows'] / elapsed if elapsed else 0.0
+    print(f"Loaded {stats['rows']} {kind} ({stats['chunks']} chunks) in {elapsed:.1f}s ({rate:.1f} rows/s)")
+    print(f"  waiting for embeddings: {stats['embed_wait']:.1f}s, writing: {stats['write']:.1f}s")
+
+def load_job(sink, job, batch_size=DEFAULT_BATCH_SIZE, prefetch=2):
+    """
+    Load the sections and then the comments of one {'proposal_id', 'sections', 'comments'} job
+
+    Sections are written parents first, since each references its parent.
+    As in 4_upload_to_database.py, comments are skipped when the sections fail.
+
+    Returns:
+        True if everything the job lists was loaded
+    """
+    proposal_id = job['proposal_id']
+
+    def parents_first(path):
+        return [section for level in section_levels(load_sections(path)) for section in level]
+
+    for kind, path, label, read in (('sections', job['sections'], 'document sections', parents_first),
+                                    ('comments', job['comments'], 'comments', iter_records)):
+        if not path:
+            continue
+        path = existing_variant(path)
+        print(f"Loading {label} for {proposal_id} from {path}")
+        start = time.perf_counter()
+        try:
+            stats = bulk_load(sink, read(path), kind, proposal_id, batch_size, prefetch)
+        except FileNotFoundError:
+            print(f"{label.capitalize()} file not found: {path}")
+            return False
+        except Exception as e:
+            print(f"Error loading {label} for {proposal_id}: {e}")
+            return False
+        print_load_stats(label, stats, time.perf_counter() - start)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk load comments and document sections into Postgres with COPY')
+    add_job_arguments(parser, 'Proposals loaded at once, each over its own connection (default: 4)',
+                      batch_size=DEFAULT_BATCH_SIZE, batch_help='Records per embedding call and COPY transaction',
+                      embed_batch_size=None)
+    parser.add_argument('--prefetch', type=int, default=2,
+                        help='Batches embedded ahead of the one being written (default: 2)')
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_URL'),
+                        help='Postgres connection string (default: DATABASE_URL)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Write to an in-memory stand-in instead of Postgres')
+    args = parser.parse_args()
+    jobs = jobs_from_args(parser, args)
+    if not args.dry_run and not args.dsn:
+        parser.error('a connection string is required: set DATABASE_URL, pass --dsn or use --dry-run')
+    if not args.dry_run and psycopg is None:
+        parser.error("psycopg is not installed; run pip install 'psycopg[binary]' or use --dry-run")
+
+    memory = MemorySink() if args.dry_run else None
+
+    def run(job):
+        try:
+            sink = memory or PostgresSink(args.dsn)
+        except Exception as e:
+            print(f"Error connecting to Postgres for {job['proposal_id']}: {e}")
+            return False
+        try:
+            return load_job(sink, job, args.batch_size, args.prefetch)
+        finally:
+            if sink is not memory:
+                sink.close()
+
+    with ThreadPoolExecutor(max_workers=min(args.workers, len(jobs))) as executor:
+        results = list(executor.map(run, jobs))
+
+    if memory:
+        for table, rows in memory.tables.items():
+            print(f"{table}: {len(rows)} rows in memory")
+    print_cache_stats()
+    failed = [job['proposal_id'] for job, ok in zip(jobs, results) if not ok]
+    if failed:
+        print(f"Loading failed for {len(failed)} of {len(jobs)} proposals: {', '.join(failed)}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
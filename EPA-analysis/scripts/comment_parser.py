@@ -0,0 +1,289 @@
+import os
+import re
+import glob
+import json
+import time
+import argparse
+from datetime import datetime
+from urllib.parse import urlparse
+from bs4 import BeautifulSoup, NavigableString, Comment
+from firecrawl_cache import FirecrawlCache, DEFAULT_CACHE_PATH
+
+# Same parser preference as listing_parser: lxml when installed
+try:
+    import lxml  # noqa: F401
+    BS4_PARSER = 'lxml'
+except ImportError:
+    BS4_PARSER = 'html.parser'
+
+FIELDS = ('comment_id', 'commenter_name', 'organization', 'comment_date', 'comment_text', 'attachments')
+
+COMMENT_ID_PATTERN = re.compile(r'\bEPA-[A-Z0-9]+(?:-[A-Z0-9]+)*-\d{4}-\d{4}-\d{4,}\b')
+TITLE_PATTERN = re.compile(r'^Comment (?:from|submitted by)\s+(.+)$', re.IGNORECASE)
+ATTACHMENT_HOST = 'downloads.regulations.gov'
+GENERIC_LINK_TEXT = {'', 'download', 'view', 'pdf', 'open', 'attachment'}
+
+# Labels shown next to each value in the comment details panel, by field
+FIELD_LABELS = {
+    'comment_id': ('comment id', 'document id'),
+    'commenter_name': ('submitter name',),
+    'organization': ('organization name', 'organization'),
+    'comment_date': ('received date', 'posted date', 'date received', 'date posted'),
+}
+LABEL_FIELDS = {label: field for field, labels in FIELD_LABELS.items() for label in labels}
+
+# Date formats regulations.gov shows in the details panel
+DATE_FORMATS = ('%b %d, %Y', '%B %d, %Y', '%m/%d/%Y', '%Y-%m-%d')
+
+# Elements that start a new line of comment text; everything else is inline
+BLOCK_TAGS = {'p', 'div', 'li', 'br', 'tr', 'blockquote', 'section', 'ul', 'ol', 'table', 'pre',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+SKIP_TAGS = {'script', 'style', 'noscript', 'template'}
+WHITESPACE = re.compile(r'\s+')
+
+class CommentParseError(ValueError):
+    """Raised when a comment page doesn't have the markup the parser relies on"""
+
+def _clean(text):
+    """Collapse runs of whitespace within lines and drop blank lines"""
+    lines = (' '.join(line.split()) for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+def _block_text(element, parts):
+    """Append an element's text to parts, with line breaks only around block elements"""
+    for child in element.children:
+        if isinstance(child, Comment):
+            continue
+        if isinstance(child, NavigableString):
+            parts.append(WHITESPACE.sub(' ', child))
+        elif child.name in SKIP_TAGS:
+            continue
+        elif child.name in BLOCK_TAGS:
+            parts.append('\n')
+            _block_text(child, parts)
+            parts.append('\n')
+        else:
+            _block_text(child, parts)
+
+def _label_values(soup):
+    """
+    Find "label / value" pairs in the details panel
+
+    A label is a text node whose whole text is a known label (ignoring case
+    and a trailing colon); its value is the text of the next element after
+    the label's element, or after its parent when the label has no sibling.
+    """
+    values = {}
+    for node in soup.find_all(string=True):
+        label = node.strip().rstrip(':').strip().lower()
+        field = LABEL_FIELDS.get(label)
+        if not field or field in values:
+            continue
+
+        element = node.parent
+        value = element.find_next_sibling()
+        if value is None and element.parent is not None:
+            value = element.parent.find_next_sibling()
+        if value is not None:
+            text = _clean(value.get_text(' '))
+            # A label followed directly by another label has no value
+            if text and text.rstrip(':').strip().lower() not in LABEL_FIELDS:
+                values[field] = text
+    return values
+
+def _is_date(text):
+    for date_format in DATE_FORMATS:
+        try:
+            datetime.strptime(text, date_format)
+            return True
+        except ValueError:
+            pass
+    return False
+
+def _is_heading(element, text=None):
+    if element.name not in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+        return False
+    return text is None or element.get_text(strip=True).lower() == text
+
+def _comment_body(soup):
+    """Text of the elements following the "Comment" heading, up to the next heading"""
+    heading = soup.find(lambda element: _is_heading(element, 'comment'))
+    if heading is None:
+        return ''
+
+    # The heading may be wrapped in its own container
+    anchor = heading
+    while anchor.find_next_sibling() is None and anchor.parent is not None and anchor.parent.name != 'body':
+        anchor = anchor.parent
+
+    parts = []
+    for sibling in anchor.find_next_siblings():
+        if _is_heading(sibling) or sibling.find(_is_heading):
+            break
+        parts.append('\n')
+        _block_text(sibling, parts)
+    return _clean(''.join(parts))
+
+def _attachments(soup):
+    """Attachment downloads linked from the page, in page order"""
+    attachments = {}
+    for link in soup.find_all('a', href=True):
+        href = link['href']
+        if urlparse(href).netloc != ATTACHMENT_HOST or href in attachments:
+            continue
+        filename = _clean(link.get_text(' '))
+        if filename.lower() in GENERIC_LINK_TEXT:
+            filename = os.path.splitext(os.path.basename(urlparse(href).path))[0]
+        attachments[href] = {'filename': filename, 'link': href}
+    return list(attachments.values())
+
+def parse_comment_page(html, url=None):
+    """
+    Extract comment fields from a regulations.gov comment page without an LLM
+
+    The parser only returns a record when every key field was read from the
+    page itself; anything missing or malformed raises CommentParseError so the
+    caller can fall back to the LLM extraction instead of storing a gap.
+
+    Args:
+        html: Rendered HTML of the comment page
+        url: Page URL; when it contains a comment ID the page's ID must match it
+
+    Returns:
+        Dictionary with the same fields the Firecrawl JSON extraction returns
+
+    Raises:
+        CommentParseError: The page is missing its comment ID, commenter,
+            date or comment text, or one of them is malformed
+    """
+    if not html:
+        raise CommentParseError("Empty page")
+
+    soup = BeautifulSoup(html, BS4_PARSER)
+    values = _label_values(soup)
+
+    match = COMMENT_ID_PATTERN.search(values.get('comment_id', ''))
+    if not match:
+        raise CommentParseError("No comment ID found")
+    url_match = COMMENT_ID_PATTERN.search(url or '')
+    if url_match and url_match.group(0) != match.group(0):
+        raise CommentParseError(f"Comment ID {match.group(0)} doesn't match the page URL")
+
+    comment_text = _comment_body(soup)
+    if not comment_text:
+        raise CommentParseError("No comment text found")
+
+    comment_date = values.get('comment_date', '')
+    if not comment_date:
+        raise CommentParseError("No comment date found")
+    if not _is_date(comment_date):
+        raise CommentParseError(f"Unrecognised comment date: {comment_date}")
+
+    # Fall back to the page title ("Comment from Jane Doe") for the commenter
+    commenter_name = values.get('commenter_name', '')
+    if not commenter_name:
+        title = soup.find('h1')
+        title_match = TITLE_PATTERN.match(_clean(title.get_text(' '))) if title else None
+        if title_match:
+            commenter_name = title_match.group(1)
+            # "Comment from Jane Doe, Acme Corp" names the organization too
+            organization = values.get('organization', '')
+            if organization and commenter_name.endswith(f", {organization}"):
+                commenter_name = commenter_name[:-len(organization) - 2]
+    if not commenter_name:
+        raise CommentParseError("No commenter name found")
+
+    # Individuals have no organization on regulations.gov, so it stays optional
+    return {
+        'commenter_name': commenter_name,
+        'comment_date': comment_date,
+        'organization': values.get('organization', ''),
+        'comment_text': comment_text,
+        'attachments': _attachments(soup),
+        'comment_id': match.group(0),
+    }
+
+def _normalize(value):
+    return ' '.join(str(value or '').split()).casefold()
+
+def fields_agree(field, parsed, expected, text_threshold=0.9):
+    """
+    Compare one parsed field with a reference extraction
+
+    Short fields must match after normalising case and whitespace; comment
+    text needs a word-set overlap of at least text_threshold, since LLM
+    output reflows and sometimes trims the text; attachments compare links.
+    """
+    if field == 'attachments':
+        def links(attachments):
+            return {a.get('link') or a.get('url') for a in attachments or [] if isinstance(a, dict)}
+        return links(parsed) == links(expected)
+    if field == 'comment_text':
+        parsed_words, expected_words = set(_normalize(parsed).split()), set(_normalize(expected).split())
+        if not parsed_words and not expected_words:
+            return True
+        return len(parsed_words & expected_words) / len(parsed_words | expected_words) >= text_threshold
+    return _normalize(parsed) == _normalize(expected)
+
+def load_corpus(cache_path=None, pages_dir=None, url_prefix='https://www.regulations.gov/comment/'):
+    """
+    Load (url, html, reference) samples for benchmarking
+
+    From a directory, every *.html file is a page and a sibling *.json file,
+    if any, is its reference extraction. From the Firecrawl cache, every
+    cached comment page is paired with its cached LLM extraction, if any.
+    """
+    samples = []
+    if pages_dir:
+        for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+            with open(path, 'r', encoding='utf-8') as f:
+                html = f.read()
+            reference = None
+            reference_path = os.path.splitext(path)[0] + '.json'
+            if os.path.exists(reference_path):
+                with open(reference_path, 'r', encoding='utf-8') as f:
+                    reference = json.load(f)
+            samples.append((os.path.basename(path), html, reference))
+    else:
+        cache = FirecrawlCache(cache_path or DEFAULT_CACHE_PATH, ttl=None)
+        references = {item['url']: item['data'] for item in cache.iter_extractions(url_prefix)}
+        for page in cache.iter_pages(url_prefix):
+            if page['html']:
+                samples.append((page['url'], page['html'], references.get(page['url'])))
+        cache.close()
+    return samples
+
+def benchmark_parser(samples):
+    """Report parse rate, per-field agreement with reference extractions, and throughput"""
+    parsed = {}
+    failures = []
+    start = time.perf_counter()
+    for url, html, _ in samples:
+        try:
+            parsed[url] = parse_comment_page(html, url)
+        except CommentParseError as e:
+            failures.append((url, e))
+    seconds = time.perf_counter() - start
+
+    print(f"{len(samples)} pages parsed in {seconds:.2f}s "
+          f"({len(samples) / seconds if seconds else 0:.0f} pages/s, {seconds / max(len(samples), 1) * 1000:.1f} ms/page)")
+    print(f"Parsed: {len(parsed)}, fell back to LLM: {len(failures)}")
+    for url, error in failures[:10]:
+        print(f"   {url}: {error}")
+
+    compared = [(parsed[url], reference) for url, _, reference in samples if url in parsed and reference]
+    if not compared:
+        print("No reference extractions to compare against")
+        return
+    print(f"Agreement with {len(compared)} reference extractions:")
+    for field in FIELDS:
+        agree = sum(1 for result, reference in compared if fields_agree(field, result.get(field), reference.get(field)))
+        print(f"   {field:15} {agree / len(compared) * 100:5.1f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the local comment page parser against LLM extractions')
+    parser.add_argument('--cache', help=f'Firecrawl cache to read pages and LLM extractions from (default: {DEFAULT_CACHE_PATH})')
+    parser.add_argument('--pages-dir', help='Directory of saved comment pages (*.html, with optional *.json references)')
+    args = parser.parse_args()
+
+    benchmark_parser(load_corpus(args.cache, args.pages_dir))
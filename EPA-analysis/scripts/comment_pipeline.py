@@ -0,0 +1,157 @@
+import time
+import signal
+import asyncio
+from contextlib import contextmanager
+from tqdm import tqdm
+from embeddings import get_chunked_embeddings
+from records import iter_batches
+from supabase_rows import upsert_comment_batch
+
+class StageStats:
+    """Comments handled and time spent by the workers of one pipeline stage"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.batches = 0
+        self.failed = 0
+        self.busy = 0.0
+
+    def add(self, items, seconds):
+        self.items += items
+        self.batches += 1
+        self.busy += seconds
+
+    def report(self, elapsed):
+        rate = self.items / elapsed if elapsed else 0.0
+        utilisation = self.busy / (elapsed * self.workers) if elapsed else 0.0
+        line = (f"  {self.name:<7}{self.items:>8} comments in {self.batches:>5} batches, {rate:8.1f}/s, "
+                f"busy {self.busy:7.1f}s ({utilisation:.0%} of {self.workers} worker{'s' if self.workers > 1 else ''})")
+        if self.failed:
+            line += f", {self.failed} failed"
+        print(line)
+
+@contextmanager
+def stop_on_interrupt(stopping):
+    """
+    Within a running event loop, make the first Ctrl-C set the stopping
+    event instead of raising KeyboardInterrupt; a second one aborts
+    """
+    loop = asyncio.get_running_loop()
+
+    def interrupt():
+        print("\nInterrupted: finishing the comments already read (Ctrl-C again to abort)")
+        stopping.set()
+        loop.remove_signal_handler(signal.SIGINT)
+
+    try:
+        loop.add_signal_handler(signal.SIGINT, interrupt)
+        installed = True
+    except (NotImplementedError, RuntimeError):
+        # Windows event loops and non-main threads can't; Ctrl-C aborts immediately there
+        installed = False
+    try:
+        yield
+    finally:
+        if installed and not stopping.is_set():
+            loop.remove_signal_handler(signal.SIGINT)
+
+async def upload_pipeline(client, documents, proposal_id, stopping, batch_size=10, embed_batch_size=500,
+                          embed_workers=2, upload_workers=4, upload_slots=None):
+    """
+    Embed and upload documents in overlapping stages
+
+    A reader feeds groups of embed_batch_size documents into a bounded queue;
+    embed_workers embed groups and split them into upload batches of
+    batch_size on a second bounded queue; upload_workers upsert those. Full
+    queues hold back the stage before them, so only a few groups are in
+    memory at once. The blocking OpenAI and Supabase calls run in threads.
+
+    Once stopping is set (see stop_on_interrupt), no more documents are read;
+    everything already read is still embedded and uploaded before returning.
+    If a stage raises (e.g. the reader on a malformed record), the other
+    stages are cancelled and the error is raised once they have stopped.
+
+    Args:
+        client: Supabase client the comments are upserted through
+        upload_slots: Optional semaphore limiting upserts in flight, shared
+            by pipelines running side by side
+
+    Returns:
+        Dictionary with the StageStats of each stage ('read', 'embed',
+        'upload'), the elapsed time and whether the run was interrupted
+    """
+    upload_slots = upload_slots or asyncio.Semaphore(upload_workers)
+    embed_queue = asyncio.Queue(maxsize=embed_workers)
+    upload_queue = asyncio.Queue(maxsize=upload_workers * 2)
+    stats = {'read': StageStats('read', 1), 'embed': StageStats('embed', embed_workers),
+             'upload': StageStats('upload', upload_workers)}
+    progress = tqdm(desc=f"Uploading comments for {proposal_id}", unit="comments")
+
+    async def read():
+        groups = iter_batches(documents, embed_batch_size)
+        while not stopping.is_set():
+            start = time.perf_counter()
+            group = await asyncio.to_thread(next, groups, None)
+            if group is None:
+                break
+            stats['read'].add(len(group), time.perf_counter() - start)
+            await embed_queue.put(group)
+        for _ in range(embed_workers):
+            await embed_queue.put(None)
+
+    async def embed():
+        while (group := await embed_queue.get()) is not None:
+            start = time.perf_counter()
+            try:
+                # Use combined_text for embedding if available, otherwise use comment_text; all of it is
+                # embedded in chunks, so attachments past the first pages count too
+                embedded = await asyncio.to_thread(
+                    get_chunked_embeddings, [doc.get('combined_text', doc['comment_text']) for doc in group])
+            except Exception as e:
+                print(f"Error embedding batch: {e}")
+                stats['embed'].failed += len(group)
+                continue
+            stats['embed'].add(len(group), time.perf_counter() - start)
+
+            for j in range(0, len(group), batch_size):
+                await upload_queue.put((group[j:j+batch_size], embedded[j:j+batch_size]))
+
+    async def upload():
+        while (item := await upload_queue.get()) is not None:
+            batch, embedded = item
+            async with upload_slots:
+                start = time.perf_counter()
+                uploaded = await asyncio.to_thread(upsert_comment_batch, client, batch, embedded, proposal_id)
+            if uploaded:
+                stats['upload'].add(len(batch), time.perf_counter() - start)
+            else:
+                stats['upload'].failed += len(batch)
+            progress.update(len(batch))
+
+    start = time.perf_counter()
+    producers = [asyncio.create_task(read())] + [asyncio.create_task(embed()) for _ in range(embed_workers)]
+    uploaders = [asyncio.create_task(upload()) for _ in range(upload_workers)]
+
+    async def close_uploads():
+        await asyncio.gather(*producers)
+        for _ in uploaders:
+            await upload_queue.put(None)
+
+    tasks = producers + uploaders + [asyncio.create_task(close_uploads())]
+    try:
+        # Waiting on every stage at once surfaces the first error from any of them
+        await asyncio.gather(*tasks[len(producers):])
+    finally:
+        # After an error the other stages would wait on their queues forever; finished tasks ignore cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        progress.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Pipeline for {proposal_id} finished in {elapsed:.1f}s")
+    for stage in stats.values():
+        stage.report(elapsed)
+    return {**stats, 'elapsed': elapsed, 'interrupted': stopping.is_set()}
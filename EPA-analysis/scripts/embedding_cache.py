@@ -0,0 +1,132 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+
+# Shared by 4_upload_to_database.py and supabase_comment_loader.py
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processed', 'embedding_cache.sqlite')
+DEFAULT_MAX_ENTRIES = 100000
+
+# SQLite limits the number of bound parameters per statement
+LOOKUP_CHUNK = 500
+
+def cache_key(model, text):
+    """Content address of an embedding: hash of the model name and the exact input text"""
+    return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache backed by SQLite with LRU eviction
+
+    Vectors are stored as float32 blobs keyed by cache_key(model, text). Each
+    hit refreshes the entry's last_used time; once the cache holds more than
+    max_entries, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            path: SQLite database file
+            max_entries: Maximum number of cached embeddings
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used_idx ON embeddings(last_used)')
+        self._conn.commit()
+
+    def get_many(self, keys):
+        """Return {key: embedding} for the keys present in the cache, counting hits and misses"""
+        found = {}
+        now = time.time()
+
+        with self._lock:
+            for i in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[i:i + LOOKUP_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})', chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+
+                # Refresh recency of the entries we just used
+                self._conn.execute(
+                    f'UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})', [now] + chunk
+                )
+            self._conn.commit()
+
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+
+        return found
+
+    def put_many(self, items):
+        """Store (key, embedding) pairs, then evict least recently used entries over the cap"""
+        now = time.time()
+        rows = [(key, array('f', embedding).tobytes(), now) for key, embedding in items if embedding]
+        if not rows:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, embedding, last_used) VALUES (?, ?, ?)', rows
+            )
+
+            count = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    'DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)',
+                    (excess,)
+                )
+                self.evictions += excess
+            self._conn.commit()
+
+    def print_stats(self):
+        """Print hit/miss counters for this run"""
+        lookups = self.hits + self.misses
+        hit_rate = (self.hits / lookups * 100) if lookups else 0.0
+        print(f"Embedding cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+              f"{self.evictions} evictions [{self.path}]")
+
+    def close(self):
+        self._conn.close()
+
+_default_cache = None
+# Embedding worker threads can ask for the cache at the same time
+_default_cache_lock = threading.Lock()
+
+def get_default_cache():
+    """
+    Open the shared cache configured by EMBEDDING_CACHE_PATH / EMBEDDING_CACHE_MAX_ENTRIES
+
+    Returns None when EMBEDDING_CACHE_PATH is set to an empty string, which
+    disables caching.
+    """
+    global _default_cache
+    path = os.getenv('EMBEDDING_CACHE_PATH', DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            max_entries = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+            _default_cache = EmbeddingCache(path, max_entries)
+    return _default_cache
@@ -0,0 +1,339 @@
+import os
+import re
+import openai
+import numpy as np
+from dotenv import load_dotenv
+from embedding_cache import cache_key, get_default_cache
+
+# Exact token counts need tiktoken; without it the 4-characters-per-token estimate is used
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Load environment variables
+load_dotenv()
+
+# Setup OpenAI client; OPENAI_API_BASE can point at a local stub server for testing
+openai.api_key = os.getenv('OPENAI_API_KEY')
+if os.getenv('OPENAI_API_BASE'):
+    openai.api_base = os.getenv('OPENAI_API_BASE')
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# The model accepts 8191 tokens; with estimated counts (1 token is roughly 4 chars
+# for English text) stay at 7000 to be safe
+MODEL_MAX_TOKENS = 8191
+ESTIMATED_MAX_INPUT_TOKENS = 7000
+MAX_INPUT_TOKENS = MODEL_MAX_TOKENS if tiktoken else ESTIMATED_MAX_INPUT_TOKENS
+
+# Chunked embeddings split text into windows of at most this many tokens
+CHUNK_TOKENS = int(os.getenv('EMBEDDING_CHUNK_TOKENS', '800'))
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+# Per-request limits for batched embedding calls
+MAX_BATCH_TOKENS = int(os.getenv('EMBEDDING_BATCH_TOKENS', '100000'))
+MAX_BATCH_INPUTS = int(os.getenv('EMBEDDING_BATCH_INPUTS', '2048'))
+
+_encoding = None
+_encoding_failed = False
+
+def get_encoding():
+    """tiktoken encoding of EMBEDDING_MODEL, or None if tiktoken or its tokenizer files are unavailable"""
+    global _encoding, _encoding_failed
+    if _encoding is None and tiktoken is not None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+        except Exception as e:
+            # The tokenizer files are downloaded on first use
+            print(f"Warning: tiktoken encoding unavailable ({e}), estimating token counts")
+            _encoding_failed = True
+    return _encoding
+
+def estimate_tokens(text):
+    """Rough token count for English text (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+def count_tokens(text):
+    """Token count of text for EMBEDDING_MODEL, exact when tiktoken is available"""
+    encoding = get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_for_embedding(text, max_tokens=None):
+    """Truncate text so it fits in a single embedding input"""
+    encoding = get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        max_tokens = max_tokens or MODEL_MAX_TOKENS
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+    max_tokens = max_tokens or ESTIMATED_MAX_INPUT_TOKENS
+    max_chars = max_tokens * 4
+
+    if len(text) > max_chars:
+        # Truncate text to avoid exceeding token limit
+        text = text[:max_chars]
+        # Further ensure we're within limits by truncating at the last complete sentence
+        last_period = text.rfind('.')
+        if last_period > max_chars * 0.8:  # If we find a period in the last 20% of the text
+            text = text[:last_period + 1]
+
+    return text
+
+def pack_batches(texts, max_batch_tokens=MAX_BATCH_TOKENS, max_batch_inputs=MAX_BATCH_INPUTS):
+    """
+    Group text positions into request-sized batches
+
+    Args:
+        texts: Texts to embed (already truncated)
+        max_batch_tokens: Token budget per request
+        max_batch_inputs: Maximum number of inputs per request
+
+    Returns:
+        List of lists of positions into texts, in order
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+
+    for position, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if current and (current_tokens + tokens > max_batch_tokens or len(current) >= max_batch_inputs):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(position)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+def _split_spans(text, start, end, pattern):
+    """Whitespace-trimmed (start, end) spans of text[start:end] between matches of pattern"""
+    spans = []
+    for match in pattern.finditer(text, start, end):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, end))
+    trimmed = []
+    for span_start, span_end in spans:
+        while span_start < span_end and text[span_start].isspace():
+            span_start += 1
+        while span_end > span_start and text[span_end - 1].isspace():
+            span_end -= 1
+        if span_start < span_end:
+            trimmed.append((span_start, span_end))
+    return trimmed
+
+def _hard_split(text, start, end, max_tokens):
+    """Split a span with no usable boundaries into windows of at most max_tokens"""
+    windows = []
+    while start < end:
+        stop = min(end, start + max_tokens * 4)
+        while stop - start > 1 and count_tokens(text[start:stop]) > max_tokens:
+            stop = start + (stop - start) * 9 // 10
+        # Prefer to break between words
+        space = text.rfind(' ', start, stop)
+        if stop < end and space > start + (stop - start) // 2:
+            stop = space
+        windows.append((start, stop))
+        start = stop
+        while start < end and text[start].isspace():
+            start += 1
+    return windows
+
+def chunk_spans(text, max_tokens=CHUNK_TOKENS):
+    """
+    Split text into windows of whole paragraphs of at most max_tokens tokens
+
+    Consecutive paragraphs are packed into one window while they fit. A
+    paragraph longer than max_tokens is split between sentences, and a
+    sentence that is still too long between words.
+
+    Returns:
+        List of (start, end, token_count) character spans into text
+    """
+    pieces = []
+    for start, end in _split_spans(text, 0, len(text), PARAGRAPH_BREAK):
+        tokens = count_tokens(text[start:end])
+        if tokens <= max_tokens:
+            pieces.append((start, end, tokens))
+            continue
+        for sentence_start, sentence_end in _split_spans(text, start, end, SENTENCE_BREAK):
+            sentence_tokens = count_tokens(text[sentence_start:sentence_end])
+            if sentence_tokens <= max_tokens:
+                pieces.append((sentence_start, sentence_end, sentence_tokens))
+            else:
+                for window_start, window_end in _hard_split(text, sentence_start, sentence_end, max_tokens):
+                    pieces.append((window_start, window_end, count_tokens(text[window_start:window_end])))
+
+    chunks = []
+    window_start = window_end = None
+    window_tokens = 0
+    for start, end, tokens in pieces:
+        # +1 for the paragraph break joining two pieces
+        if window_start is not None and window_tokens + tokens + 1 > max_tokens:
+            chunks.append((window_start, window_end, count_tokens(text[window_start:window_end])))
+            window_start = None
+        if window_start is None:
+            window_start, window_tokens = start, 0
+        window_end = end
+        window_tokens += tokens + 1
+    if window_start is not None:
+        chunks.append((window_start, window_end, count_tokens(text[window_start:window_end])))
+    return chunks
+
+def pool_embeddings(vectors, weights):
+    """Weighted mean of embeddings, scaled back to unit length"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    pooled = np.average(matrix, axis=0, weights=np.asarray(weights, dtype=np.float32))
+    norm = np.linalg.norm(pooled)
+    return (pooled / norm if norm > 0 else pooled).tolist()
+
+def get_embedding(text, cache=None):
+    """
+    Generate embedding vector for text using OpenAI's embedding API
+
+    Text longer than one chunk is embedded in chunks and pooled, as
+    get_chunked_embeddings does, instead of being cut short.
+    """
+    return get_chunked_embeddings([text], cache=cache)[0]['embedding']
+
+def _embed_in_chunks(text):
+    """Embed the chunks of one input the API rejected as too long in a single request and pool them"""
+    spans = chunk_spans(text)
+    response = openai.Embedding.create(
+        input=[text[start:end] for start, end, _ in spans],
+        model=EMBEDDING_MODEL
+    )
+    vectors = [item['embedding'] for item in sorted(response['data'], key=lambda item: item['index'])]
+    if len(vectors) == 1:
+        return vectors[0]
+    return pool_embeddings(vectors, [tokens for _, _, tokens in spans])
+
+def get_embeddings(texts, max_batch_tokens=MAX_BATCH_TOKENS, max_batch_inputs=MAX_BATCH_INPUTS, cache=None):
+    """
+    Generate embeddings for many texts with as few API requests as possible
+
+    Texts already in the embedding cache are not sent at all. The rest are
+    packed into requests under the token budget and the results are mapped
+    back by their response index, so the output lines up with texts. Blank
+    texts get an empty embedding, as with get_embedding.
+
+    Args:
+        texts: List of texts to embed
+        max_batch_tokens: Token budget per request
+        max_batch_inputs: Maximum number of inputs per request
+        cache: EmbeddingCache to use (defaults to the shared on-disk cache)
+
+    Returns:
+        List of embeddings (lists of floats), one per input text
+    """
+    if cache is None:
+        cache = get_default_cache()
+
+    embeddings = [[] for _ in texts]
+
+    # Only non-blank texts are sent to the API, keyed by what is actually sent
+    positions_by_key = {}
+    truncated_by_key = {}
+    for i, text in enumerate(texts):
+        if text and text.strip():
+            truncated = truncate_for_embedding(text)
+            key = cache_key(EMBEDDING_MODEL, truncated)
+            positions_by_key.setdefault(key, []).append(i)
+            truncated_by_key[key] = truncated
+
+    cached = cache.get_many(list(positions_by_key)) if cache else {}
+    for key, embedding in cached.items():
+        for i in positions_by_key[key]:
+            embeddings[i] = embedding
+
+    missing = [key for key in positions_by_key if key not in cached]
+    inputs_missing = [truncated_by_key[key] for key in missing]
+
+    for batch in pack_batches(inputs_missing, max_batch_tokens, max_batch_inputs):
+        inputs = [inputs_missing[j] for j in batch]
+        results = {}
+        try:
+            response = openai.Embedding.create(
+                input=inputs,
+                model=EMBEDDING_MODEL
+            )
+            for item in response['data']:
+                results[missing[batch[item['index']]]] = item['embedding']
+        except openai.error.InvalidRequestError as e:
+            if "maximum context length" not in str(e):
+                raise
+            # An estimated token count was too low for one input; embed each input of this batch in
+            # chunks, which are far below the limit. A chunk that is still too long raises.
+            print(f"Warning: Batch of {len(inputs)} hit the context limit, embedding its texts in chunks")
+            for j in batch:
+                results[missing[j]] = _embed_in_chunks(inputs_missing[j])
+
+        for key, embedding in results.items():
+            for i in positions_by_key[key]:
+                embeddings[i] = embedding
+
+        if cache:
+            cache.put_many(results.items())
+
+    return embeddings
+
+def get_chunked_embeddings(texts, max_chunk_tokens=CHUNK_TOKENS, cache=None):
+    """
+    Embed every part of each text instead of only its first MAX_INPUT_TOKENS
+
+    Each text is split into paragraph-aligned chunks of at most
+    max_chunk_tokens tokens (see chunk_spans); all chunks of all texts are
+    embedded together through get_embeddings, so they share its batching and
+    cache. A text that fits in one chunk gets the same embedding as before.
+
+    Args:
+        texts: List of texts to embed
+        max_chunk_tokens: Token limit per chunk
+        cache: EmbeddingCache to use (defaults to the shared on-disk cache)
+
+    Returns:
+        One dictionary per text with 'embedding' (token-weighted mean of the
+        chunk vectors, unit length; empty for blank text) and 'chunks', a list
+        of {'chunk_index', 'start_char', 'end_char', 'token_count', 'embedding'}
+        with character offsets into the text
+    """
+    spans = [chunk_spans(text or '', max_chunk_tokens) for text in texts]
+    vectors = iter(get_embeddings([text[start:end] for text, text_spans in zip(texts, spans)
+                                   for start, end, _ in text_spans], cache=cache))
+
+    results = []
+    for text_spans in spans:
+        chunks = []
+        for chunk_index, (start, end, tokens) in enumerate(text_spans):
+            chunks.append({
+                'chunk_index': chunk_index,
+                'start_char': start,
+                'end_char': end,
+                'token_count': tokens,
+                'embedding': next(vectors),
+            })
+        embedded = [chunk for chunk in chunks if chunk['embedding']]
+        if len(embedded) == 1:
+            embedding = embedded[0]['embedding']
+        elif embedded:
+            embedding = pool_embeddings([chunk['embedding'] for chunk in embedded],
+                                        [chunk['token_count'] for chunk in embedded])
+        else:
+            embedding = []
+        results.append({'embedding': embedding, 'chunks': chunks})
+    return results
+
+def print_cache_stats():
+    """Print hit/miss counters of the shared embedding cache, if enabled"""
+    cache = get_default_cache()
+    if cache:
+        cache.print_stats()
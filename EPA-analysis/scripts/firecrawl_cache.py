@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from types import SimpleNamespace
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processed', 'firecrawl_cache.sqlite')
+DEFAULT_MAX_MB = 2048
+DEFAULT_TTL_HOURS = 168
+
+# Formats stored as raw page content; "json" is Firecrawl's LLM extraction
+RAW_FORMATS = ('html', 'markdown')
+EXTRACT_FORMAT = 'json'
+
+def request_key(url, options):
+    """Hash of a URL and request options, independent of option order"""
+    payload = json.dumps({'url': url, 'options': options}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _text_size(*values):
+    return sum(len(value.encode('utf-8')) for value in values if value)
+
+class FirecrawlCache:
+    """
+    On-disk cache of Firecrawl scrape results backed by SQLite
+
+    Raw page content (HTML and markdown) and LLM-extracted JSON live in
+    separate tables. Raw pages are keyed by the URL and page-loading options
+    only, so they are shared by every extraction prompt and can be re-parsed
+    offline; extractions are keyed by the URL and all options including the
+    prompt. Entries older than the TTL count as misses, and once the cache
+    grows past max_bytes the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, ttl=DEFAULT_TTL_HOURS * 3600):
+        """
+        Args:
+            path: SQLite database file
+            max_bytes: Maximum total size of cached content
+            ttl: Seconds an entry stays fresh (None or 0 for no expiry)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                html TEXT,
+                markdown TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                data TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS pages_last_used_idx ON pages(last_used)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS extractions_last_used_idx ON extractions(last_used)')
+
+        # Drop expired entries up front so they don't count toward the size cap
+        if self.ttl:
+            cutoff = time.time() - self.ttl
+            self._conn.execute('DELETE FROM pages WHERE fetched_at < ?', (cutoff,))
+            self._conn.execute('DELETE FROM extractions WHERE fetched_at < ?', (cutoff,))
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            'SELECT (SELECT COALESCE(SUM(size), 0) FROM pages) + (SELECT COALESCE(SUM(size), 0) FROM extractions)'
+        ).fetchone()[0]
+
+    @staticmethod
+    def _keys(kwargs):
+        """Return (url, formats, raw page key, extraction key) for a scrape_url call"""
+        url = kwargs['url']
+        formats = list(kwargs.get('formats') or ['markdown'])
+        options = {name: value for name, value in kwargs.items() if name not in ('url', 'formats')}
+        page_options = {name: value for name, value in options.items() if name != 'json_options'}
+        return url, formats, request_key(url, page_options), request_key(url, options)
+
+    def _fresh(self, row):
+        return row is not None and (not self.ttl or row['fetched_at'] >= time.time() - self.ttl)
+
+    def get(self, **kwargs):
+        """
+        Return a cached result for a scrape_url call, or None on a miss
+
+        The result has an attribute for each requested format. Requests for
+        formats the cache doesn't store always miss.
+        """
+        url, formats, page_key, extraction_key = self._keys(kwargs)
+        if any(fmt not in RAW_FORMATS and fmt != EXTRACT_FORMAT for fmt in formats):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        result = {}
+        now = time.time()
+        with self._lock:
+            raw_formats = [fmt for fmt in formats if fmt in RAW_FORMATS]
+            if raw_formats:
+                row = self._conn.execute('SELECT * FROM pages WHERE key = ?', (page_key,)).fetchone()
+                if not self._fresh(row) or any(row[fmt] is None for fmt in raw_formats):
+                    self.misses += 1
+                    return None
+                result.update({fmt: row[fmt] for fmt in raw_formats})
+
+            if EXTRACT_FORMAT in formats:
+                row = self._conn.execute('SELECT * FROM extractions WHERE key = ?', (extraction_key,)).fetchone()
+                if not self._fresh(row):
+                    self.misses += 1
+                    return None
+                result[EXTRACT_FORMAT] = json.loads(row['data'])
+                self._conn.execute('UPDATE extractions SET last_used = ? WHERE key = ?', (now, extraction_key))
+
+            if raw_formats:
+                self._conn.execute('UPDATE pages SET last_used = ? WHERE key = ?', (now, page_key))
+            self._conn.commit()
+            self.hits += 1
+
+        return SimpleNamespace(**result)
+
+    def put(self, kwargs, result):
+        """Store the formats present in a scrape_url result, then evict least recently used entries over the cap"""
+        url, formats, page_key, extraction_key = self._keys(kwargs)
+        now = time.time()
+        html = getattr(result, 'html', None)
+        markdown = getattr(result, 'markdown', None)
+        data = getattr(result, EXTRACT_FORMAT, None) if EXTRACT_FORMAT in formats else None
+
+        with self._lock:
+            if html is not None or markdown is not None:
+                # Keep formats stored by an earlier request that this one didn't ask for
+                row = self._conn.execute('SELECT html, markdown, size FROM pages WHERE key = ?', (page_key,)).fetchone()
+                if row:
+                    html = html if html is not None else row['html']
+                    markdown = markdown if markdown is not None else row['markdown']
+                    self._total_bytes -= row['size']
+                size = _text_size(html, markdown)
+                self._conn.execute('''
+                    INSERT OR REPLACE INTO pages (key, url, html, markdown, size, fetched_at, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (page_key, url, html, markdown, size, now, now))
+                self._total_bytes += size
+
+            if data is not None:
+                row = self._conn.execute('SELECT size FROM extractions WHERE key = ?', (extraction_key,)).fetchone()
+                if row:
+                    self._total_bytes -= row['size']
+                serialized = json.dumps(data)
+                size = _text_size(serialized)
+                self._conn.execute('''
+                    INSERT OR REPLACE INTO extractions (key, url, data, size, fetched_at, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (extraction_key, url, serialized, size, now, now))
+                self._total_bytes += size
+
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Delete least recently used entries from either table until the cache fits in max_bytes"""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute('''
+                SELECT 'pages' AS tbl, key, size, last_used FROM pages
+                UNION ALL
+                SELECT 'extractions' AS tbl, key, size, last_used FROM extractions
+                ORDER BY last_used LIMIT 100
+            ''').fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for row in rows:
+                if self._total_bytes <= self.max_bytes:
+                    return
+                self._conn.execute(f"DELETE FROM {row['tbl']} WHERE key = ?", (row['key'],))
+                self._total_bytes -= row['size']
+                self.evictions += 1
+
+    def iter_pages(self, url_prefix=''):
+        """
+        Yield cached raw pages as {url, html, markdown} dictionaries, for re-running extraction offline
+
+        Args:
+            url_prefix: Only yield pages whose URL starts with this prefix
+        """
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT url, html, markdown FROM pages WHERE substr(url, 1, ?) = ? ORDER BY fetched_at
+            ''', (len(url_prefix), url_prefix)).fetchall()
+        for row in rows:
+            yield dict(row)
+
+    def iter_extractions(self, url_prefix=''):
+        """Yield cached LLM extractions as {url, data} dictionaries (the latest one per URL wins when collected into a dict)"""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT url, data FROM extractions WHERE substr(url, 1, ?) = ? ORDER BY fetched_at
+            ''', (len(url_prefix), url_prefix)).fetchall()
+        for row in rows:
+            yield {'url': row['url'], 'data': json.loads(row['data'])}
+
+    def print_stats(self):
+        """Print hit/miss counters for this run"""
+        lookups = self.hits + self.misses
+        hit_rate = (self.hits / lookups * 100) if lookups else 0.0
+        print(f"Firecrawl cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+              f"{self.evictions} evictions, {self._total_bytes / 1024 / 1024:.1f} MB [{self.path}]")
+
+    def close(self):
+        self._conn.close()
+
+def get_default_cache():
+    """
+    Open the cache configured by FIRECRAWL_CACHE_PATH / FIRECRAWL_CACHE_MAX_MB / FIRECRAWL_CACHE_TTL_HOURS
+
+    Returns None when FIRECRAWL_CACHE_PATH is set to an empty string, which
+    disables caching.
+    """
+    path = os.getenv('FIRECRAWL_CACHE_PATH', DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+
+    max_mb = float(os.getenv('FIRECRAWL_CACHE_MAX_MB', DEFAULT_MAX_MB))
+    ttl_hours = float(os.getenv('FIRECRAWL_CACHE_TTL_HOURS', DEFAULT_TTL_HOURS))
+    return FirecrawlCache(path, max_bytes=int(max_mb * 1024 * 1024), ttl=ttl_hours * 3600)
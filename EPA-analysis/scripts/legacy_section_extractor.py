@@ -0,0 +1,183 @@
+import re
+import uuid
+
+def extract_epa_sections_legacy(markdown_text):
+    """The original regex/slicing extractor, kept as the reference the one-pass extractor is tested and timed against"""
+    sections = []
+
+    # Split the markdown by pages and normalize
+    pages = re.split(r'---\n', markdown_text)
+    text = '\n'.join(pages)
+    text = re.sub(r'\r\n', '\n', text)
+
+    # Find the start of "I. General Information"
+    main_sections_start = re.search(r'^### I\. General Information', text, re.MULTILINE)
+    if not main_sections_start:
+        # Try alternative patterns
+        main_sections_start = re.search(r'^# I\. General Information', text, re.MULTILINE)
+
+    if main_sections_start:
+        # Everything before "I. General Information" becomes the introduction
+        intro_text = text[:main_sections_start.start()].strip()
+        remaining_text = text[main_sections_start.start():]
+
+        if intro_text:
+            # Create consolidated introduction section
+            intro_section = {
+                'section_id': str(uuid.uuid4()),
+                'section_number': 'INTRO',
+                'section_title': 'Document Header and Supplementary Information',
+                'section_text': intro_text,
+                'hierarchy_level': 0,
+                'parent_section_id': None
+            }
+            sections.append(intro_section)
+    else:
+        # If we can't find the main sections, treat the whole document as intro
+        remaining_text = text
+        intro_section = {
+            'section_id': str(uuid.uuid4()),
+            'section_number': 'INTRO',
+            'section_title': 'Complete Document',
+            'section_text': text.strip(),
+            'hierarchy_level': 0,
+            'parent_section_id': None
+        }
+        sections.append(intro_section)
+        return sections
+
+    # Now parse the main numbered sections (I, II, III, etc.)
+    main_section_pattern = r'^### ([IVXLCDM]+)\.\s+([^\n]+)'
+    sub_section_pattern = r'^#### ([A-Z])\.\s+([^\n]+)'
+
+    # Find all main sections
+    main_sections = list(re.finditer(main_section_pattern, remaining_text, re.MULTILINE))
+
+    # If no main sections found with ###, try with #
+    if not main_sections:
+        main_section_pattern = r'^# ([IVXLCDM]+)\.\s+([^\n]+)'
+        sub_section_pattern = r'^# ([A-Z])\.\s+([^\n]+)'
+        main_sections = list(re.finditer(main_section_pattern, remaining_text, re.MULTILINE))
+
+    parent_sections = {}  # Store section_id by section number for parent lookup
+
+    # Process main sections
+    for i, match in enumerate(main_sections):
+        section_number = match.group(1)
+        section_title = match.group(2).strip()
+        start_pos = match.start()
+
+        # Determine where this section ends
+        if i < len(main_sections) - 1:
+            end_pos = main_sections[i + 1].start()
+        else:
+            # For the last section, find regulatory text or end of document
+            regulatory_text = re.search(r'^# PART \d+--', remaining_text[start_pos:], re.MULTILINE)
+            if regulatory_text:
+                end_pos = start_pos + regulatory_text.start()
+            else:
+                end_pos = len(remaining_text)
+
+        # Extract section text
+        section_text = remaining_text[start_pos:end_pos].strip()
+
+        # Create main section
+        section_id = str(uuid.uuid4())
+        section = {
+            'section_id': section_id,
+            'section_number': section_number,
+            'section_title': section_title,
+            'section_text': section_text,
+            'hierarchy_level': 1,
+            'parent_section_id': None
+        }
+
+        sections.append(section)
+        parent_sections[section_number] = section_id
+
+    # Now find and process subsections within each main section
+    for main_section in sections[1:]:  # Skip the intro section
+        section_text = main_section['section_text']
+        subsections = list(re.finditer(sub_section_pattern, section_text, re.MULTILINE))
+
+        for j, sub_match in enumerate(subsections):
+            sub_section_number = sub_match.group(1)
+            sub_section_title = sub_match.group(2).strip()
+            sub_start_pos = sub_match.start()
+
+            # Determine where this subsection ends
+            if j < len(subsections) - 1:
+                sub_end_pos = subsections[j + 1].start()
+            else:
+                sub_end_pos = len(section_text)
+
+            # Extract subsection text
+            subsection_text = section_text[sub_start_pos:sub_end_pos].strip()
+
+            # Create subsection
+            subsection = {
+                'section_id': str(uuid.uuid4()),
+                'section_number': sub_section_number,
+                'section_title': sub_section_title,
+                'section_text': subsection_text,
+                'hierarchy_level': 2,
+                'parent_section_id': main_section['section_id']
+            }
+
+            sections.append(subsection)
+
+    # Add regulatory text section if it exists
+    regulatory_match = re.search(r'(^# PART \d+--.*?)(?=^#|\Z)', remaining_text, re.DOTALL | re.MULTILINE)
+    if regulatory_match:
+        regulatory_text = regulatory_match.group(1).strip()
+        regulatory_section = {
+            'section_id': str(uuid.uuid4()),
+            'section_number': 'REGULATORY',
+            'section_title': 'Regulatory Text Amendments',
+            'section_text': regulatory_text,
+            'hierarchy_level': 1,
+            'parent_section_id': None
+        }
+        sections.append(regulatory_section)
+
+    return sections
+
+def roman_numeral(number):
+    """Roman numeral for a positive integer"""
+    numerals = [(1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
+                (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')]
+    result = []
+    for value, numeral in numerals:
+        count, number = divmod(number, value)
+        result.append(numeral * count)
+    return ''.join(result)
+
+def synthetic_federal_register(target_bytes):
+    """Generate a Federal Register-style markdown document of roughly target_bytes"""
+    paragraph = ("The EPA is proposing amendments to the national emission standards for hazardous air "
+                 "pollutants, including revised emission limits, monitoring requirements, and compliance "
+                 "dates, and solicits comment on the analyses supporting these proposed revisions.\n\n")
+    parts = ["## ACTION:\n\nProposed rule.\n\n## SUMMARY:\n\n", paragraph * 5, "## SUPPLEMENTARY INFORMATION:\n\n"]
+    size = sum(len(part) for part in parts)
+    number = 1
+    while size < target_bytes:
+        title = "General Information" if number == 1 else f"Analytical Results for Source Category {number}"
+        section = [f"### {roman_numeral(number)}. {title}\n\n", paragraph * 3]
+        for letter in 'ABCDEFGH':
+            section.append(f"#### {letter}. What revisions are we proposing for requirement {letter}?\n\n")
+            section.append(paragraph * 6)
+            section.append("---\n")
+        section = ''.join(section)
+        parts.append(section)
+        size += len(section)
+        number += 1
+    parts.append("# PART 63--NATIONAL EMISSION STANDARDS FOR HAZARDOUS AIR POLLUTANTS\n\n" + paragraph * 20)
+    return ''.join(parts)
+
+def same_sections(first, second):
+    """Compare two section lists, ignoring the random section IDs but not the parent links"""
+    def comparable(sections):
+        index = {section['section_id']: i for i, section in enumerate(sections)}
+        return [(s['section_number'], s['section_title'], s['section_text'], s['hierarchy_level'],
+                 index.get(s['parent_section_id'])) for s in sections]
+    return comparable(first) == comparable(second)
@@ -0,0 +1,143 @@
+import os
+import glob
+import time
+import argparse
+from bs4 import BeautifulSoup
+
+# Use the fastest installed HTML parser; all of them return hrefs in document order
+try:
+    from selectolax.parser import HTMLParser
+
+    def extract_hrefs(html):
+        """Return the href of every <a> element in document order (selectolax)"""
+        return [node.attributes.get('href') or '' for node in HTMLParser(html).css('a[href]')]
+
+    PARSER_BACKEND = 'selectolax'
+except ImportError:
+    try:
+        import lxml.html
+
+        def extract_hrefs(html):
+            """Return the href of every <a> element in document order (lxml)"""
+            if not html or not html.strip():
+                return []
+            return [str(href) for href in lxml.html.fromstring(html).xpath('//a/@href')]
+
+        PARSER_BACKEND = 'lxml'
+    except ImportError:
+        def extract_hrefs(html):
+            """Return the href of every <a> element in document order (html.parser)"""
+            return [link['href'] for link in BeautifulSoup(html, 'html.parser').find_all('a', href=True)]
+
+        PARSER_BACKEND = 'html.parser'
+
+def collect_listing_links(html, current_page, seen):
+    """
+    Collect comment links and detect the next-page link in one pass over a listing page
+
+    Args:
+        html: Listing page HTML
+        current_page: Page number of this listing page
+        seen: Ordered set (a dict with None values) of comment URLs found on
+            earlier pages; new URLs are added to it in page order
+
+    Returns:
+        (new comment URLs in page order, whether a link to the next page exists)
+    """
+    new_links = []
+    has_next = False
+    next_page_marker = f'pageNumber={current_page + 1}'
+
+    for href in extract_hrefs(html):
+        if '/comment/EPA-' in href:
+            # Fix URL format to ensure it's properly formed
+            full_url = f"https://www.regulations.gov{href}" if href.startswith('/') else href
+
+            # Ensure we don't have duplicate URLs (dict lookup, not a list scan)
+            if full_url not in seen:
+                seen[full_url] = None
+                new_links.append(full_url)
+
+        if not has_next and 'pageNumber=' in href and next_page_marker in href:
+            has_next = True
+
+    return new_links, has_next
+
+def collect_listing_links_legacy(html, current_page, all_comment_links):
+    """The original two-pass BeautifulSoup collector with list membership checks, kept for benchmarking"""
+    page_comment_links = []
+    soup = BeautifulSoup(html, 'html.parser')
+    for link in soup.find_all('a', href=True):
+        if '/comment/EPA-' in link['href']:
+            if link['href'].startswith('/'):
+                full_url = f"https://www.regulations.gov{link['href']}"
+            else:
+                full_url = link['href']
+            if full_url not in page_comment_links and full_url not in all_comment_links:
+                page_comment_links.append(full_url)
+
+    next_link = None
+    for link in soup.find_all('a', href=True):
+        if 'pageNumber=' in link['href'] and f'pageNumber={current_page+1}' in link['href']:
+            next_link = link
+            break
+
+    all_comment_links.extend(page_comment_links)
+    return page_comment_links, next_link is not None
+
+def synthetic_listing_pages(comments, per_page=25, docket='EPA-HQ-OAR-2017-0015'):
+    """Generate regulations.gov-like listing pages for a docket with `comments` comments"""
+    pages = []
+    for start in range(0, comments, per_page):
+        page = start // per_page + 1
+        rows = ''.join(
+            f'<div class="card"><h3><a href="/comment/{docket}-{i:06d}">Comment from Commenter {i}</a></h3>'
+            f'<p>Posted by the EPA <a href="/docket/{docket}">{docket}</a></p></div>'
+            for i in range(start, min(start + per_page, comments))
+        )
+        nav = f'<a href="?pageNumber={page - 1}">Prev</a>' if page > 1 else ''
+        if start + per_page < comments:
+            nav += f'<a href="?pageNumber={page + 1}">Next</a>'
+        pages.append(f'<html><head><title>Comments</title></head><body><nav>{"<a href=/>Home</a>" * 20}</nav>'
+                     f'<main>{rows}</main><footer>{nav}</footer></body></html>')
+    return pages
+
+def benchmark_listing_parsers(pages, include_legacy=True):
+    """Time the single-pass collector against the legacy collector on a sequence of listing pages"""
+    print(f"{len(pages)} listing pages, parser backend: {PARSER_BACKEND}")
+
+    start = time.perf_counter()
+    seen = {}
+    for page_number, html in enumerate(pages, 1):
+        collect_listing_links(html, page_number, seen)
+    new_seconds = time.perf_counter() - start
+    print(f"single-pass: {len(seen)} links in {new_seconds:.2f}s ({len(pages) / new_seconds:.0f} pages/s)")
+
+    if include_legacy:
+        start = time.perf_counter()
+        all_comment_links = []
+        for page_number, html in enumerate(pages, 1):
+            collect_listing_links_legacy(html, page_number, all_comment_links)
+        legacy_seconds = time.perf_counter() - start
+        print(f"legacy:      {len(all_comment_links)} links in {legacy_seconds:.2f}s "
+              f"({len(pages) / legacy_seconds:.0f} pages/s)")
+        print(f"speedup: {legacy_seconds / new_seconds:.1f}x, same links in same order: "
+              f"{list(seen) == all_comment_links}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark comment link collection on listing pages')
+    parser.add_argument('--pages-dir', help='Directory of saved listing pages (*.html, read in sorted order)')
+    parser.add_argument('--comments', type=int, default=50000,
+                        help='Docket size for synthetic listing pages when --pages-dir is not given')
+    parser.add_argument('--skip-legacy', action='store_true', help='Only time the single-pass collector')
+    args = parser.parse_args()
+
+    if args.pages_dir:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.pages_dir, '*.html'))):
+            with open(path, 'r', encoding='utf-8') as f:
+                pages.append(f.read())
+    else:
+        pages = synthetic_listing_pages(args.comments)
+
+    benchmark_listing_parsers(pages, include_legacy=not args.skip_legacy)
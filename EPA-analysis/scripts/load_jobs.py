@@ -0,0 +1,58 @@
+from records import iter_records
+
+def add_job_arguments(parser, workers_help, batch_size=10, batch_help='Rows per upsert request', embed_batch_size=500):
+    """
+    Add the arguments shared by the upload scripts: what to load for which proposal, and how
+
+    Args:
+        batch_size: Default of --batch-size, described by batch_help
+        embed_batch_size: Default of --embed-batch-size; None leaves the
+            option out for loaders that embed each batch as it is written
+    """
+    parser.add_argument('--proposal-id', help='Proposal the loaded comments and sections belong to')
+    parser.add_argument('--sections', help='Document sections file (either output format of step 3)')
+    parser.add_argument('--comments', help='Comments JSON/JSONL file')
+    parser.add_argument('--jobs', help='JSON/JSONL file with one {"proposal_id", "sections", "comments"} object per '
+                                       'proposal; all of them are loaded concurrently (paths as for --sections/--comments)')
+    parser.add_argument('--workers', type=int, default=4, help=workers_help)
+    parser.add_argument('--batch-size', type=int, default=batch_size, help=f'{batch_help} (default: {batch_size})')
+    if embed_batch_size is not None:
+        parser.add_argument('--embed-batch-size', type=int, default=embed_batch_size,
+                            help=f'Comments embedded together before their upserts start (default: {embed_batch_size})')
+
+def jobs_from_args(parser, args):
+    """
+    List the loads requested on the command line
+
+    Returns:
+        List of {'proposal_id', 'sections', 'comments'} dictionaries, one per
+        proposal; sections or comments may be None. Exits through
+        parser.error if nothing or something incomplete was requested.
+    """
+    jobs = []
+    if args.jobs:
+        for job in iter_records(args.jobs):
+            jobs.append({'proposal_id': job.get('proposal_id'),
+                         'sections': job.get('sections'),
+                         'comments': job.get('comments')})
+    if args.proposal_id:
+        jobs.append({'proposal_id': args.proposal_id, 'sections': args.sections, 'comments': args.comments})
+    elif args.sections or args.comments:
+        parser.error('--sections and --comments need --proposal-id')
+    if not jobs:
+        parser.error('nothing to load: give --proposal-id with --sections and/or --comments, or --jobs')
+
+    seen = set()
+    for job in jobs:
+        if not job['proposal_id']:
+            parser.error(f"job without a proposal_id in {args.jobs}")
+        if not job['sections'] and not job['comments']:
+            parser.error(f"nothing to load for proposal {job['proposal_id']}")
+        if job['proposal_id'] in seen:
+            parser.error(f"proposal {job['proposal_id']} is listed more than once")
+        seen.add(job['proposal_id'])
+    if args.workers < 1 or args.batch_size < 1:
+        parser.error('--workers and --batch-size must be at least 1')
+    if getattr(args, 'embed_batch_size', 1) < 1:
+        parser.error('--embed-batch-size must be at least 1')
+    return jobs
@@ -0,0 +1,173 @@
+import os
+import time
+import queue
+import multiprocessing
+import multiprocessing.connection
+import PyPDF2
+from io import BytesIO
+
+def extract_pdf_text(pdf_content):
+    """Extract text from PDF content; PyPDF2 errors propagate to the caller"""
+    pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_content))
+    # Collect page texts and join once; repeated += copies the whole document per page
+    parts = []
+    for page in pdf_reader.pages:
+        parts.append(page.extract_text())
+        parts.append("\n")
+    return "".join(parts)
+
+def extract_pdf_file(path):
+    """Extract text from a PDF on disk (runs in a worker process)"""
+    with open(path, 'rb') as pdf_file:
+        return extract_pdf_text(pdf_file.read())
+
+def extract_pdf_to_text_file(path):
+    """
+    Extract text from a PDF on disk into a sidecar .txt file and return its path (runs in a worker process)
+
+    Raises ValueError when the PDF has no extractable text (e.g. a scan), so
+    it is recorded as failed rather than as an empty extraction.
+    """
+    text = extract_pdf_file(path)
+    if not text.strip():
+        raise ValueError(f"No text could be extracted from {path}")
+
+    text_path = f"{path}.txt"
+    partial_path = f"{text_path}.part"
+    with open(partial_path, 'w', encoding='utf-8') as text_file:
+        text_file.write(text)
+    os.replace(partial_path, text_path)
+    return text_path
+
+def _worker_loop(conn, extract):
+    """Run extract on each path received over conn and send back (ok, result or error)"""
+    while True:
+        try:
+            path = conn.recv()
+        except EOFError:
+            return
+        if path is None:
+            return
+        try:
+            conn.send((True, extract(path)))
+        except Exception as e:
+            try:
+                conn.send((False, e))
+            except Exception:
+                # The exception itself couldn't be pickled
+                conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+class _ExtractionWorker:
+    """
+    One worker process fed over its own pipe
+
+    A worker runs a single file at a time, so a file that hangs can be stopped
+    by killing exactly its process without disturbing the other workers.
+    """
+
+    def __init__(self, extract):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_loop, args=(child_conn, extract), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.job = None  # (key, path, deadline) while busy
+
+    def submit(self, key, path, deadline):
+        self.job = (key, path, deadline)
+        self.conn.send(path)
+
+    def result(self):
+        """Receive the current job's (key, result, error); raises EOFError if the worker died"""
+        key = self.job[0]
+        ok, value = self.conn.recv()
+        self.job = None
+        return (key, value, None) if ok else (key, "", value)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def close(self, timeout=1):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+def extract_pdf_files(jobs, workers=None, timeout=300, poll_interval=0.5, extract=extract_pdf_file):
+    """
+    Extract text from PDFs in worker processes as they become available
+
+    Each worker process handles one file at a time, so a file's timeout starts
+    when a worker actually picks it up. When a file exceeds its timeout only
+    its worker is killed and replaced; the other in-flight files keep running
+    against their original deadlines.
+
+    Args:
+        jobs: queue.Queue of (key, path) items, terminated by None
+        workers: Number of worker processes (defaults to the CPU count)
+        timeout: Seconds allowed per file
+        poll_interval: Seconds to wait for new jobs between timeout checks
+        extract: Module-level function run on each path in a worker process
+
+    Yields:
+        (key, result, error) as each file finishes, where result is what
+        extract returned (the text by default); error is None on success
+    """
+    workers = workers or os.cpu_count() or 1
+    idle = [_ExtractionWorker(extract) for _ in range(workers)]
+    busy = {}  # connection -> worker
+    exhausted = False
+
+    try:
+        while not exhausted or busy:
+            # Hand jobs to idle workers without blocking on the queue for long
+            while not exhausted and idle:
+                try:
+                    job = jobs.get(timeout=0 if busy else poll_interval)
+                except queue.Empty:
+                    break
+                if job is None:
+                    exhausted = True
+                else:
+                    key, path = job
+                    worker = idle.pop()
+                    worker.submit(key, path, time.monotonic() + timeout)
+                    busy[worker.conn] = worker
+
+            if not busy:
+                continue
+
+            next_deadline = min(worker.job[2] for worker in busy.values())
+            wait_for = max(0.0, min(next_deadline - time.monotonic(), poll_interval))
+            for conn in multiprocessing.connection.wait(list(busy), timeout=wait_for):
+                worker = busy.pop(conn)
+                key, path, _ = worker.job
+                try:
+                    finished = worker.result()
+                except (EOFError, OSError):
+                    worker.kill()
+                    worker = _ExtractionWorker(extract)
+                    finished = (key, "", RuntimeError(f"Text extraction worker exited while processing {path}"))
+                idle.append(worker)
+                yield finished
+
+            now = time.monotonic()
+            for conn, worker in list(busy.items()):
+                key, path, deadline = worker.job
+                if deadline <= now:
+                    # A hung PyPDF2 call can't be cancelled, only its process killed
+                    del busy[conn]
+                    worker.kill()
+                    idle.append(_ExtractionWorker(extract))
+                    yield key, "", TimeoutError(f"Text extraction took longer than {timeout}s: {path}")
+    finally:
+        for worker in idle:
+            worker.close()
+        for worker in busy.values():
+            worker.kill()
@@ -0,0 +1,245 @@
+import os
+import re
+import time
+import argparse
+import PyPDF2
+from records import RecordWriter
+from section_tree import SectionTreeBuilder, ENUMERATED_HEADING, PART_HEADING
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processed', 'epa_document_sections_pdf.json')
+
+# Page furniture repeated on every Federal Register page
+RUNNING_TEXT = re.compile(r'\s*(?:\d+ Federal Register\s*$|/ Vol\. \d+, No\. \d+ /|VerDate )')
+# The bracketed filing line closes a Federal Register document; anything after it belongs to the next one
+DOCUMENT_END = re.compile(r'\s*\[FR Doc\. ')
+# A continuation line of a heading set in body type is indented past the heading's first line
+HANGING_INDENT = 4.0
+# PyPDF2 merges consecutive lines in the same font into one run, so a numbered heading set in body
+# type can follow the end of a sentence mid-run; runs are split there and the builder vets the number
+EMBEDDED_HEADING = re.compile(r'(?<=[.?!)’”"] )(?=\d+\. [A-Z])')
+
+def iter_pdf_runs(path):
+    """
+    Yield (text, font, x) for every text run of a PDF, one page at a time
+
+    Only the current page's runs are held in memory. font is the PDF base
+    font name (e.g. "/Melior-Bold"), x the horizontal text position.
+    """
+    with open(path, 'rb') as pdf_file:
+        reader = PyPDF2.PdfReader(pdf_file)
+        for page in reader.pages:
+            runs = []
+
+            def visit(text, cm, tm, font_dict, font_size):
+                if text:
+                    font = (font_dict or {}).get('/BaseFont', '') if font_dict else ''
+                    runs.append((text, font, tm[4] if tm else 0.0))
+
+            page.extract_text(visitor_text=visit)
+            yield from runs
+
+def _is_display_font(font):
+    return 'Bold' in font or 'Italic' in font or 'Oblique' in font
+
+def iter_pdf_events(path):
+    """
+    Turn a PDF into a stream of ('heading', token, parenthesized, title),
+    ('part', number, title), ('end', text) and ('text', text) events
+
+    Headings are recognised from layout and font cues: a run that starts with
+    an enumerator ("II.", "B.", "1.") set in bold or italic type, or in body
+    type followed by a capitalised title. The title goes on over the
+    following runs in the same font (bold/italic), or to the end of the line
+    and over lines indented past the heading (body type). Regulatory PART headings are the
+    bold runs starting "PART n—". An 'end' event is the "[FR Doc. ...]"
+    line that closes a Federal Register document. Running heads and footers
+    are dropped.
+    """
+    heading = None  # [event, font, x]
+
+    def flush():
+        event = heading[0]
+        title = ' '.join(event[-1].split())
+        return event[:-1] + (title,)
+
+    def runs():
+        for text, font, x in iter_pdf_runs(path):
+            if _is_display_font(font):
+                yield text, font, x
+            else:
+                for piece in EMBEDDED_HEADING.split(text):
+                    yield piece, font, x
+
+    for text, font, x in runs():
+        if RUNNING_TEXT.match(text):
+            continue
+
+        if heading is not None:
+            _, heading_font, heading_x = heading
+            title = heading[0][-1]
+            continues = font == heading_font and (
+                _is_display_font(font)
+                or not title.endswith('\n')
+                or (x > heading_x + HANGING_INDENT and not title.rstrip().endswith(('.', '?', ':')))
+            )
+            if continues:
+                heading[0] = heading[0][:-1] + (heading[0][-1] + text,)
+                continue
+            yield flush()
+            heading = None
+
+        if DOCUMENT_END.match(text):
+            yield ('end', text)
+            continue
+
+        line = '# ' + text.lstrip()
+        match = ENUMERATED_HEADING.match(line.split('\n', 1)[0] + ' ')
+        if match and (_is_display_font(font) or match.group('title')[:1].isupper()):
+            parenthesized = match.group('paren') is not None
+            token = match.group('paren') if parenthesized else match.group('plain')
+            heading = [('heading', token, parenthesized, text.lstrip()[match.start('title') - 2:]), font, x]
+            continue
+
+        match = PART_HEADING.match(line)
+        if match and 'Bold' in font:
+            heading = [('part', match.group('number'), text.lstrip()[match.start('title') - 2:]), font, x]
+            continue
+
+        yield ('text', text)
+
+    if heading is not None:
+        yield flush()
+
+class TextWindow:
+    """
+    Growing text addressed by absolute offsets, of which only the tail is kept
+
+    discard_before() releases text no remaining section refers to.
+    """
+
+    def __init__(self):
+        self._pieces = []
+        self._base = 0
+        self.length = 0
+
+    def append(self, text):
+        self._pieces.append(text)
+        self.length += len(text)
+
+    def _text(self):
+        if len(self._pieces) != 1:
+            self._pieces = [''.join(self._pieces)]
+        return self._pieces[0]
+
+    def slice(self, start, end):
+        return self._text()[start - self._base:end - self._base]
+
+    def discard_before(self, pos):
+        self._pieces = [self._text()[pos - self._base:]]
+        self._base = pos
+
+    @property
+    def held(self):
+        return self.length - self._base
+
+def extract_pdf_sections(path, text='subtree', stats=None):
+    """
+    Extract document sections from a Federal Register PDF, streaming page by page
+
+    Headings found by iter_pdf_events drive a strict SectionTreeBuilder.
+    Each top-level section is emitted, with all of its subsections, as soon
+    as the next one starts, and its text is then released, so memory holds
+    at most one top-level section rather than the whole document.
+
+    Args:
+        path: PDF file
+        text: "subtree" for section text including subsections, as
+            extract_epa_sections_fixed produces, or "body" for each
+            section's own text only
+        stats: Optional dictionary that receives pages/characters counters
+
+    Yields:
+        Section dictionaries with the extract_epa_sections_fixed fields
+        (section_id, section_number, section_title, section_text,
+        hierarchy_level, parent_section_id) plus hierarchy_path
+    """
+    builder = SectionTreeBuilder(strict=True)
+    window = TextWindow()
+    peak = 0
+
+    def emit(nodes):
+        for node in nodes:
+            end = node['end'] if text == 'subtree' else node['body_end']
+            section_text = window.slice(node['start'], end).strip()
+            yield {
+                'section_id': node['section_id'],
+                'section_number': node['section_number'],
+                'section_title': node['section_title'],
+                'section_text': section_text or node['section_title'],
+                'hierarchy_level': node['hierarchy_level'],
+                'hierarchy_path': node['hierarchy_path'],
+                'parent_section_id': node['parent_section_id'],
+            }
+        window.discard_before(builder.nodes[0]['start'] if builder.nodes else window.length)
+
+    for event in iter_pdf_events(path):
+        if event[0] == 'text':
+            window.append(event[1])
+            continue
+        if event[0] == 'end':
+            window.append(event[1])
+            if builder.started:
+                break
+            # PDF pages often start with the end of the previous document
+            builder.skip_to(window.length)
+            window.discard_before(window.length)
+            continue
+
+        pos = window.length
+        if event[0] == 'heading':
+            _, token, parenthesized, title = event
+            builder.add_heading(pos, token, parenthesized, title)
+            number = f"({token})" if parenthesized else f"{token}."
+        else:
+            _, number, title = event
+            builder.add_part(pos, number, title)
+            number = f"{number}—"
+        window.append(f"\n{number} {title}\n")
+
+        peak = max(peak, window.held)
+        yield from emit(builder.drain())
+
+    builder.finish(window.length)
+    peak = max(peak, window.held)
+    if stats is not None:
+        stats['characters'] = window.length
+        stats['peak_characters'] = peak
+    yield from emit(builder.drain())
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract document sections straight from a Federal Register PDF')
+    parser.add_argument('input_file', help='PDF file to process')
+    parser.add_argument('--output', '-o', default=DEFAULT_OUTPUT,
+                        help='Output .json or .jsonl file (default: processed/epa_document_sections_pdf.json)')
+    parser.add_argument('--text', choices=['subtree', 'body'], default='subtree',
+                        help="Section text: with its subsections, like 3_extract_document_sections_fixed.py (default), "
+                             "or the section's own text only")
+    args = parser.parse_args()
+
+    stats = {}
+    level_counts = {}
+    start = time.perf_counter()
+    with RecordWriter(args.output) as writer:
+        for section in extract_pdf_sections(args.input_file, args.text, stats):
+            writer.write(section)
+            level_counts[section['hierarchy_level']] = level_counts.get(section['hierarchy_level'], 0) + 1
+            print(f"{'  ' * section['hierarchy_level']}{section['hierarchy_path']}: {section['section_title'][:80]}")
+
+    print(f"\nProcessed {writer.count} sections from {args.input_file} in {time.perf_counter() - start:.1f}s")
+    print(f"Output saved to {args.output}")
+    print(f"Text held in memory peaked at {stats['peak_characters']:,} of {stats['characters']:,} characters")
+    for level, count in sorted(level_counts.items()):
+        print(f"Level {level}: {count} sections")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import time
+import threading
+from urllib.parse import urlparse
+
+class TokenBucket:
+    """Thread-safe token bucket: up to `burst` requests at once, refilled at `rate` per second"""
+
+    def __init__(self, rate, burst=1):
+        """
+        Args:
+            rate: Tokens added per second (0 or None disables limiting)
+            burst: Maximum number of tokens that can accumulate
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        if not self.rate:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+class HostRateLimiter:
+    """One token bucket per host, created on first use"""
+
+    def __init__(self, rate, burst=1):
+        """
+        Args:
+            rate: Requests per second allowed for each host
+            burst: Requests each host may receive back to back
+        """
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url):
+        """Block until a request to the URL's host is allowed"""
+        host = urlparse(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        bucket.acquire()
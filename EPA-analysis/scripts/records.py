@@ -0,0 +1,191 @@
+import os
+import re
+import bz2
+import gzip
+import json
+import lzma
+import argparse
+import textwrap
+from itertools import islice
+
+# Compression is picked from the final file extension
+COMPRESSORS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+JSONL_EXTENSIONS = ('.jsonl', '.ndjson')
+
+# Bytes read at a time when streaming a legacy JSON array
+READ_SIZE = 1024 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+
+def open_text(path, mode='r', format_path=None):
+    """Open a text file, transparently (de)compressing .gz/.bz2/.xz files
+
+    format_path, if given, picks the compression instead of path's own
+    extension (used for temporary .part files).
+    """
+    opener = COMPRESSORS.get(os.path.splitext(format_path or path)[1])
+    if opener:
+        return opener(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def is_jsonl(path):
+    """True if the path names a JSON Lines file (optionally compressed)"""
+    base, ext = os.path.splitext(path)
+    if ext in COMPRESSORS:
+        ext = os.path.splitext(base)[1]
+    return ext in JSONL_EXTENSIONS
+
+def existing_variant(path):
+    """
+    Prefer a converted JSON Lines copy of a legacy .json file when one exists
+
+    For 'comments.json' this checks comments.jsonl.gz, then comments.jsonl,
+    and falls back to the path itself.
+    """
+    base, ext = os.path.splitext(path)
+    if ext == '.json':
+        for candidate in (f"{base}.jsonl.gz", f"{base}.jsonl"):
+            if os.path.exists(candidate):
+                return candidate
+    return path
+
+def _iter_json_array(f):
+    """Yield the elements of a top-level JSON array one at a time without loading the whole file"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+
+    while True:
+        # Skip whitespace and the separators between elements
+        pos = SEPARATORS.match(buffer, pos).end()
+        if pos == len(buffer) and not eof:
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        if not started:
+            if not buffer.startswith('[', pos):
+                raise ValueError("Expected a JSON array or JSON Lines file")
+            started = True
+            pos += 1
+            continue
+
+        if pos == len(buffer):
+            raise ValueError("Unexpected end of JSON array")
+        if buffer[pos] == ']':
+            return
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+            # A value running to the end of the buffer may continue in the next read
+            complete = end < len(buffer) or eof
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+
+        if not complete:
+            # Grow the read geometrically so a huge element is re-parsed only a few times
+            chunk = f.read(max(READ_SIZE, len(buffer) - pos))
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        yield record
+        pos = end
+
+def iter_records(path):
+    """
+    Stream records from a JSON Lines file or a legacy JSON array file
+
+    Both formats are read incrementally, so memory use is bounded by the
+    largest single record rather than the file size.
+    """
+    with open_text(path) as f:
+        if is_jsonl(path):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(f)
+
+def iter_batches(records, size):
+    """Group any iterable of records into lists of at most `size`"""
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+class RecordWriter:
+    """
+    Write records one at a time to JSON Lines or a legacy JSON array file
+
+    JSON array output is byte-for-byte what json.dump(records, f, indent=2)
+    would produce. Records go to a .part file that replaces the target on a
+    clean close, so readers never see a half-written file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.partial_path = f"{path}.part"
+        self.jsonl = is_jsonl(path)
+        self.count = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open_text(self.partial_path, 'w', format_path=path)
+        if not self.jsonl:
+            self._file.write('[')
+
+    def write(self, record):
+        if self.jsonl:
+            self._file.write(json.dumps(record))
+            self._file.write('\n')
+        else:
+            self._file.write(',\n' if self.count else '\n')
+            self._file.write(textwrap.indent(json.dumps(record, indent=2), '  '))
+        self.count += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self.jsonl:
+            self._file.write('\n]' if self.count else ']')
+        self._file.close()
+        os.replace(self.partial_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Leave the .part file behind for inspection; the target is untouched
+            self._file.close()
+        return False
+
+def write_records(path, records):
+    """Write an iterable of records to path and return how many were written"""
+    with RecordWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
+
+def convert(input_path, output_path):
+    """Convert between legacy JSON array files and (compressed) JSON Lines"""
+    count = write_records(output_path, iter_records(input_path))
+    print(f"Converted {count} records from {input_path} to {output_path}")
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert pipeline files between JSON arrays and JSON Lines')
+    parser.add_argument('input', help='Input .json, .jsonl or .jsonl.gz file')
+    parser.add_argument('output', help='Output file; .jsonl/.jsonl.gz for JSON Lines, .json for a JSON array')
+    args = parser.parse_args()
+
+    convert(args.input, args.output)
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+DEFAULT_STATE_FILENAME = 'scrape_state.sqlite'
+
+# Comment fetch states
+PENDING = 'pending'
+FETCHED = 'fetched'
+FAILED = 'failed'
+
+def comment_id_from_url(comment_url):
+    """Return the EPA comment ID at the end of a comment page URL"""
+    return comment_url.rstrip('/').rsplit('/', 1)[-1]
+
+class ScrapeState:
+    """
+    SQLite record of scraping progress per docket
+
+    Tracks the last listing page processed for each docket, every comment
+    link seen on the listing pages, and each comment's fetch status along with
+    its extracted record, so an interrupted or repeated run can pick up where
+    the last one stopped instead of starting from page 1.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS listings (
+                docket_url TEXT PRIMARY KEY,
+                last_page INTEGER NOT NULL,
+                complete INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        # rowid keeps the order links were first seen in
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS comments (
+                comment_url TEXT PRIMARY KEY,
+                docket_url TEXT NOT NULL,
+                comment_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                record TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS comments_docket ON comments (docket_url, status)')
+        self._conn.commit()
+
+    def listing_progress(self, docket_url):
+        """Return (last listing page processed, whether pagination finished) for a docket"""
+        with self._lock:
+            row = self._conn.execute('SELECT last_page, complete FROM listings WHERE docket_url = ?',
+                                     (docket_url,)).fetchone()
+        return (row['last_page'], bool(row['complete'])) if row else (0, False)
+
+    def record_page(self, docket_url, comment_urls, page=None):
+        """
+        Record comment links found on a listing page
+
+        New links are added as pending; links already known keep their status.
+        If page is given it becomes the docket's last processed listing page.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany('''
+                INSERT OR IGNORE INTO comments (comment_url, docket_url, comment_id, status, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(url, docket_url, comment_id_from_url(url), PENDING, now) for url in comment_urls])
+            if page is not None:
+                self._conn.execute('''
+                    INSERT INTO listings (docket_url, last_page, complete, updated_at) VALUES (?, ?, 0, ?)
+                    ON CONFLICT(docket_url) DO UPDATE SET
+                        last_page = excluded.last_page, complete = 0, updated_at = excluded.updated_at
+                ''', (docket_url, page, now))
+            self._conn.commit()
+
+    def mark_listing_complete(self, docket_url):
+        with self._lock:
+            self._conn.execute('UPDATE listings SET complete = 1, updated_at = ? WHERE docket_url = ?',
+                               (time.time(), docket_url))
+            self._conn.commit()
+
+    def known_links(self, docket_url):
+        """Return every comment link seen for a docket, in the order first seen"""
+        with self._lock:
+            rows = self._conn.execute('SELECT comment_url FROM comments WHERE docket_url = ? ORDER BY rowid',
+                                      (docket_url,)).fetchall()
+        return [row['comment_url'] for row in rows]
+
+    def known_among(self, comment_urls):
+        """Return the subset of comment_urls already recorded"""
+        comment_urls = list(comment_urls)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT comment_url FROM comments WHERE comment_url IN ({','.join('?' * len(comment_urls))})",
+                comment_urls
+            ).fetchall() if comment_urls else []
+        return {row['comment_url'] for row in rows}
+
+    def pending_links(self, docket_url):
+        """Return the docket's comment links that have not been fetched successfully, in the order first seen"""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT comment_url FROM comments WHERE docket_url = ? AND status != ? ORDER BY rowid
+            ''', (docket_url, FETCHED)).fetchall()
+        return [row['comment_url'] for row in rows]
+
+    def _set_status(self, comment_url, status, record=None, error=None):
+        with self._lock:
+            self._conn.execute('''
+                UPDATE comments SET status = ?, record = COALESCE(?, record), error = ?, updated_at = ?
+                WHERE comment_url = ?
+            ''', (status, record, error, time.time(), comment_url))
+            self._conn.commit()
+
+    def mark_fetched(self, comment_url, record):
+        self._set_status(comment_url, FETCHED, record=json.dumps(record))
+
+    def mark_failed(self, comment_url, error):
+        self._set_status(comment_url, FAILED, error=str(error))
+
+    def fetched_records(self, docket_url):
+        """Return the extracted records of every fetched comment in a docket, in the order first seen"""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT record FROM comments WHERE docket_url = ? AND status = ? ORDER BY rowid
+            ''', (docket_url, FETCHED)).fetchall()
+        return [json.loads(row['record']) for row in rows]
+
+    def status_counts(self, docket_url):
+        """Return {status: count} for a docket's comments"""
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM comments WHERE docket_url = ? GROUP BY status',
+                                      (docket_url,)).fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        self._conn.close()
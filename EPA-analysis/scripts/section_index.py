@@ -0,0 +1,230 @@
+import os
+import time
+import hashlib
+import numpy as np
+
+# Where per-proposal indexes are persisted between runs
+INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processed', 'section_indexes')
+
+def section_fingerprint(section_ids, section_matrix):
+    """Hash the section ids and vectors so a stale index on disk can be detected"""
+    digest = hashlib.sha256()
+    for section_id in section_ids:
+        digest.update(str(section_id).encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(np.ascontiguousarray(section_matrix, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+def select_top_k(scores, candidates, threshold, max_matches):
+    """Pick the best candidates at or above threshold, ties broken by section order"""
+    keep = scores >= threshold
+    scores = scores[keep]
+    candidates = candidates[keep]
+    order = np.lexsort((candidates, -scores))[:max_matches]
+    return [(int(candidates[j]), float(scores[j])) for j in order]
+
+class IVFFlatSectionIndex:
+    """
+    Inverted-file index over unit-normalized section embeddings
+
+    Sections are clustered with spherical k-means into nlist lists. A query
+    scores the centroids, then scores exactly only the sections in its nprobe
+    closest lists, so cost grows with nprobe/nlist instead of the section count.
+    """
+
+    def __init__(self, centroids, list_offsets, list_members, fingerprint, nprobe=8):
+        """
+        Args:
+            centroids: (nlist, dim) float32 matrix of unit-length centroids
+            list_offsets: (nlist + 1,) offsets of each list inside list_members
+            list_members: section row indices grouped by list
+            fingerprint: section_fingerprint of the sections the index was built from
+            nprobe: Default number of lists scanned per query
+        """
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_members = list_members
+        self.fingerprint = fingerprint
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, section_matrix, section_ids, nlist=None, iterations=20, nprobe=8, seed=0):
+        """
+        Cluster the section matrix into an index
+
+        Args:
+            section_matrix: (n_sections, dim) float32 matrix with unit-length rows
+            section_ids: Section ids in row order (used for the fingerprint)
+            nlist: Number of lists (defaults to about 4 * sqrt(n_sections))
+            iterations: k-means iterations
+            nprobe: Default number of lists scanned per query
+            seed: Random seed for centroid initialisation
+
+        Returns:
+            An IVFFlatSectionIndex
+        """
+        n_sections = section_matrix.shape[0]
+        if nlist is None:
+            nlist = int(4 * np.sqrt(n_sections))
+        nlist = max(1, min(nlist, n_sections))
+
+        rng = np.random.default_rng(seed)
+        centroids = section_matrix[rng.choice(n_sections, nlist, replace=False)].copy() if n_sections else \
+            np.zeros((1, section_matrix.shape[1]), dtype=np.float32)
+
+        assignments = np.zeros(n_sections, dtype=np.int64)
+        for _ in range(iterations):
+            assignments = np.argmax(section_matrix @ centroids.T, axis=1)
+
+            # Recompute each centroid as the normalized mean of its members
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, section_matrix)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            np.divide(sums, norms, out=sums, where=norms > 0)
+            # Keep the previous centroid for lists that lost all their members
+            sums[empty] = centroids[empty]
+            centroids = sums.astype(np.float32)
+
+        if n_sections:
+            assignments = np.argmax(section_matrix @ centroids.T, axis=1)
+
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=len(centroids))
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        return cls(centroids, list_offsets, order.astype(np.int64),
+                   section_fingerprint(section_ids, section_matrix), nprobe)
+
+    def save(self, path):
+        """Persist the index to an .npz file"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez(path, centroids=self.centroids, list_offsets=self.list_offsets,
+                 list_members=self.list_members, fingerprint=np.array(self.fingerprint),
+                 nprobe=np.array(self.nprobe))
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save()"""
+        with np.load(path) as data:
+            return cls(data['centroids'], data['list_offsets'], data['list_members'],
+                       str(data['fingerprint']), int(data['nprobe']))
+
+    def search(self, comment_matrix, section_matrix, threshold=0.75, max_matches=5, nprobe=None, chunk_size=1024):
+        """
+        Yield (comment_index, [(section_index, similarity), ...]) for every comment
+
+        Same semantics as an exact top-k search (threshold, max_matches, best
+        first), restricted to the sections in each comment's nprobe closest lists.
+        """
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        n_comments = comment_matrix.shape[0]
+
+        for start in range(0, n_comments, chunk_size):
+            block = comment_matrix[start:start + chunk_size]
+
+            # Choose the closest lists for every comment in the block at once
+            centroid_scores = block @ self.centroids.T
+            if nprobe < self.nlist:
+                probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+            else:
+                probes = np.broadcast_to(np.arange(self.nlist), (block.shape[0], self.nlist))
+
+            for row in range(block.shape[0]):
+                if max_matches <= 0:
+                    yield start + row, []
+                    continue
+
+                candidates = np.concatenate([
+                    self.list_members[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probes[row]
+                ])
+                scores = section_matrix[candidates] @ block[row]
+                yield start + row, select_top_k(scores, candidates, threshold, max_matches)
+
+def index_path(proposal_id, index_dir=INDEX_DIR):
+    """Path of the persisted index for a proposal"""
+    return os.path.join(index_dir, f"{proposal_id}.ivf.npz")
+
+def load_or_build_index(proposal_id, section_matrix, section_ids, nlist=None, nprobe=8, index_dir=INDEX_DIR):
+    """
+    Load the persisted index for a proposal, rebuilding it if the sections changed
+
+    Args:
+        proposal_id: Proposal the sections belong to
+        section_matrix: (n_sections, dim) float32 matrix with unit-length rows
+        section_ids: Section ids in row order
+        nlist: Number of lists when (re)building
+        nprobe: Default number of lists scanned per query
+        index_dir: Directory holding the persisted indexes
+
+    Returns:
+        An IVFFlatSectionIndex matching the given sections
+    """
+    path = index_path(proposal_id, index_dir)
+    fingerprint = section_fingerprint(section_ids, section_matrix)
+
+    if os.path.exists(path):
+        try:
+            index = IVFFlatSectionIndex.load(path)
+            if index.fingerprint == fingerprint and (nlist is None or index.nlist == min(nlist, len(section_ids))):
+                index.nprobe = nprobe
+                return index
+            print(f"Section index for proposal {proposal_id} is stale, rebuilding...")
+        except Exception as e:
+            print(f"Error loading section index {path}: {e}")
+
+    print(f"Building section index for proposal {proposal_id}...")
+    index = IVFFlatSectionIndex.build(section_matrix, section_ids, nlist=nlist, nprobe=nprobe)
+    index.save(path)
+    return index
+
+def recall_report(comment_matrix, section_matrix, section_ids, exact_search, threshold=0.75, max_matches=5,
+                  nlist_values=(None,), nprobe_values=(1, 2, 4, 8, 16, 32)):
+    """
+    Compare IVF search against the exact search for a grid of parameters
+
+    Args:
+        comment_matrix: (n_comments, dim) float32 matrix with unit-length rows
+        section_matrix: (n_sections, dim) float32 matrix with unit-length rows
+        section_ids: Section ids in row order
+        exact_search: Callable(comment_matrix, section_matrix, threshold, max_matches)
+            yielding the same records as IVFFlatSectionIndex.search
+        threshold: Minimum similarity for a match
+        max_matches: Maximum matches per comment
+        nlist_values: List counts to try (None picks the default)
+        nprobe_values: Probe counts to try for each list count
+
+    Returns:
+        List of dictionaries with nlist, nprobe, recall, latency and speedup
+    """
+    start = time.perf_counter()
+    exact = {(c, s) for c, matches in exact_search(comment_matrix, section_matrix, threshold, max_matches)
+             for s, _ in matches}
+    exact_seconds = time.perf_counter() - start
+
+    print(f"Exact search: {len(exact)} matches in {exact_seconds:.3f}s")
+    print(f"{'nlist':>6} {'nprobe':>6} {'recall':>8} {'seconds':>9} {'speedup':>8}")
+
+    rows = []
+    for nlist in nlist_values:
+        index = IVFFlatSectionIndex.build(section_matrix, section_ids, nlist=nlist)
+        for nprobe in nprobe_values:
+            if nprobe > index.nlist:
+                continue
+
+            start = time.perf_counter()
+            found = {(c, s) for c, matches in index.search(comment_matrix, section_matrix, threshold, max_matches, nprobe)
+                     for s, _ in matches}
+            seconds = time.perf_counter() - start
+
+            recall = len(found & exact) / len(exact) if exact else 1.0
+            speedup = exact_seconds / seconds if seconds else float('inf')
+            rows.append({'nlist': index.nlist, 'nprobe': nprobe, 'recall': recall,
+                         'seconds': seconds, 'speedup': speedup})
+            print(f"{index.nlist:>6} {nprobe:>6} {recall:>8.4f} {seconds:>9.3f} {speedup:>7.1f}x")
+
+    return rows
@@ -0,0 +1,206 @@
+import json
+import numpy as np
+
+def parse_embedding(embedding):
+    """Parse an embedding from the database into a list of floats"""
+    if not embedding:
+        return []
+
+    # Check if embeddings are strings (from database) and convert to lists
+    if isinstance(embedding, str):
+        try:
+            # Try parsing as a JSON string
+            embedding = json.loads(embedding)
+        except:
+            # If not JSON, try parsing as a string representation of a list
+            embedding = embedding.strip('[]').split(',')
+            embedding = [float(x.strip()) for x in embedding if x.strip()]
+
+    return embedding
+
+def vector_search_similarity(comment_embedding, section_embedding):
+    """Calculate cosine similarity between two embedding vectors"""
+    if not comment_embedding or not section_embedding:
+        return 0.0
+
+    # Convert to numpy arrays
+    vec1 = np.array(parse_embedding(comment_embedding), dtype=np.float32)
+    vec2 = np.array(parse_embedding(section_embedding), dtype=np.float32)
+
+    # Calculate cosine similarity
+    dot_product = np.dot(vec1, vec2)
+    norm1 = np.linalg.norm(vec1)
+    norm2 = np.linalg.norm(vec2)
+
+    if norm1 == 0 or norm2 == 0:
+        return 0.0
+
+    return dot_product / (norm1 * norm2)
+
+def build_embedding_matrix(vectors, dim=None):
+    """Stack parsed embeddings into a float32 matrix with unit-length rows
+
+    Rows without an embedding (or with a zero vector) become all-zero rows, so
+    they score 0.0 against everything, just like vector_search_similarity.
+    """
+    if dim is None:
+        dim = max((len(vector) for vector in vectors), default=0)
+
+    matrix = np.zeros((len(vectors), dim), dtype=np.float32)
+    for i, vector in enumerate(vectors):
+        if vector:
+            matrix[i, :len(vector)] = vector
+
+    # Normalize once so a dot product is the cosine similarity
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+def build_proposal_mask(comments, sections):
+    """Return a function giving the allowed (comment, section) pairs for a block of comments
+
+    Pairs are only disallowed when both rows carry a proposal_id and they differ.
+    Returns None when every pair is allowed, so callers can skip masking entirely.
+    """
+    comment_proposals = np.array([c.get('proposal_id') or '' for c in comments], dtype=object)
+    section_proposals = np.array([s.get('proposal_id') or '' for s in sections], dtype=object)
+
+    distinct = set(comment_proposals) | set(section_proposals)
+    distinct.discard('')
+    if len(distinct) <= 1:
+        return None
+
+    section_missing = section_proposals == ''
+
+    def mask_for(start, end):
+        block = comment_proposals[start:end]
+        allowed = block[:, None] == section_proposals[None, :]
+        allowed |= (block == '')[:, None]
+        allowed |= section_missing[None, :]
+        return allowed
+
+    return mask_for
+
+def select_block_matches(similarities, start, threshold, k):
+    """Yield (comment_index, matches) for a block of similarity rows starting at comment start
+
+    Each comment's matches are those at or above threshold, best first, at most
+    k of them; ties keep section order, as a stable sort would.
+    """
+    n_sections = similarities.shape[1]
+    if k <= 0:
+        for row in range(similarities.shape[0]):
+            yield start + row, []
+        return
+
+    # The k-th best score per row bounds the candidates we need to sort
+    rows = np.arange(similarities.shape[0])
+    if k < n_sections:
+        kth_index = np.argpartition(similarities, n_sections - k, axis=1)[:, n_sections - k]
+        cutoffs = np.maximum(similarities[rows, kth_index], threshold)
+    else:
+        cutoffs = np.full(similarities.shape[0], threshold, dtype=np.float32)
+
+    for row in rows:
+        scores = similarities[row]
+        candidates = np.flatnonzero(scores >= cutoffs[row])
+        order = np.lexsort((candidates, -scores[candidates]))[:k]
+        yield start + int(row), [(int(candidates[j]), float(scores[candidates[j]])) for j in order]
+
+def top_k_section_matches(comment_matrix, section_matrix, threshold=0.75, max_matches=5,
+                          pair_mask=None, chunk_size=1024):
+    """Yield (comment_index, [(section_index, similarity), ...]) for every comment
+
+    Similarities are computed as one matrix product per chunk of comments. Each
+    comment's matches are those at or above threshold, best first, at most
+    max_matches of them; ties keep section order, as a stable sort would.
+    """
+    n_comments = comment_matrix.shape[0]
+    k = min(max_matches, section_matrix.shape[0])
+
+    for start in range(0, n_comments, chunk_size):
+        end = min(start + chunk_size, n_comments)
+        similarities = comment_matrix[start:end] @ section_matrix.T
+
+        if pair_mask is not None:
+            similarities[~pair_mask(start, end)] = -np.inf
+
+        yield from select_block_matches(similarities, start, threshold, k)
+
+def top_k_chunk_matches(comment_chunks, comment_offsets, section_chunks, section_offsets, threshold=0.75,
+                        max_matches=5, pair_mask=None, chunk_size=4096):
+    """Like top_k_section_matches, but a comment and a section score as their most similar chunks
+
+    Rows of comment_chunks/section_chunks are unit-length chunk embeddings
+    grouped by owner; owner i's rows are offsets[i]:offsets[i + 1], and every
+    owner has at least one row. Whole comments are scored in blocks of about
+    chunk_size chunk rows.
+    """
+    n_comments = len(comment_offsets) - 1
+    k = min(max_matches, len(section_offsets) - 1)
+
+    start = 0
+    while start < n_comments:
+        end = max(start + 1, int(np.searchsorted(comment_offsets, comment_offsets[start] + chunk_size, side='right')) - 1)
+        end = min(end, n_comments)
+        chunk_similarities = comment_chunks[comment_offsets[start]:comment_offsets[end]] @ section_chunks.T
+        # Best section chunk per (comment chunk, section), then best comment chunk per (comment, section)
+        per_section = np.maximum.reduceat(chunk_similarities, section_offsets[:-1], axis=1)
+        similarities = np.maximum.reduceat(per_section, comment_offsets[start:end] - comment_offsets[start], axis=0)
+
+        if pair_mask is not None:
+            similarities[~pair_mask(start, end)] = -np.inf
+
+        yield from select_block_matches(similarities, start, threshold, k)
+        start = end
+
+def fetch_server_matches(client, proposal_id, threshold=0.75, max_matches=5, exact=False, ef_search=100, max_rows=1000):
+    """Top matches of every comment of a proposal, computed in Postgres by match_comment_sections
+
+    Only (comment_id, section_id, score) rows come back, never embeddings.
+    Comments are requested in pages small enough that no response exceeds
+    max_rows (PostgREST's default row limit); the function returns one row
+    without a section for a comment with no match, so every page moves on.
+
+    Args:
+        client: Supabase client to call the function through
+        exact: Scan every section of the proposal instead of using the HNSW
+            index; gives exactly the Python path's matches
+        ef_search: HNSW candidate list size; larger is slower but misses fewer matches
+
+    Returns:
+        Dictionary of comment_id to [(section_id, score), ...], best first
+    """
+    comment_limit = max(1, max_rows // max(1, max_matches))
+    matches = {}
+    after = None
+    while True:
+        rows = client.rpc('match_comment_sections', {
+            'p_proposal_id': proposal_id,
+            'match_threshold': threshold,
+            'match_count': max_matches,
+            'after_comment_id': after,
+            'comment_limit': comment_limit,
+            'ef_search': ef_search,
+            'exact': exact,
+        }).execute().data
+        if not rows:
+            return matches
+        for row in rows:
+            comment_matches = matches.setdefault(row['comment_id'], [])
+            if row['section_id'] is not None:
+                comment_matches.append((row['section_id'], float(row['score'])))
+        after = rows[-1]['comment_id']
+
+def server_match_records(matches_by_comment, proposal_id):
+    """Flatten fetch_server_matches results into the match dictionaries python_matches returns"""
+    all_matches = []
+    for comment_id, top_matches in matches_by_comment.items():
+        for section_id, score in top_matches:
+            all_matches.append({
+                'comment_id': comment_id,
+                'section_id': section_id,
+                'similarity_score': score,
+                'proposal_id': proposal_id
+            })
+    return all_matches
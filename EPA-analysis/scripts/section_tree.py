@@ -0,0 +1,328 @@
+import re
+import json
+import uuid
+from records import iter_records, is_jsonl, open_text
+
+TREE_FORMAT = 'section-spans'
+
+# Enumerated headings at any markdown level: "### I. Title", "#### A. Title", "##### 1. Title", "# a. Title", "# (i) Title"
+ENUMERATED_HEADING = re.compile(
+    r'#{1,6}[ \t]+(?:\((?P<paren>[0-9]+|[A-Za-z]+)\)|(?P<plain>[0-9]+|[A-Za-z]+)\.)[ \t]+(?P<title>[^\n]*\S)'
+)
+# Start of the regulatory text ("# PART 63--..." or "## PART 260—...")
+PART_HEADING = re.compile(r'#{1,6}[ \t]+(?P<number>PART \d+)\s*(?:--|—)[ \t]*(?P<title>[^\n]*)')
+
+ROMAN_VALUES = {'I': 1, 'V': 5, 'X': 10, 'L': 50, 'C': 100, 'D': 500, 'M': 1000}
+
+def roman_value(token):
+    """Integer value of a roman numeral (upper or lower case), or None if it isn't one"""
+    token = token.upper()
+    if not token or any(char not in ROMAN_VALUES for char in token):
+        return None
+    total = 0
+    for char, following in zip(token, token[1:] + ' '):
+        value = ROMAN_VALUES[char]
+        total += -value if following != ' ' and ROMAN_VALUES[following] > value else value
+    return total
+
+def enumerator_kinds(token, parenthesized):
+    """
+    Possible numbering schemes for a heading enumerator, most likely first
+
+    "I" may be roman one or the ninth letter, "i" roman one or a letter;
+    SectionTreeBuilder picks one from the headings already open.
+
+    Returns:
+        List of (kind, ordinal) pairs
+    """
+    prefix = 'paren_' if parenthesized else ''
+    kinds = []
+    if token.isdigit():
+        kinds.append((prefix + 'arabic', int(token)))
+    elif token.isupper():
+        if roman_value(token):
+            kinds.append((prefix + 'roman', roman_value(token)))
+        if len(token) == 1:
+            kinds.append((prefix + 'upper', ord(token) - ord('A') + 1))
+    elif token.islower():
+        if roman_value(token):
+            kinds.append((prefix + 'lower_roman', roman_value(token)))
+        if len(token) == 1:
+            kinds.append((prefix + 'lower', ord(token) - ord('a') + 1))
+    return kinds
+
+def format_enumerator(token, parenthesized):
+    return f"({token})" if parenthesized else token
+
+class SectionTreeBuilder:
+    """
+    Build a section tree of any depth from heading events in document order
+
+    Headings are reported with their character offset into the source; the
+    builder decides each heading's level from its numbering scheme (roman,
+    capital letter, number, lower-case letter, parenthesized ...) and the
+    headings currently open, and records every node as character spans
+    rather than copies of its text. Everything before the first "I." heading
+    is the introduction, and everything from the first PART heading after it
+    is the regulatory text, with one child per PART.
+
+    Nodes are dictionaries with section_id, section_number, section_title,
+    hierarchy_level, hierarchy_path, parent_section_id, parent (node index or
+    None), start, body_end (where the first child starts) and end. Streaming
+    callers can take finished top-level subtrees with drain() as they go.
+    """
+
+    def __init__(self, strict=False):
+        """
+        Args:
+            strict: Only accept a heading that continues an open numbering
+                sequence or starts a new level at 1 (or A, i, ...). Use this
+                when headings are guessed from layout, as in PDFs, where stray
+                bold or italic lines would otherwise become sections.
+        """
+        self.strict = strict
+        self.nodes = []
+        self._base = 0  # index of nodes[0]; drain() removes finished nodes from the front
+        self._stack = []  # open enumerated nodes: (node index, kind, ordinal)
+        self._started = False
+        self._regulatory = None
+        self._intro_start = 0
+
+    @property
+    def started(self):
+        """Whether the "I." heading that ends the introduction has been seen"""
+        return self._started
+
+    def skip_to(self, pos):
+        """Leave text before pos out of the introduction (e.g. the end of a previous document)"""
+        if not self._started:
+            self._intro_start = pos
+
+    def _node(self, index):
+        return self.nodes[index - self._base]
+
+    def _close(self, depth, pos):
+        """Close open nodes deeper than depth at pos"""
+        while len(self._stack) > depth:
+            index, _, _ = self._stack.pop()
+            node = self._node(index)
+            node['end'] = pos
+            if node['body_end'] is None:
+                node['body_end'] = pos
+
+    def _add(self, pos, number, title, parent, level, path):
+        if parent is not None and self._node(parent)['body_end'] is None:
+            self._node(parent)['body_end'] = pos
+        self.nodes.append({
+            'section_id': str(uuid.uuid4()),
+            'section_number': number,
+            'section_title': title,
+            'hierarchy_level': level,
+            'hierarchy_path': path,
+            'parent_section_id': self._node(parent)['section_id'] if parent is not None else None,
+            'parent': parent,
+            'start': pos,
+            'body_end': None,
+            'end': None,
+        })
+        return self._base + len(self.nodes) - 1
+
+    def add_heading(self, pos, token, parenthesized, title):
+        """
+        Report an enumerated heading starting at pos
+
+        Returns:
+            Index of the new node, or None if the heading is part of the
+            introduction or regulatory text
+        """
+        kinds = enumerator_kinds(token, parenthesized)
+        if not kinds or self._regulatory is not None:
+            return None
+
+        if not self._started:
+            if ('roman', 1) not in kinds:
+                return None
+            self._started = True
+            if pos > self._intro_start:
+                intro = self._node(self._add(self._intro_start, 'INTRO', 'Document Header and Supplementary Information', None, 0, 'INTRO'))
+                intro['end'] = intro['body_end'] = pos
+
+        # Prefer continuing an open sequence (deepest first), then any open level using the same scheme
+        depth = None
+        kind = kinds[0][0]
+        for matches_sequence in (True, False):
+            for level in range(len(self._stack) - 1, -1, -1):
+                _, open_kind, open_ordinal = self._stack[level]
+                for candidate, ordinal in kinds:
+                    if candidate == open_kind and (not matches_sequence or ordinal == open_ordinal + 1):
+                        depth, kind = level, candidate
+                        break
+                if depth is not None:
+                    break
+            if depth is not None:
+                break
+        if depth is None:
+            if self.strict and self._stack and dict(kinds)[kind] != 1:
+                return None
+            depth = len(self._stack)
+        elif self.strict and self._stack[depth][2] + 1 != dict(kinds)[kind]:
+            return None
+
+        self._close(depth, pos)
+        parent = self._stack[-1][0] if self._stack else None
+        number = format_enumerator(token, parenthesized)
+        path = f"{self._node(parent)['hierarchy_path']}.{number}" if parent is not None else number
+        index = self._add(pos, number, title.strip(), parent, depth + 1, path)
+        self._stack.append((index, kind, dict(kinds)[kind]))
+        return index
+
+    def add_part(self, pos, number, title):
+        """Report a PART heading starting at pos; the first one opens the regulatory text"""
+        if not self._started:
+            return None
+        if self._regulatory is None:
+            self._close(0, pos)
+            self._regulatory = self._add(pos, 'REGULATORY', 'Regulatory Text Amendments', None, 1, 'REGULATORY')
+        else:
+            self.nodes[-1]['end'] = self.nodes[-1]['body_end'] = pos
+        return self._add(pos, number, title.strip() or number, self._regulatory, 2, f"REGULATORY.{number}")
+
+    def drain(self):
+        """
+        Remove and return the nodes of every finished top-level section
+
+        Top-level sections only close when the next one starts, so everything
+        before the last open top-level node is complete, in document order.
+        """
+        open_top = next((i for i in range(len(self.nodes) - 1, -1, -1)
+                         if self.nodes[i]['parent'] is None and self.nodes[i]['end'] is None), len(self.nodes))
+        finished = self.nodes[:open_top]
+        self.nodes = self.nodes[open_top:]
+        self._base += open_top
+        return finished
+
+    def finish(self, end):
+        """Close every open node at end and return the nodes not yet drained"""
+        if not self._started:
+            self._add(self._intro_start, 'INTRO', 'Complete Document', None, 0, 'INTRO')
+        self._close(0, end)
+        if self._regulatory is not None:
+            self._node(self._regulatory)['end'] = end
+            if self.nodes[-1]['end'] is None:
+                self.nodes[-1]['end'] = end
+        for node in self.nodes:
+            if node['end'] is None:
+                node['end'] = end
+            if node['body_end'] is None:
+                node['body_end'] = node['end']
+        return self.nodes
+
+def strip_span(text, start, end):
+    """Shrink [start, end) so that text[start:end] == text[start:end].strip()"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def heading_line_starts(text):
+    """Offsets of every line starting with '#' (a substring search, much faster than a ^# regex scan)"""
+    starts = [0] if text.startswith('#') else []
+    pos = text.find('\n#')
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = text.find('\n#', pos + 2)
+    return starts
+
+def normalize_markdown(markdown_text):
+    """Drop page separators and normalize line endings (same result as splitting on '---\\n' and re-joining)"""
+    return markdown_text.replace('---\n', '\n').replace('\r\n', '\n')
+
+def tree_document(text, nodes):
+    """
+    Package builder nodes as a span-format section document
+
+    Each section stores span (the heading and everything under it) and
+    body_span (the heading and its own text, up to its first subsection),
+    both whitespace-trimmed offsets into the single shared source string.
+    """
+    sections = []
+    for node in nodes:
+        sections.append({
+            'section_id': node['section_id'],
+            'section_number': node['section_number'],
+            'section_title': node['section_title'],
+            'hierarchy_level': node['hierarchy_level'],
+            'hierarchy_path': node['hierarchy_path'],
+            'parent_section_id': node['parent_section_id'],
+            'span': list(strip_span(text, node['start'], node['end'])),
+            'body_span': list(strip_span(text, node['start'], node['body_end'])),
+        })
+    return {'format': TREE_FORMAT, 'source': text, 'sections': sections}
+
+def build_section_tree(markdown_text):
+    """
+    Extract the full-depth section tree of Federal Register markdown
+
+    Returns:
+        Span-format document: {'format', 'source', 'sections'} (see tree_document)
+    """
+    text = normalize_markdown(markdown_text)
+    builder = SectionTreeBuilder()
+    for pos in heading_line_starts(text):
+        match = ENUMERATED_HEADING.match(text, pos)
+        if match:
+            parenthesized = match.group('paren') is not None
+            builder.add_heading(pos, match.group('paren') if parenthesized else match.group('plain'),
+                                parenthesized, match.group('title'))
+            continue
+        match = PART_HEADING.match(text, pos)
+        if match:
+            builder.add_part(pos, match.group('number'), match.group('title'))
+    return tree_document(text, builder.finish(len(text)))
+
+def materialize_sections(document, text='body'):
+    """
+    Turn a span-format document into a list of sections with section_text
+
+    Args:
+        document: Span-format document from build_section_tree
+        text: "body" for each section's own text (headings plus text before
+            the first subsection, so nothing is repeated across sections) or
+            "subtree" for the section and all of its subsections
+
+    Returns:
+        List of section dictionaries as produced by extract_epa_sections_fixed,
+        plus hierarchy_path
+    """
+    source = document['source']
+    key = 'body_span' if text == 'body' else 'span'
+    sections = []
+    for section in document['sections']:
+        start, end = section[key]
+        materialized = {name: value for name, value in section.items() if name not in ('span', 'body_span')}
+        # A container whose first subsection starts right away (REGULATORY) has no text of its own
+        materialized['section_text'] = source[start:end] or section['section_title']
+        sections.append(materialized)
+    return sections
+
+def load_sections(path, text='body'):
+    """
+    Load document sections from either output format of 3_extract_document_sections_fixed.py
+
+    Span-format documents (one JSON object, optionally compressed) are
+    materialized; section lists (a JSON array or JSON Lines, optionally
+    compressed) are returned as they are.
+    """
+    if not is_jsonl(path):
+        with open_text(path) as f:
+            first = f.read(1)
+            while first.isspace():
+                first = f.read(1)
+        if first == '{':
+            with open_text(path) as f:
+                document = json.load(f)
+            if document.get('format') != TREE_FORMAT:
+                raise ValueError(f"{path} is a JSON object but not a span-format section document")
+            return materialize_sections(document, text)
+    return list(iter_records(path))
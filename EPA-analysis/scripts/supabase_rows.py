@@ -0,0 +1,170 @@
+import json
+
+# PostgREST, behind the Supabase API, returns at most this many rows per request by default
+MAX_ROWS = 1000
+
+def fetch_all_rows(make_query, page_size=MAX_ROWS):
+    """
+    Run a select page by page until every matching row has been read
+
+    A single select stops silently at the server's row limit, so larger
+    tables have to be read in ranges. make_query is called once per page,
+    since query builders can't be reused, and should order the rows by a
+    unique key so pages neither overlap nor skip rows.
+
+    Args:
+        make_query: Function returning a fresh filtered and ordered select
+        page_size: Rows per request; at most the server's row limit
+
+    Returns:
+        List of every row the query matches
+    """
+    rows = []
+    while True:
+        page = make_query().range(len(rows), len(rows) + page_size - 1).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+def upsert_rows(client, table, rows, action='upsert'):
+    """Upsert (or insert) rows into table, printing any error; returns whether it succeeded"""
+    try:
+        result = getattr(client.table(table), action)(rows).execute()
+        if hasattr(result, 'error') and result.error:
+            print(f"Error uploading {table} batch: {result.error}")
+            return False
+    except Exception as e:
+        print(f"Error uploading {table} batch: {e}")
+        return False
+    return True
+
+def upload_chunks(client, table, key_field, owners, proposal_id):
+    """
+    Replace the stored chunk embeddings of each (key, chunks) pair from get_chunked_embeddings
+
+    Returns:
+        True if the old chunks were dropped and the new ones stored
+    """
+    rows = []
+    for key, chunks in owners:
+        for chunk in chunks:
+            if chunk['embedding']:
+                rows.append({
+                    key_field: key,
+                    'chunk_index': chunk['chunk_index'],
+                    'start_char': chunk['start_char'],
+                    'end_char': chunk['end_char'],
+                    'token_count': chunk['token_count'],
+                    'embedding': chunk['embedding'],
+                    'proposal_id': proposal_id
+                })
+
+    try:
+        # Drop chunks from an earlier upload first; the text may now split differently
+        client.table(table).delete().in_(key_field, [key for key, _ in owners]).execute()
+    except Exception as e:
+        print(f"Error replacing {table} batch: {e}")
+        return False
+    return not rows or upsert_rows(client, table, rows, 'insert')
+
+def upsert_comment_batch(client, batch, embedded, proposal_id):
+    """
+    Upsert one batch of comments with their precomputed pooled and chunk embeddings
+
+    Returns:
+        True if the rows and their chunks were all stored
+    """
+    # Prepare batch data
+    rows = []
+    for doc, vectors in zip(batch, embedded):
+        # Prepare row data
+        row = {
+            'comment_id': doc['comment_id'],
+            'commenter_name': doc['commenter_name'],
+            'organization': doc.get('organization', ''),
+            'comment_date': doc['comment_date'],
+            'comment_text': doc['comment_text'],
+            'has_attachments': len(doc.get('attachments', [])) > 0,
+            'attachment_count': len(doc.get('attachment_contents', [])),
+            'attachment_contents': json.dumps(doc.get('attachment_contents', [])),
+            'combined_text': doc.get('combined_text', doc['comment_text']),
+            'source_url': doc.get('source_url', ''),
+            'embedding': vectors['embedding'],
+            'proposal_id': proposal_id
+        }
+        rows.append(row)
+
+    # Upsert batch to Supabase; chunks reference their rows, so they wait for them
+    if not upsert_rows(client, 'epa_comments', rows):
+        return False
+    return upload_chunks(client, 'epa_comment_chunks', 'comment_id',
+                         [(doc['comment_id'], vectors['chunks']) for doc, vectors in zip(batch, embedded)], proposal_id)
+
+def upsert_section_batch(client, batch, embedded, proposal_id):
+    """
+    Upsert one batch of document sections with their precomputed pooled and chunk embeddings
+
+    Returns:
+        True if the rows and their chunks were all stored
+    """
+    # Prepare batch data
+    rows = []
+    for section, vectors in zip(batch, embedded):
+        # Prepare row data
+        row = {
+            'section_id': section['section_id'],
+            'section_number': section.get('section_number', ''),
+            'section_title': section.get('section_title', ''),
+            'section_text': section['section_text'],
+            'parent_section_id': section.get('parent_section_id'),
+            'hierarchy_level': section.get('hierarchy_level', 1),
+            'hierarchy_path': section.get('hierarchy_path', ''),
+            'proposal_id': proposal_id
+        }
+
+        # Only add embedding if it's not empty
+        if vectors['embedding']:
+            row['embedding'] = vectors['embedding']
+
+        rows.append(row)
+
+    # Upsert batch to Supabase; chunks reference their rows, so they wait for them
+    if not upsert_rows(client, 'document_sections', rows):
+        return False
+    return upload_chunks(client, 'document_section_chunks', 'section_id',
+                         [(section['section_id'], vectors['chunks']) for section, vectors in zip(batch, embedded)],
+                         proposal_id)
+
+def section_levels(sections):
+    """
+    Group sections by their depth in the parent_section_id tree, roots first
+
+    document_sections.parent_section_id references another row of the table,
+    so a section can only be stored once its parent is. Uploading the levels
+    one after another keeps that order however the batches of one level are
+    spread over concurrent requests. A section whose parent isn't among
+    sections counts as a root.
+
+    Returns:
+        List of lists of sections, in their original order within each level
+    """
+    by_id = {section['section_id']: section for section in sections}
+    depths = {}
+    levels = []
+    for section in sections:
+        # Walk up to the nearest ancestor of known depth, then number the way back down
+        chain = []
+        section_id = section['section_id']
+        while section_id in by_id and section_id not in depths and section_id not in chain:
+            chain.append(section_id)
+            section_id = by_id[section_id].get('parent_section_id')
+        depth = depths.get(section_id, -1)
+        for ancestor_id in reversed(chain):
+            depth += 1
+            depths[ancestor_id] = depth
+
+        depth = depths[section['section_id']]
+        while len(levels) <= depth:
+            levels.append([])
+        levels[depth].append(section)
+    return levels
@@ -0,0 +1,183 @@
+import os
+import csv
+import json
+import time
+import argparse
+from records import iter_records
+
+# Excel and Parquet writers are optional; those formats are skipped when missing
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+except ImportError:
+    Workbook = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+EXPORT_FORMATS = ('csv', 'xlsx', 'parquet')
+EXTENSIONS = {'csv': 'csv', 'xlsx': 'xlsx', 'parquet': 'parquet'}
+
+# Excel rejects cells longer than this
+EXCEL_MAX_CELL = 32767
+PARQUET_ROW_GROUP = 10000
+
+def record_columns(records):
+    """Union of record keys in first-seen order (the columns pandas would produce)"""
+    columns = {}
+    for record in records:
+        columns.update(dict.fromkeys(record))
+    return list(columns)
+
+def flatten_value(value):
+    """Render nested values (attachment lists, dicts) as JSON so every cell is a scalar"""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+class CSVExporter:
+    def __init__(self, path, columns):
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=columns, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+    def close(self):
+        self._file.close()
+
+class ExcelExporter:
+    """Constant-memory .xlsx writer (openpyxl write-only mode)"""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append(columns)
+
+    @staticmethod
+    def _cell(value):
+        if isinstance(value, str):
+            return ILLEGAL_CHARACTERS_RE.sub('', value)[:EXCEL_MAX_CELL]
+        return value
+
+    def write(self, row):
+        self._sheet.append([self._cell(row.get(column)) for column in self.columns])
+
+    def close(self):
+        self._workbook.save(self.path)
+
+class ParquetExporter:
+    """Parquet writer that flushes a row group every PARQUET_ROW_GROUP rows; all columns are strings"""
+
+    def __init__(self, path, columns):
+        self.columns = columns
+        self._schema = pa.schema([(column, pa.string()) for column in columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._rows = []
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= PARQUET_ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        arrays = [
+            pa.array([None if row.get(column) is None else str(row[column]) for row in self._rows], pa.string())
+            for column in self.columns
+        ]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+EXPORTERS = {'csv': CSVExporter, 'xlsx': ExcelExporter, 'parquet': ParquetExporter}
+
+def available_formats(formats):
+    """Drop formats whose optional writer isn't installed, with a warning"""
+    missing = {'xlsx': Workbook is None and 'openpyxl', 'parquet': pa is None and 'pyarrow'}
+    usable = []
+    for fmt in formats:
+        if missing.get(fmt):
+            print(f"⚠️ Skipping {fmt} export: {missing[fmt]} is not installed")
+        else:
+            usable.append(fmt)
+    return usable
+
+def export_records(records, base_path, formats=('csv', 'xlsx'), columns=None):
+    """
+    Write records to several tabular formats in a single pass
+
+    Each record is flattened once and handed to every writer, so no
+    DataFrame or second copy of the data is built. Time spent in each writer
+    is measured separately and reported as rows/s and MB/s.
+
+    Args:
+        records: Iterable of record dictionaries (must be re-iterable if columns is None)
+        base_path: Output path without extension
+        formats: Any of "csv", "xlsx", "parquet"
+        columns: Column order (defaults to the union of record keys in first-seen order)
+
+    Returns:
+        Dictionary of {format: output path}
+    """
+    formats = available_formats(formats)
+    if not formats:
+        return {}
+    if columns is None:
+        columns = record_columns(records)
+
+    paths = {fmt: f"{base_path}.{EXTENSIONS[fmt]}" for fmt in formats}
+    seconds = {fmt: 0.0 for fmt in formats}
+    writers = {}
+    for fmt in formats:
+        start = time.perf_counter()
+        writers[fmt] = EXPORTERS[fmt](paths[fmt], columns)
+        seconds[fmt] += time.perf_counter() - start
+
+    count = 0
+    for record in records:
+        row = {column: flatten_value(value) for column, value in record.items()}
+        for fmt, writer in writers.items():
+            start = time.perf_counter()
+            writer.write(row)
+            seconds[fmt] += time.perf_counter() - start
+        count += 1
+
+    for fmt, writer in writers.items():
+        start = time.perf_counter()
+        writer.close()
+        seconds[fmt] += time.perf_counter() - start
+
+        size_mb = os.path.getsize(paths[fmt]) / 1024 / 1024
+        elapsed = seconds[fmt] or 1e-9
+        print(f"{fmt}: {count} rows, {size_mb:.1f} MB in {seconds[fmt]:.2f}s "
+              f"({count / elapsed:.0f} rows/s, {size_mb / elapsed:.1f} MB/s) -> {paths[fmt]}")
+
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export a comment records file to CSV, Excel and/or Parquet')
+    parser.add_argument('input', help='Input .json, .jsonl or .jsonl.gz records file')
+    parser.add_argument('--output', help='Output path without extension (default: input path without extension)')
+    parser.add_argument('--export', nargs='+', choices=EXPORT_FORMATS, default=['csv', 'xlsx'],
+                        help='Formats to write (default: csv xlsx)')
+    args = parser.parse_args()
+
+    base_path = args.output
+    if not base_path:
+        base_path = args.input
+        while os.path.splitext(base_path)[1] in ('.json', '.jsonl', '.ndjson', '.gz', '.bz2', '.xz'):
+            base_path = os.path.splitext(base_path)[0]
+    # Stream the file twice: once for the column set, once to write
+    columns = record_columns(iter_records(args.input))
+    export_records(iter_records(args.input), base_path, args.export, columns)
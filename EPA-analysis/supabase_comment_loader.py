@@ -1,145 +1,65 @@
 import os
-import json
-import openai
-import numpy as np
+import sys
+import asyncio
+import argparse
 import supabase
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
+# Shared pipeline helpers live alongside the numbered scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from embeddings import get_chunked_embeddings, print_cache_stats
+from records import existing_variant, iter_records
+from section_tree import load_sections
+from load_jobs import add_job_arguments, jobs_from_args
+from supabase_rows import section_levels, upsert_section_batch
+from comment_pipeline import stop_on_interrupt, upload_pipeline
+
 # Load environment variables
 load_dotenv()
 
-# Setup OpenAI and Supabase clients
-openai.api_key = os.getenv('OPENAI_API_KEY')
+# Setup Supabase client
 supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_SERVICE_KEY')
 sb_client = supabase.create_client(supabase_url, supabase_key)
 
-def get_embedding(text):
-    """Generate embedding vector for text using OpenAI's embedding API"""
-    if not text.strip():
-        return []
-
-    # Be more aggressive with truncation - 1 token is roughly 4 chars for English text
-    # Using 7000 tokens (instead of 8192) to be safe
-    max_tokens = 7000
-    max_chars = max_tokens * 4
+def insert_document_sections(sections, proposal_id, batch_size=10):
+    """
+    Insert document sections into Supabase with embeddings
 
-    if len(text) > max_chars:
-        # Truncate text to avoid exceeding token limit
-        text = text[:max_chars]
-        # Further ensure we're within limits by truncating at the last complete sentence
-        last_period = text.rfind('.')
-        if last_period > max_chars * 0.8:  # If we find a period in the last 20% of the text
-            text = text[:last_period + 1]
+    Batches are uploaded one at a time with parents before their subsections,
+    which reference them; a failed batch stops the upload.
 
-    try:
-        response = openai.Embedding.create(
-            input=text,
-            model="text-embedding-ada-002"
-        )
-        return response['data'][0]['embedding']
-    except openai.error.InvalidRequestError as e:
-        # If we still hit token limits, truncate more aggressively
-        if "maximum context length" in str(e):
-            print(f"Warning: Text still too long, truncating more aggressively")
-            # Try with half the text
-            return get_embedding(text[:len(text)//2])
-        else:
-            # Re-raise if it's a different error
-            raise
-
-def upsert_documents_to_supabase(documents, proposal_id, batch_size=10):
-    """Insert documents into Supabase with embeddings"""
-    for i in tqdm(range(0, len(documents), batch_size), desc="Uploading batches to Supabase"):
-        batch = documents[i:i+batch_size]
-
-        # Prepare batch data
-        rows = []
-        for doc in batch:
-            # Use combined_text for embedding if available, otherwise use comment_text
-            text_for_embedding = doc.get('combined_text', doc['comment_text'])
-            embedding = get_embedding(text_for_embedding)
-
-            # Prepare row data
-            row = {
-                'comment_id': doc['comment_id'],
-                'commenter_name': doc['commenter_name'],
-                'organization': doc.get('organization', ''),
-                'comment_date': doc['comment_date'],
-                'comment_text': doc['comment_text'],
-                'has_attachments': len(doc.get('attachments', [])) > 0,
-                'attachment_count': len(doc.get('attachment_contents', [])),
-                'attachment_contents': json.dumps(doc.get('attachment_contents', [])),
-                'combined_text': doc.get('combined_text', doc['comment_text']),
-                'source_url': doc.get('source_url', ''),
-                'embedding': embedding,
-                'proposal_id': proposal_id
-            }
-            rows.append(row)
-
-        # Upsert batch to Supabase
-        try:
-            result = sb_client.table('epa_comments').upsert(rows).execute()
-            if hasattr(result, 'error') and result.error:
-                print(f"Error uploading batch: {result.error}")
-        except Exception as e:
-            print(f"Error uploading batch: {e}")
+    Returns:
+        True if every section was stored
+    """
+    sections = [section for level in section_levels(sections) for section in level]
+    # Sections are few enough to embed up front in a handful of requests
+    embedded = get_chunked_embeddings([section['section_text'] for section in sections])
 
-def insert_document_sections(sections, proposal_id, batch_size=10):
-    """Insert document sections into Supabase with embeddings"""
     for i in tqdm(range(0, len(sections), batch_size), desc="Uploading section batches to Supabase"):
-        batch = sections[i:i+batch_size]
-
-        # Prepare batch data
-        rows = []
-        for section in batch:
-            embedding = get_embedding(section['section_text'])
-
-            # Prepare row data
-            row = {
-                'section_id': section['section_id'],
-                'section_number': section.get('section_number', ''),
-                'section_title': section.get('section_title', ''),
-                'section_text': section['section_text'],
-                'parent_section_id': section.get('parent_section_id'),
-                'hierarchy_level': section.get('hierarchy_level', 1),
-                'hierarchy_path': section.get('hierarchy_path', ''),
-                'proposal_id': proposal_id
-            }
-
-            # Only add embedding if it's not empty
-            if embedding:
-                row['embedding'] = embedding
-
-            rows.append(row)
-
-        # Upsert batch to Supabase
-        try:
-            result = sb_client.table('document_sections').upsert(rows).execute()
-            if hasattr(result, 'error') and result.error:
-                print(f"Error uploading batch: {result.error}")
-        except Exception as e:
-            print(f"Error uploading batch: {e}")
-
-def load_document_sections():
-    """Load document sections from JSON file and upload to Supabase"""
-    sections_file = 'processed/epa_document_sections_fixed.json'
-    proposal_id = 'f8a686ba-fe45-48b7-a85f-df31540bb7d9'
+        if not upsert_section_batch(sb_client, sections[i:i+batch_size], embedded[i:i+batch_size], proposal_id):
+            print(f"Section batch {i // batch_size + 1} failed for {proposal_id}; not uploading the rest")
+            return False
+    return True
 
+def load_document_sections(sections_file, proposal_id, batch_size=10):
+    """Load document sections from JSON file and upload to Supabase"""
     print(f"Loading document sections from {sections_file}")
     print(f"Using proposal ID: {proposal_id}")
 
     try:
-        with open(sections_file, 'r') as f:
-            sections = json.load(f)
+        sections = load_sections(existing_variant(sections_file))
 
         print(f"Found {len(sections)} document sections to load")
 
         # Upload sections to Supabase with the specific proposal ID
-        insert_document_sections(sections, proposal_id)
+        if not insert_document_sections(sections, proposal_id, batch_size):
+            print(f"Document sections for {proposal_id} were not all uploaded")
+            return False
 
-        print("Document sections uploaded successfully!")
+        print(f"Document sections for {proposal_id} uploaded successfully!")
         return True
     except FileNotFoundError:
         print(f"Document sections file not found: {sections_file}")
@@ -148,64 +68,89 @@ def load_document_sections():
         print(f"Error loading document sections: {e}")
         return False
 
-def main():
-    print("Welcome to the EPA comment and document loader")
-    print("1. Load document sections")
-    print("2. Load comments")
-    print("3. Load both document sections and comments")
-    print("4. Exit")
-
-    # Define the proposal ID for both document sections and comments
-    proposal_id = 'f8a686ba-fe45-48b7-a85f-df31540bb7d9'
-
-    choice = input("Enter your choice (1-4): ")
-
-    if choice == '1':
-        load_document_sections()
-    elif choice == '2':
-        # Load the enhanced comments with attachment content
-        comments_file = 'processed/epa_comments_with_attachment_content_222.json'
-        print(f"Loading comments from {comments_file}")
-        print(f"Using proposal ID: {proposal_id}")
-
-        with open(comments_file, 'r') as f:
-            comments = json.load(f)
-
-        print(f"Found {len(comments)} comments to load")
-
-        # Count comments with attachments
-        comments_with_attachments = sum(1 for c in comments if len(c.get('attachment_contents', [])) > 0)
-        print(f"Of these, {comments_with_attachments} comments have attachments")
-
-        # Upload comments to Supabase
-        upsert_documents_to_supabase(comments, proposal_id)
-
-        print("Comments uploaded successfully!")
-    elif choice == '3':
-        success = load_document_sections()
-        if success:
-            # Load comments after sections are loaded
-            comments_file = 'processed/epa_comments_with_attachment_content_222.json'
-            print(f"Loading comments from {comments_file}")
-            print(f"Using proposal ID: {proposal_id}")
+async def load_comments(comments_file, proposal_id, stopping, batch_size=10, embed_batch_size=500, embed_workers=2,
+                        upload_workers=4, upload_slots=None):
+    """Stream comments from a JSON or JSON Lines file and upload them to Supabase"""
+    comments_file = existing_variant(comments_file)
+    print(f"Loading comments from {comments_file}")
+    print(f"Using proposal ID: {proposal_id}")
 
-            with open(comments_file, 'r') as f:
-                comments = json.load(f)
+    # Count while streaming so the file is only read once
+    counts = {'comments': 0, 'with_attachments': 0}
 
-            print(f"Found {len(comments)} comments to load")
+    def counted(comments):
+        for comment in comments:
+            counts['comments'] += 1
+            if len(comment.get('attachment_contents', [])) > 0:
+                counts['with_attachments'] += 1
+            yield comment
 
-            # Count comments with attachments
-            comments_with_attachments = sum(1 for c in comments if len(c.get('attachment_contents', [])) > 0)
-            print(f"Of these, {comments_with_attachments} comments have attachments")
+    # Upload comments to Supabase
+    try:
+        result = await upload_pipeline(sb_client, counted(iter_records(comments_file)), proposal_id, stopping,
+                                       batch_size, embed_batch_size, embed_workers, upload_workers, upload_slots)
+    except FileNotFoundError:
+        print(f"Comments file not found: {comments_file}")
+        return False
+    except Exception as e:
+        # A bad record or a failed request ends this proposal's load, not the others'
+        print(f"Error loading comments for {proposal_id}: {e}")
+        return False
 
-            # Upload comments to Supabase
-            upsert_documents_to_supabase(comments, proposal_id)
+    print(f"Loaded {counts['comments']} comments for {proposal_id}")
+    print(f"Of these, {counts['with_attachments']} comments have attachments")
+    failed = result['embed'].failed + result['upload'].failed
+    if failed:
+        # Rows are upserted, so running the load again is safe
+        print(f"{failed} comments failed to embed or upload; run the load again to retry them")
+        return False
+    if result['interrupted']:
+        # Rows are upserted, so running the load again is safe
+        print("Upload interrupted; run the load again to upload the remaining comments")
+        return False
+    print("Comments uploaded successfully!")
+    return True
+
+async def load_proposal(job, stopping, upload_slots, args):
+    """Load the sections and then the comments of one {'proposal_id', 'sections', 'comments'} job"""
+    if job['sections']:
+        if not await asyncio.to_thread(load_document_sections, job['sections'], job['proposal_id'], args.batch_size):
+            # Comments are matched against the sections, so don't load them without
+            return False
+    if job['comments'] and not stopping.is_set():
+        return await load_comments(job['comments'], job['proposal_id'], stopping, args.batch_size,
+                                   args.embed_batch_size, args.embed_workers, args.workers, upload_slots)
+    return not stopping.is_set()
+
+async def load_proposals(jobs, args):
+    """Load every job concurrently; their pipelines share one upload limit and one thread pool"""
+    loop = asyncio.get_running_loop()
+    # Threads for each proposal's reader, embedders and section upload, plus the shared upserts
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.workers + len(jobs) * (args.embed_workers + 2)))
+    stopping = asyncio.Event()
+    upload_slots = asyncio.Semaphore(args.workers)
+    with stop_on_interrupt(stopping):
+        return await asyncio.gather(*(load_proposal(job, stopping, upload_slots, args) for job in jobs))
 
-            print("Comments uploaded successfully!")
-    elif choice == '4':
-        print("Exiting...")
-    else:
-        print("Invalid choice. Exiting...")
+def main():
+    parser = argparse.ArgumentParser(description='Upload comments and document sections to Supabase with embeddings')
+    add_job_arguments(parser, 'Upload workers per proposal; comment upserts in flight are capped at this '
+                              'number across all proposals (default: 4)')
+    parser.add_argument('--embed-workers', type=int, default=2,
+                        help='Embedding requests in flight per proposal (default: 2)')
+    args = parser.parse_args()
+    jobs = jobs_from_args(parser, args)
+    if args.embed_workers < 1:
+        parser.error('--embed-workers must be at least 1')
+
+    # One Supabase client and embedding cache serve every proposal
+    results = asyncio.run(load_proposals(jobs, args))
+
+    print_cache_stats()
+    failed = [job['proposal_id'] for job, ok in zip(jobs, results) if not ok]
+    if failed:
+        print(f"Loading incomplete for {len(failed)} of {len(jobs)} proposals: {', '.join(failed)}")
+        raise SystemExit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,26 @@
+import os
+import sys
+import importlib.util
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+# Tests never read or write the shared on-disk caches under processed/
+os.environ['EMBEDDING_CACHE_PATH'] = ''
+os.environ['FIRECRAWL_CACHE_PATH'] = ''
+
+@pytest.fixture(scope='session')
+def load_script():
+    """Import a numbered pipeline script (e.g. "1_scrape_epa_comments"), which can't be imported by name"""
+    loaded = {}
+
+    def load(name):
+        if name not in loaded:
+            spec = importlib.util.spec_from_file_location(name.replace('.', '_'), os.path.join(SCRIPTS_DIR, f"{name}.py"))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            loaded[name] = module
+        return loaded[name]
+
+    return load
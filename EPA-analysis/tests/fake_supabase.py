@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+class FakeQuery:
+    """
+    Request against an in-memory table; like PostgREST, a select returns at
+    most max_rows rows and an upsert replaces rows with the same primary key
+    """
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.action = None
+        self.payload = None
+        self.filters = []
+        self.columns = []
+        self.start, self.end = 0, None
+
+    def select(self, columns):
+        self.action = 'select'
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = 'insert', rows
+        return self
+
+    def upsert(self, rows):
+        self.action, self.payload = 'upsert', rows
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row[column] in values)
+        return self
+
+    def order(self, column):
+        self.columns.append(column)
+        return self
+
+    def range(self, start, end):
+        self.start, self.end = start, end
+        return self
+
+    def execute(self):
+        self.client.requests.append((self.name, self.action))
+        if (self.name, self.action) in self.client.failures:
+            raise RuntimeError(f"{self.action} on {self.name} failed")
+        table = self.client.tables.setdefault(self.name, [])
+        if self.action == 'select':
+            rows = sorted((row for row in table if all(f(row) for f in self.filters)),
+                          key=lambda row: tuple(row[column] for column in self.columns))
+            end = len(rows) if self.end is None else self.end + 1
+            return SimpleNamespace(data=rows[self.start:min(end, self.start + self.client.max_rows)])
+        if self.action == 'delete':
+            table[:] = [row for row in table if not all(f(row) for f in self.filters)]
+        else:
+            key = self.client.keys.get(self.name)
+            if key:
+                replaced = {row[key] for row in self.payload}
+                table[:] = [row for row in table if row[key] not in replaced]
+            table.extend(self.payload)
+        return SimpleNamespace(data=self.payload or [])
+
+class FakeClient:
+    """Stands in for the Supabase client; failures lists the (table, action) requests that raise"""
+
+    def __init__(self, tables=None, max_rows=1000, failures=()):
+        self.tables = tables or {}
+        self.max_rows = max_rows
+        self.failures = set(failures)
+        self.keys = {'epa_comments': 'comment_id', 'document_sections': 'section_id'}
+        self.requests = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
@@ -0,0 +1,120 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def _pdf_file(objects):
+    """Serialize numbered PDF objects (object 1 the catalog) with their cross-reference table"""
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return pdf
+
+def _stream(data):
+    return b"<< /Length " + str(len(data)).encode() + b" >>\nstream\n" + data + b"\nendstream"
+
+def make_pdf(text):
+    """A minimal one-page PDF whose extractable text is `text`"""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode('latin-1')
+    return _pdf_file([
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        _stream(stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ])
+
+# Typefaces of Federal Register documents: body text, bold and italic headings
+PDF_FONTS = {'body': 'Times-Roman', 'bold': 'Times-Bold', 'italic': 'Times-Italic'}
+
+def make_styled_pdf(pages):
+    """
+    A PDF laid out line by line, for heading detection from fonts and indents
+
+    Args:
+        pages: List of pages, each a list of (style, x, text) lines from the
+            top; style is a PDF_FONTS key and x the indent in points
+    """
+    fonts = list(PDF_FONTS)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None]
+    objects += [f"<< /Type /Font /Subtype /Type1 /BaseFont /{PDF_FONTS[style]} >>".encode() for style in fonts]
+    resources = ' '.join(f"/F{i} {i + 3} 0 R" for i in range(len(fonts)))
+
+    kids = []
+    for lines in pages:
+        operations = []
+        for row, (style, x, text) in enumerate(lines):
+            text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+            operations.append(f"BT /F{fonts.index(style)} 10 Tf 1 0 0 1 {x} {740 - 12 * row} Tm ({text}) Tj ET")
+        objects.append(_stream('\n'.join(operations).encode('latin-1')))
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+                       f"/Resources << /Font << {resources} >> >> >>".encode())
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+    return _pdf_file(objects)
+
+class FixtureServer:
+    """
+    Local HTTP server with scripted responses, for download tests
+
+    routes maps a path to a list of responses served in turn (the last one
+    repeats). A response is bytes (200 with that body), an int status code,
+    or ('truncated', body) to promise the whole body but close the connection
+    halfway through it. Every request is recorded in hits as (time, path).
+    """
+
+    def __init__(self, routes=None):
+        self.routes = dict(routes or {})
+        self.hits = []
+        self._lock = threading.Lock()
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                response = fixture._next_response(self.path)
+                if isinstance(response, int):
+                    self.send_response(response)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                truncated = isinstance(response, tuple)
+                body = response[1] if truncated else response
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/pdf')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body[:len(body) // 2] if truncated else body)
+                if truncated:
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _next_response(self, path):
+        with self._lock:
+            self.hits.append((time.monotonic(), path))
+            responses = self.routes.get(path, [404])
+            return responses.pop(0) if len(responses) > 1 else responses[0]
+
+    def url(self, path, host='127.0.0.1'):
+        return f"http://{host}:{self.server.server_port}{path}"
+
+    def paths(self):
+        return [path for _, path in self.hits]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
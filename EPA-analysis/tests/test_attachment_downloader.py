@@ -0,0 +1,80 @@
+import os
+import time
+import pytest
+import requests
+from attachment_downloader import AttachmentDownloader
+from fixture_server import FixtureServer, make_pdf
+
+PDF_A = make_pdf('First attachment')
+PDF_B = make_pdf('Second attachment')
+
+def downloader(**options):
+    settings = {'workers': 4, 'rate': 0, 'retries': 3, 'backoff': 0.01, 'timeout': 5}
+    settings.update(options)
+    return AttachmentDownloader(**settings)
+
+def test_downloads_files_concurrently(tmp_path):
+    routes = {f"/{i}.pdf": [make_pdf(f"Attachment {i}")] for i in range(12)}
+    with FixtureServer(routes) as server:
+        jobs = [(server.url(path), str(tmp_path / path.lstrip('/'))) for path in routes]
+        results = list(downloader().download_all(jobs))
+
+    assert sorted(i for i, _, _ in results) == list(range(12))
+    assert all(error is None for _, _, error in results)
+    for (_, path), body in zip(jobs, routes.values()):
+        with open(path, 'rb') as f:
+            assert f.read() == body[0]
+
+def test_retries_transient_errors_with_backoff(tmp_path):
+    with FixtureServer({'/flaky.pdf': [503, 429, PDF_A]}) as server:
+        path = downloader().download(server.url('/flaky.pdf'), str(tmp_path / 'flaky.pdf'))
+        assert server.paths() == ['/flaky.pdf'] * 3
+
+    with open(path, 'rb') as f:
+        assert f.read() == PDF_A
+
+def test_client_errors_fail_without_retrying(tmp_path):
+    with FixtureServer({'/missing.pdf': [404]}) as server:
+        with pytest.raises(requests.HTTPError):
+            downloader().download(server.url('/missing.pdf'), str(tmp_path / 'missing.pdf'))
+        assert server.paths() == ['/missing.pdf']
+    assert os.listdir(tmp_path) == []
+
+def test_gives_up_after_the_last_retry(tmp_path):
+    with FixtureServer({'/down.pdf': [500]}) as server:
+        with pytest.raises(requests.HTTPError):
+            downloader(retries=2).download(server.url('/down.pdf'), str(tmp_path / 'down.pdf'))
+        assert len(server.hits) == 3
+
+def test_interrupted_transfer_never_looks_complete(tmp_path):
+    path = str(tmp_path / 'cut.pdf')
+    with FixtureServer({'/cut.pdf': [('truncated', PDF_B)]}) as server:
+        with pytest.raises(requests.RequestException):
+            downloader(retries=1).download(server.url('/cut.pdf'), path)
+    assert os.listdir(tmp_path) == []
+
+    # A later run fetches the file again from scratch
+    with FixtureServer({'/cut.pdf': [('truncated', PDF_B), PDF_B]}) as server:
+        downloader().download(server.url('/cut.pdf'), path)
+        assert len(server.hits) == 2
+    with open(path, 'rb') as f:
+        assert f.read() == PDF_B
+    assert os.listdir(tmp_path) == ['cut.pdf']
+
+def test_rate_limit_spaces_requests_per_host(tmp_path):
+    hosts = {'a': '127.0.0.1', 'b': 'localhost'}
+    routes = {f"/{name}{i}.pdf": [PDF_A] for name in hosts for i in range(6)}
+    with FixtureServer(routes) as server:
+        # 127.0.0.1 and localhost are different hosts with a bucket each
+        jobs = [(server.url(path, hosts[path[1]]), str(tmp_path / path.lstrip('/'))) for path in routes]
+        start = time.monotonic()
+        list(downloader(workers=8, rate=10, burst=1).download_all(jobs))
+        elapsed = time.monotonic() - start
+
+    for name in hosts:
+        times = sorted(t for t, path in server.hits if path[1] == name)
+        assert len(times) == 6
+        # At 10 requests per second with no burst, six requests span at least five intervals
+        assert times[-1] - times[0] >= 0.45
+    # ... but the two hosts don't wait for each other (one shared limit would need 1.1s)
+    assert elapsed < 0.9
@@ -0,0 +1,135 @@
+import pytest
+import bulk_loader
+from bulk_loader import MemorySink, bulk_load, load_job
+from records import write_records
+
+def fake_chunked_embeddings(texts):
+    """get_chunked_embeddings stand-in: one chunk per '|'-separated part of each text"""
+    results = []
+    for text in texts:
+        chunks, start = [], 0
+        for i, part in enumerate(text.split('|')):
+            chunks.append({'chunk_index': i, 'start_char': start, 'end_char': start + len(part),
+                           'token_count': len(part.split()), 'embedding': [float(i), float(len(part))]})
+            start += len(part) + 1
+        results.append({'embedding': [float(len(text)), 1.0], 'chunks': chunks})
+    return results
+
+@pytest.fixture
+def embed_calls(monkeypatch):
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return fake_chunked_embeddings(texts)
+
+    monkeypatch.setattr(bulk_loader, 'get_chunked_embeddings', embed)
+    return calls
+
+class RecordingSink(MemorySink):
+    """MemorySink that also records the keys of every batch in write order"""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def write_batch(self, table, key, columns, rows, chunk_table, chunks):
+        self.batches.append((table, [row[key] for row in rows]))
+        super().write_batch(table, key, columns, rows, chunk_table, chunks)
+
+def comment(i, text=None):
+    return {'comment_id': f"c{i}", 'commenter_name': f"Commenter {i}", 'comment_date': '2020-06-20',
+            'comment_text': text or f"first part {i}|second part|third part"}
+
+def test_reloading_updates_rows_and_replaces_chunks(embed_calls):
+    sink = MemorySink()
+    bulk_load(sink, [comment(i) for i in range(5)], 'comments', 'p', batch_size=2)
+    assert len(sink.tables['epa_comment_chunks']) == 15
+
+    # The text of two comments changed and now splits into fewer chunks
+    stats = bulk_load(sink, [comment(1, 'revised'), comment(3, 'revised|again')], 'comments', 'p', batch_size=2)
+
+    comments = sink.tables['epa_comments']
+    assert sorted(comments) == ['c0', 'c1', 'c2', 'c3', 'c4']
+    assert comments['c1']['comment_text'] == 'revised' and comments['c0']['comment_text'].startswith('first part 0')
+    chunks = sink.tables['epa_comment_chunks']
+    assert sorted(index for key, index in chunks if key == 'c1') == [0]
+    assert sorted(index for key, index in chunks if key == 'c3') == [0, 1]
+    assert len(chunks) == 3 * 3 + 1 + 2
+    assert (stats['rows'], stats['chunks']) == (2, 3)
+
+def test_last_copy_of_a_repeated_key_wins(embed_calls):
+    sink = MemorySink()
+    stats = bulk_load(sink, [comment(1), comment(2), comment(1, 'again')], 'comments', 'p', batch_size=3)
+
+    assert sink.tables['epa_comments']['c1']['comment_text'] == 'again'
+    assert sorted(key for key, _ in sink.tables['epa_comment_chunks']) == ['c1', 'c2', 'c2', 'c2']
+    assert stats['rows'] == 2
+
+@pytest.mark.parametrize('batch_size', [1, 3, 7, 10])
+@pytest.mark.parametrize('prefetch', [0, 1, 5])
+def test_every_record_is_written_once_in_order(embed_calls, batch_size, prefetch):
+    comments = [comment(i) for i in range(7)]
+    sink = RecordingSink()
+    stats = bulk_load(sink, iter(comments), 'comments', 'p', batch_size=batch_size, prefetch=prefetch)
+
+    expected = [[c['comment_id'] for c in comments[i:i+batch_size]] for i in range(0, len(comments), batch_size)]
+    assert [keys for _, keys in sink.batches] == expected
+    assert [len(texts) for texts in embed_calls] == [len(keys) for keys in expected]
+    assert (stats['rows'], stats['chunks']) == (7, 21)
+    assert {chunk['proposal_id'] for chunk in sink.tables['epa_comment_chunks'].values()} == {'p'}
+
+SECTIONS = [
+    {'section_id': 'one-a-i', 'section_text': 'Deepest', 'parent_section_id': 'one-a', 'hierarchy_level': 3},
+    {'section_id': 'one-a', 'section_text': 'Middle', 'parent_section_id': 'one', 'hierarchy_level': 2},
+    {'section_id': 'one', 'section_text': 'Top', 'parent_section_id': None, 'hierarchy_level': 1},
+    {'section_id': 'two', 'section_text': 'Other top', 'parent_section_id': None, 'hierarchy_level': 1},
+]
+
+def test_sections_are_written_parents_first(embed_calls, tmp_path):
+    sections_file = str(tmp_path / 'sections.jsonl')
+    comments_file = str(tmp_path / 'comments.jsonl')
+    write_records(sections_file, SECTIONS)
+    write_records(comments_file, [comment(1)])
+    sink = RecordingSink()
+
+    job = {'proposal_id': 'p', 'sections': sections_file, 'comments': comments_file}
+    assert load_job(sink, job, batch_size=1)
+
+    assert sink.batches == [('document_sections', ['one']), ('document_sections', ['two']),
+                            ('document_sections', ['one-a']), ('document_sections', ['one-a-i']),
+                            ('epa_comments', ['c1'])]
+
+def test_comments_wait_for_their_sections(embed_calls, tmp_path):
+    comments_file = str(tmp_path / 'comments.jsonl')
+    write_records(comments_file, [comment(1)])
+    sink = RecordingSink()
+
+    job = {'proposal_id': 'p', 'sections': str(tmp_path / 'missing.jsonl'), 'comments': comments_file}
+    assert not load_job(sink, job)
+    assert sink.batches == []
+
+def test_proposal_id_is_required(monkeypatch, tmp_path):
+    monkeypatch.setattr('sys.argv', ['bulk_loader.py', '--comments', str(tmp_path / 'comments.jsonl'), '--dry-run'])
+    with pytest.raises(SystemExit) as exit_info:
+        bulk_loader.main()
+    assert exit_info.value.code == 2
+
+def test_dry_run_loads_every_job(embed_calls, monkeypatch, tmp_path, capsys):
+    jobs_file = str(tmp_path / 'jobs.jsonl')
+    jobs = []
+    for proposal in ('p1', 'p2'):
+        comments_file = str(tmp_path / f"{proposal}.jsonl")
+        write_records(comments_file, [comment(f"{proposal}-{i}") for i in range(3)])
+        jobs.append({'proposal_id': proposal, 'comments': comments_file})
+    # A job whose file is missing fails on its own and sets the exit status
+    jobs.append({'proposal_id': 'p3', 'comments': str(tmp_path / 'missing.jsonl')})
+    write_records(jobs_file, jobs)
+    monkeypatch.setattr('sys.argv', ['bulk_loader.py', '--jobs', jobs_file, '--dry-run', '--workers', '2'])
+
+    with pytest.raises(SystemExit) as exit_info:
+        bulk_loader.main()
+    assert exit_info.value.code == 1
+    out = capsys.readouterr().out
+    assert 'epa_comments: 6 rows in memory' in out
+    assert 'Loading failed for 1 of 3 proposals: p3' in out
@@ -0,0 +1,64 @@
+import pytest
+from comment_parser import parse_comment_page, CommentParseError
+
+URL = 'https://www.regulations.gov/comment/EPA-HQ-OAR-2017-0015-0173'
+
+DETAILS = {
+    'Comment ID': 'EPA-HQ-OAR-2017-0015-0173',
+    'Submitter Name': 'Jane Doe',
+    'Organization Name': 'Acme Corp',
+    'Received Date': 'Jun 20, 2020',
+}
+
+def comment_page(details=DETAILS, title='Comment from Jane Doe, Acme Corp',
+                 body='<p>Please reconsider the rule.</p><p>Thank you.</p>'):
+    """A comment page laid out like regulations.gov: title, details panel, comment body, attachments"""
+    panel = ''.join(f'<div class="detail"><span>{label}</span><span>{value}</span></div>'
+                    for label, value in details.items())
+    return f"""<html><body>
+        <h1>{title}</h1>
+        <div class="details">{panel}</div>
+        <section><h2>Comment</h2></section>
+        <div class="body">{body}</div>
+        <h2>Attachments</h2>
+        <a href="https://downloads.regulations.gov/EPA-HQ-OAR-2017-0015-0173/attachment_1.pdf">Download</a>
+    </body></html>"""
+
+def without(field):
+    return {label: value for label, value in DETAILS.items() if label != field}
+
+def test_parses_every_field():
+    assert parse_comment_page(comment_page(), URL) == {
+        'commenter_name': 'Jane Doe',
+        'comment_date': 'Jun 20, 2020',
+        'organization': 'Acme Corp',
+        'comment_text': 'Please reconsider the rule.\nThank you.',
+        'attachments': [{'filename': 'attachment_1',
+                         'link': 'https://downloads.regulations.gov/EPA-HQ-OAR-2017-0015-0173/attachment_1.pdf'}],
+        'comment_id': 'EPA-HQ-OAR-2017-0015-0173',
+    }
+
+def test_commenter_and_organization_fall_back_to_the_title():
+    parsed = parse_comment_page(comment_page(details=without('Submitter Name')), URL)
+    assert (parsed['commenter_name'], parsed['organization']) == ('Jane Doe', 'Acme Corp')
+
+def test_organization_is_optional():
+    parsed = parse_comment_page(comment_page(details=without('Organization Name'), title='Comment from Jane Doe'), URL)
+    assert (parsed['commenter_name'], parsed['organization']) == ('Jane Doe', '')
+
+@pytest.mark.parametrize('page, url, reason', [
+    ('', URL, 'Empty page'),
+    # The ID has to come from the page, not just the URL
+    (comment_page(details=without('Comment ID')), URL, 'No comment ID'),
+    (comment_page(), 'https://www.regulations.gov/comment/EPA-HQ-OAR-2017-0015-0999', "doesn't match"),
+    (comment_page(body=''), URL, 'No comment text'),
+    (comment_page(details=without('Received Date')), URL, 'No comment date'),
+    (comment_page(details={**DETAILS, 'Received Date': 'Attachments (1)'}), URL, 'Unrecognised comment date'),
+    (comment_page(details=without('Submitter Name'), title='Public comment'), URL, 'No commenter'),
+    # A label directly followed by another label is an empty value, not a name
+    (comment_page(details={**without('Submitter Name'), 'Submitter Name': 'Organization Name'},
+                  title='Public comment'), URL, 'No commenter'),
+])
+def test_incomplete_pages_are_rejected(page, url, reason):
+    with pytest.raises(CommentParseError, match=reason):
+        parse_comment_page(page, url)
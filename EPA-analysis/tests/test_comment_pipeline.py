@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import pytest
+import comment_pipeline
+from comment_pipeline import upload_pipeline
+from fake_supabase import FakeClient
+
+def fake_chunked_embeddings(texts):
+    """get_chunked_embeddings stand-in: a single chunk per text"""
+    return [{'embedding': [float(len(text)), 1.0],
+             'chunks': [{'chunk_index': 0, 'start_char': 0, 'end_char': len(text), 'token_count': len(text.split()),
+                         'embedding': [0.0, 1.0]}]} for text in texts]
+
+@pytest.fixture(autouse=True)
+def fake_embeddings(monkeypatch):
+    monkeypatch.setattr(comment_pipeline, 'get_chunked_embeddings', fake_chunked_embeddings)
+
+def comment(i):
+    return {'comment_id': f"c{i}", 'commenter_name': f"Commenter {i}", 'comment_date': '2020-06-20',
+            'comment_text': f"Comment number {i}"}
+
+def run(client, documents, stopping=None, leftover=None, **kwargs):
+    """
+    Run upload_pipeline; leftover collects the tasks still pending when it
+    returned or raised, which asyncio.run would otherwise cancel unseen
+    """
+    leftover = [] if leftover is None else leftover
+
+    async def main():
+        try:
+            return await upload_pipeline(client, documents, 'p', stopping or asyncio.Event(), **kwargs)
+        finally:
+            leftover.extend(task for task in asyncio.all_tasks() if task is not asyncio.current_task())
+
+    return asyncio.run(main()), leftover
+
+def test_every_comment_is_uploaded():
+    client = FakeClient()
+    result, leftover = run(client, (comment(i) for i in range(23)), batch_size=4, embed_batch_size=5,
+                           embed_workers=2, upload_workers=3)
+
+    assert sorted(row['comment_id'] for row in client.tables['epa_comments']) == sorted(f"c{i}" for i in range(23))
+    assert len(client.tables['epa_comment_chunks']) == 23
+    assert [result[stage].items for stage in ('read', 'embed', 'upload')] == [23, 23, 23]
+    assert result['read'].batches == 5 and result['upload'].failed == 0
+    assert not result['interrupted'] and leftover == []
+
+def test_failed_uploads_are_counted():
+    client = FakeClient(failures=[('epa_comments', 'upsert')])
+    result, _ = run(client, [comment(i) for i in range(6)], batch_size=2, embed_batch_size=3)
+
+    assert result['upload'].failed == 6 and result['upload'].items == 0
+
+def test_stopping_finishes_what_was_read():
+    # The reader runs in a thread, so the documents can't set an asyncio.Event; anything with is_set() works
+    stopping = threading.Event()
+
+    def documents():
+        for i in range(100):
+            if i == 7:
+                stopping.set()
+            yield comment(i)
+
+    client = FakeClient()
+    result, leftover = run(client, documents(), stopping, batch_size=2, embed_batch_size=4)
+
+    # The group holding the comment that set the event is the last one read, and all of it is uploaded
+    assert sorted(row['comment_id'] for row in client.tables['epa_comments']) == sorted(f"c{i}" for i in range(8))
+    assert result['interrupted'] and result['read'].items == 8 and leftover == []
+
+@pytest.mark.parametrize('upload_workers', [1, 4])
+def test_reader_error_stops_every_stage(upload_workers):
+    def documents():
+        for i in range(30):
+            yield comment(i)
+        raise ValueError("malformed record")
+
+    leftover = []
+    with pytest.raises(ValueError, match="malformed record"):
+        run(FakeClient(), documents(), leftover=leftover, batch_size=2, embed_batch_size=3,
+            upload_workers=upload_workers)
+    assert leftover == []
+
+def test_upload_error_stops_every_stage(monkeypatch):
+    def upsert(client, batch, embedded, proposal_id):
+        raise KeyError('comment_date')
+
+    monkeypatch.setattr(comment_pipeline, 'upsert_comment_batch', upsert)
+    # Without the upload workers the embedders would block on the full upload queue forever
+    leftover = []
+    with pytest.raises(KeyError):
+        run(FakeClient(), (comment(i) for i in range(200)), leftover=leftover, batch_size=1, embed_batch_size=5)
+    assert leftover == []
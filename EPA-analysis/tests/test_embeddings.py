@@ -0,0 +1,141 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import openai
+import pytest
+import embeddings
+import embedding_cache
+from embedding_cache import EmbeddingCache
+
+def vector_for(text):
+    """Deterministic stand-in embedding, so results can be traced back to their input"""
+    return [float(len(text)), float(sum(map(ord, text)) % 997)]
+
+class StubEmbeddingHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST /embeddings like the OpenAI API, listing the results in
+    reverse order; a request with an input over server.max_chars is
+    rejected with the API's context length error
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+        self.server.requests.append(inputs)
+        if self.server.max_chars and any(len(text) > self.server.max_chars for text in inputs):
+            status = 400
+            payload = json.dumps({'error': {'message': "This model's maximum context length is 8191 tokens",
+                                            'type': 'invalid_request_error', 'param': None, 'code': None}}).encode()
+        else:
+            status = 200
+            data = [{'object': 'embedding', 'index': i, 'embedding': vector_for(text)} for i, text in enumerate(inputs)]
+            payload = json.dumps({'object': 'list', 'model': body['model'], 'data': data[::-1],
+                                  'usage': {'prompt_tokens': 0, 'total_tokens': 0}}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubEmbeddingHandler)
+    server.requests = []
+    server.max_chars = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(openai, 'api_base', f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(openai, 'api_key', 'test-key')
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_results_line_up_with_inputs(stub_server):
+    texts = [f"comment number {i}" for i in range(7)]
+    assert embeddings.get_embeddings(texts, max_batch_inputs=3) == [vector_for(text) for text in texts]
+
+def test_batches_respect_input_and_token_limits(stub_server):
+    texts = [f"comment number {i} " * (i + 1) for i in range(10)]
+    max_tokens = 3 * max(embeddings.count_tokens(text) for text in texts)
+    embeddings.get_embeddings(texts, max_batch_tokens=max_tokens, max_batch_inputs=4)
+
+    assert [text for request in stub_server.requests for text in request] == texts
+    assert all(len(request) <= 4 for request in stub_server.requests)
+    assert all(sum(map(embeddings.count_tokens, request)) <= max_tokens for request in stub_server.requests)
+    assert len(stub_server.requests) == len(embeddings.pack_batches(texts, max_tokens, 4))
+
+def test_blank_and_repeated_texts_are_not_sent(stub_server):
+    texts = ['first', '', '   \n', 'second', 'first']
+    result = embeddings.get_embeddings(texts)
+
+    assert result == [vector_for('first'), [], [], vector_for('second'), vector_for('first')]
+    assert stub_server.requests == [['first', 'second']]
+
+def test_cached_texts_are_not_sent_again(stub_server, tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'cache.sqlite'), 100)
+    embeddings.get_embeddings(['alpha', 'beta'], cache=cache)
+    result = embeddings.get_embeddings(['beta', 'gamma'], cache=cache)
+
+    assert result == [vector_for('beta'), vector_for('gamma')]
+    assert stub_server.requests == [['alpha', 'beta'], ['gamma']]
+
+def long_text(paragraphs=8):
+    return '\n\n'.join(f"Paragraph {i}: " + 'the agency should reconsider the proposed limits. ' * 20
+                       for i in range(paragraphs))
+
+def pooled_vector(text):
+    """What get_chunked_embeddings makes of text against the stub server"""
+    spans = embeddings.chunk_spans(text)
+    return embeddings.pool_embeddings([vector_for(text[start:end]) for start, end, _ in spans],
+                                      [tokens for _, _, tokens in spans])
+
+def test_get_embedding_embeds_long_text_in_chunks(stub_server):
+    text = long_text()
+    chunks = [text[start:end] for start, end, _ in embeddings.chunk_spans(text)]
+    assert len(chunks) > 1
+
+    assert embeddings.get_embedding(text) == pooled_vector(text)
+    assert embeddings.get_embedding('short comment') == vector_for('short comment')
+    assert embeddings.get_embedding('  ') == []
+    # One request for all the chunks, none for blank text
+    assert stub_server.requests == [chunks, ['short comment']]
+
+def test_context_length_error_falls_back_to_chunks(stub_server):
+    text = long_text()
+    # Shorter than the whole text but longer than any chunk, like a text whose token count was underestimated
+    stub_server.max_chars = max(end - start for start, end, _ in embeddings.chunk_spans(text)) + 1
+    texts = ['first comment', text, 'second comment']
+
+    assert embeddings.get_embeddings(texts) == [vector_for('first comment'), pooled_vector(text),
+                                                vector_for('second comment')]
+    # The rejected batch, then one request per text; no retries of shorter and shorter prefixes
+    chunks = [text[start:end] for start, end, _ in embeddings.chunk_spans(text)]
+    assert stub_server.requests == [texts, ['first comment'], chunks, ['second comment']]
+
+def test_threads_share_one_default_cache(monkeypatch, tmp_path):
+    opened = []
+
+    class SlowCache(EmbeddingCache):
+        def __init__(self, *args):
+            # Widen the window between checking for the cache and storing it
+            time.sleep(0.05)
+            opened.append(self)
+            super().__init__(*args)
+
+    monkeypatch.setattr(embedding_cache, 'EmbeddingCache', SlowCache)
+    monkeypatch.setattr(embedding_cache, '_default_cache', None)
+    monkeypatch.setenv('EMBEDDING_CACHE_PATH', str(tmp_path / 'cache.sqlite'))
+
+    caches = []
+    threads = [threading.Thread(target=lambda: caches.append(embedding_cache.get_default_cache())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(opened) == 1 and caches == opened * 8
+    opened[0].close()
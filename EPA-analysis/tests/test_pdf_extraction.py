@@ -0,0 +1,51 @@
+import os
+import time
+import queue
+import pytest
+from pdf_extraction import extract_pdf_files
+
+def timed_extract(path):
+    """Stand-in extractor: log the run, then behave as the file's contents say"""
+    with open(path) as f:
+        action = f.read()
+    with open(f"{path}.runs", 'a') as f:
+        f.write('.')
+    if action == 'fail':
+        raise ValueError(f"unreadable: {os.path.basename(path)}")
+    if action == 'crash':
+        os._exit(1)
+    time.sleep(float(action))
+    return os.path.basename(path)
+
+def run(tmp_path, files, **options):
+    jobs = queue.Queue()
+    for name, action in files:
+        path = tmp_path / name
+        path.write_text(action)
+        jobs.put((name, str(path)))
+    jobs.put(None)
+    results = {key: (result, error) for key, result, error in extract_pdf_files(jobs, extract=timed_extract, **options)}
+    runs = {name: len((tmp_path / f"{name}.runs").read_text()) for name, _ in files}
+    return results, runs
+
+def test_a_stuck_file_times_out_without_restarting_the_others(tmp_path):
+    # "steady" starts after "quick" and is still running when "stuck" times out
+    files = [('stuck', '30'), ('quick', '0.5'), ('steady', '1.2'), ('after', '0.1')]
+    start = time.monotonic()
+    results, runs = run(tmp_path, files, workers=2, timeout=1.5, poll_interval=0.05)
+
+    assert isinstance(results['stuck'][1], TimeoutError)
+    assert {key: results[key] for key in ('quick', 'steady', 'after')} == {
+        'quick': ('quick', None), 'steady': ('steady', None), 'after': ('after', None)}
+    assert runs == {'stuck': 1, 'quick': 1, 'steady': 1, 'after': 1}
+    assert time.monotonic() - start < 5
+
+def test_errors_and_dead_workers_are_reported_per_file(tmp_path):
+    files = [('bad', 'fail'), ('dies', 'crash'), ('fine', '0'), ('also_fine', '0')]
+    results, runs = run(tmp_path, files, workers=1, timeout=10, poll_interval=0.05)
+
+    assert isinstance(results['bad'][1], ValueError)
+    assert isinstance(results['dies'][1], RuntimeError)
+    assert results['fine'] == ('fine', None)
+    assert results['also_fine'] == ('also_fine', None)
+    assert set(runs.values()) == {1}
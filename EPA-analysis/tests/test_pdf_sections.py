@@ -0,0 +1,106 @@
+import pytest
+from fixture_server import make_styled_pdf
+from pdf_sections import extract_pdf_sections, iter_pdf_events
+
+def body(text, lines=1):
+    return [('body', 72, text)] * lines
+
+PAGES = [
+    # The end of the previous document shares the first page
+    body('the previous rule ends here.') + body('[FR Doc. 2018-00001 Filed 1-1-18; 8:45 am]') +
+    body('Environmental Protection Agency') + body('SUMMARY: The EPA proposes amendments to the standards.') +
+    [('bold', 72, 'I. General Information'),
+     ('italic', 72, 'A. Does this action apply to me?')] +
+    body('This action applies to facilities that operate boilers.', 20) +
+    [('body', 72, '1. Covered Facilities')] +
+    body('Covered facilities are listed in the table.', 20) +
+    # A numbered heading in body type must start with a capital; this line continues a sentence
+    body('2. tons per year were emitted by the source category.') +
+    # Out of sequence under A., so a stray italic line rather than a heading
+    [('italic', 72, 'C. Stray Italic Line')],
+    body('/ Vol. 83, No. 1 / Tuesday, January 2, 2018 / Proposed Rules') +
+    body('Costs are described in the docket. 2. Reporting Requirements') +
+    body('Reports are due annually.', 20) +
+    [('bold', 72, 'II. Background'),
+     ('italic', 72, 'A. History')] +
+    body('The standards were first issued in 1994.', 30) +
+    # A heading in body type continues over lines indented past its first one
+    [('body', 72, '1. Emission Standards for'), ('body', 84, 'Existing Sources')] +
+    body('Existing sources must meet the limits.', 30),
+    body('2 Federal Register') +
+    [('bold', 72, 'PART 63--NATIONAL EMISSION STANDARDS')] +
+    body('Amend section 63.1 as follows.', 10) +
+    body('[FR Doc. 2018-00002 Filed 1-1-18; 8:45 am]') +
+    # The next document printed on the same page is left out
+    [('bold', 72, 'I. Another Document')] + body('Unrelated text.'),
+]
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / 'rule.pdf'
+    path.write_bytes(make_styled_pdf(PAGES))
+    return str(path)
+
+def test_headings_come_from_fonts_and_layout(pdf_path):
+    headings = [event[1:] for event in iter_pdf_events(pdf_path) if event[0] in ('heading', 'part')]
+
+    assert headings == [
+        ('I', False, 'General Information'),
+        ('A', False, 'Does this action apply to me?'),
+        ('1', False, 'Covered Facilities'),
+        ('C', False, 'Stray Italic Line'),
+        ('2', False, 'Reporting Requirements'),
+        ('II', False, 'Background'),
+        ('A', False, 'History'),
+        ('1', False, 'Emission Standards for Existing Sources'),
+        ('PART 63', 'NATIONAL EMISSION STANDARDS'),
+        ('I', False, 'Another Document'),
+    ]
+
+def test_sections_nest_by_numbering(pdf_path):
+    sections = list(extract_pdf_sections(pdf_path))
+
+    assert [(s['hierarchy_path'], s['hierarchy_level'], s['section_title']) for s in sections] == [
+        ('INTRO', 0, 'Document Header and Supplementary Information'),
+        ('I', 1, 'General Information'),
+        ('I.A', 2, 'Does this action apply to me?'),
+        ('I.A.1', 3, 'Covered Facilities'),
+        ('I.A.2', 3, 'Reporting Requirements'),
+        ('II', 1, 'Background'),
+        ('II.A', 2, 'History'),
+        ('II.A.1', 3, 'Emission Standards for Existing Sources'),
+        ('REGULATORY', 1, 'Regulatory Text Amendments'),
+        ('REGULATORY.PART 63', 2, 'NATIONAL EMISSION STANDARDS'),
+    ]
+    by_path = {s['hierarchy_path']: s for s in sections}
+    for section in sections:
+        parent_path = section['hierarchy_path'].rpartition('.')[0]
+        if section['hierarchy_path'].startswith('REGULATORY.'):
+            parent_path = 'REGULATORY'
+        assert section['parent_section_id'] == (by_path[parent_path]['section_id'] if parent_path else None)
+
+    intro = by_path['INTRO']['section_text']
+    assert intro.startswith('Environmental Protection Agency') and 'previous rule' not in intro
+    # Rejected headings stay in the text of the section they appear in
+    assert 'C. Stray Italic Line' in by_path['I.A.1']['section_text']
+    assert '2. tons per year' in by_path['I.A.1']['section_text']
+    # Running heads and footers are dropped
+    assert not any('Vol. 83' in s['section_text'] or '2 Federal Register' in s['section_text'] for s in sections)
+    assert by_path['REGULATORY.PART 63']['section_text'].endswith('[FR Doc. 2018-00002 Filed 1-1-18; 8:45 am]')
+    assert not any('Another Document' in s['section_text'] or 'Unrelated' in s['section_text'] for s in sections)
+
+def test_body_text_leaves_out_subsections(pdf_path):
+    subtree = {s['hierarchy_path']: s['section_text'] for s in extract_pdf_sections(pdf_path)}
+    own = {s['hierarchy_path']: s['section_text'] for s in extract_pdf_sections(pdf_path, text='body')}
+
+    assert subtree['II'].startswith(own['II']) and 'Existing sources must meet' not in own['II']
+    assert own['II.A.1'] == subtree['II.A.1']
+
+def test_memory_holds_one_top_level_section(pdf_path):
+    stats = {}
+    sections = list(extract_pdf_sections(pdf_path, stats=stats))
+
+    # Everything up to the next top-level heading is held, never the whole document
+    largest = max(len(s['section_text']) for s in sections if s['hierarchy_level'] <= 1)
+    assert stats['peak_characters'] <= largest + 100
+    assert stats['peak_characters'] < stats['characters'] / 2
@@ -0,0 +1,90 @@
+import os
+import time
+import pytest
+from attachment_manifest import AttachmentManifest
+from fixture_server import FixtureServer, make_pdf
+from pdf_extraction import extract_pdf_to_text_file
+from records import iter_records, write_records
+
+@pytest.fixture
+def process(load_script, tmp_path):
+    module = load_script('2_process_attachments')
+
+    def run(comments):
+        input_file = tmp_path / 'comments.jsonl'
+        output_file = tmp_path / 'out' / 'comments.jsonl'
+        write_records(str(input_file), comments)
+        module.download_and_process_attachments(workers=4, rate=0, retries=0, extract_workers=2,
+                                                manifest_path=str(tmp_path / 'manifest.sqlite'),
+                                                input_file=str(input_file), output_file=str(output_file),
+                                                attachments_dir=str(tmp_path / 'attachments'))
+        return list(iter_records(str(output_file)))
+
+    return run
+
+def comment(comment_id, server, *names):
+    attachments = [{'filename': name.rsplit('.', 1)[0], 'link': server.url(f"/{name}")} for name in names]
+    return {'comment_id': comment_id, 'comment_text': f"Text of {comment_id}", 'attachments': attachments}
+
+def status_counts(tmp_path):
+    manifest = AttachmentManifest(str(tmp_path / 'manifest.sqlite'))
+    try:
+        return manifest.status_counts()
+    finally:
+        manifest.close()
+
+def test_failed_and_empty_extractions_are_retried_on_the_next_run(process, tmp_path):
+    routes = {
+        '/good.pdf': [make_pdf('Good attachment')],
+        '/blank.pdf': [make_pdf('')],
+        '/broken.pdf': [b'not a pdf at all'],
+        '/flaky.pdf': [503, make_pdf('Flaky attachment')],
+    }
+    with FixtureServer(routes) as server:
+        comments = [
+            comment('c1', server, 'good.pdf', 'notes.docx'),
+            {'comment_id': 'c2', 'comment_text': 'No attachments', 'attachments': []},
+            comment('c3', server, 'blank.pdf', 'broken.pdf'),
+            comment('c4', server, 'missing.pdf', 'flaky.pdf'),
+        ]
+        first = process(comments)
+        first_counts = status_counts(tmp_path)
+        first_paths = server.paths()
+        second = process(comments)
+        second_paths = server.paths()[len(first_paths):]
+
+    # Comments come out in input order, with text only from the PDFs that parsed
+    assert [c['comment_id'] for c in first] == ['c1', 'c2', 'c3', 'c4']
+    assert [a['text'].strip() for a in first[0]['attachment_contents']] == ['Good attachment', '']
+    assert first[0]['combined_text'].startswith('Text of c1\n\n--- ATTACHMENT CONTENT: good ---')
+    assert 'attachment_contents' not in first[1]
+    assert [a['text'] for a in first[2]['attachment_contents']] == ['', '']
+    assert [a['text'] for a in first[3]['attachment_contents']] == ['', '']
+
+    # Empty and unparseable PDFs count as failures, not as finished extractions
+    assert first_counts == {'extracted': 1, 'failed': 4}
+    assert status_counts(tmp_path) == {'extracted': 2, 'failed': 3}
+
+    # Only the failures are fetched again, and the flaky one now succeeds
+    assert sorted(second_paths) == ['/blank.pdf', '/broken.pdf', '/flaky.pdf', '/missing.pdf']
+    assert second[0]['attachment_contents'] == first[0]['attachment_contents']
+    assert second[3]['attachment_contents'][1]['text'].strip() == 'Flaky attachment'
+
+def extract_after_first_comment_is_written(path):
+    """Extractor that only finishes the second comment's PDF once the first comment is on disk"""
+    if 'c2_' in path:
+        partial_output = os.path.join(os.path.dirname(os.path.dirname(path)), 'out', 'comments.jsonl.part')
+        deadline = time.monotonic() + 10
+        while not (os.path.exists(partial_output) and '"c1"' in open(partial_output).read()):
+            if time.monotonic() > deadline:
+                raise TimeoutError('the first comment was not written before the second finished')
+            time.sleep(0.05)
+    return extract_pdf_to_text_file(path)
+
+def test_comments_are_written_as_their_attachments_finish(process, load_script, monkeypatch):
+    module = load_script('2_process_attachments')
+    monkeypatch.setattr(module, 'extract_pdf_to_text_file', extract_after_first_comment_is_written)
+    with FixtureServer({'/one.pdf': [make_pdf('One')], '/two.pdf': [make_pdf('Two')]}) as server:
+        output = process([comment('c1', server, 'one.pdf'), comment('c2', server, 'two.pdf')])
+
+    assert [c['attachment_contents'][0]['text'].strip() for c in output] == ['One', 'Two']
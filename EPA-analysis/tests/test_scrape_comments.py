@@ -0,0 +1,140 @@
+import os
+import time
+import threading
+from types import SimpleNamespace
+import pytest
+from scrape_state import ScrapeState
+from firecrawl_cache import FirecrawlCache
+
+DOCKET = 'https://www.regulations.gov/document/EPA-HQ-OAR-2017-0015-0172/comment'
+
+class FakeFirecrawlApp:
+    """Stands in for FirecrawlApp, answering each comment URL after its own delay"""
+
+    def __init__(self, delays=None, failures=(), listings=None):
+        self.delays = delays or {}
+        self.failures = set(failures)
+        self.listings = listings or {}
+        self.calls = []
+        self.formats = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def scrape_url(self, url, formats=None, **options):
+        with self._lock:
+            self.calls.append(url)
+            self.formats.append(formats)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delays.get(url, 0))
+            if url in self.failures:
+                raise RuntimeError(f"scrape failed: {url}")
+            if url in self.listings:
+                return SimpleNamespace(html=self.listings[url], markdown='')
+            comment_id = url.rsplit('/', 1)[-1]
+            return SimpleNamespace(html='<html></html>', markdown='',
+                                   json={'comment_id': comment_id, 'comment_text': f"Text of {comment_id}"})
+        finally:
+            with self._lock:
+                self.active -= 1
+
+def comment_links(count):
+    return [f"https://www.regulations.gov/comment/EPA-HQ-OAR-2017-0015-{i:04d}" for i in range(count)]
+
+@pytest.fixture
+def make_scraper(load_script, tmp_path):
+    module = load_script('1_scrape_epa_comments')
+
+    def make(app, **options):
+        options.setdefault('extraction', 'llm')
+        return module.EPACommentScraper(output_dir=str(tmp_path / 'output'), app=app, **options)
+
+    return make
+
+def test_comments_come_back_in_listing_order(make_scraper):
+    links = comment_links(8)
+    # Later links finish first
+    app = FakeFirecrawlApp(delays={link: 0.02 * (len(links) - i) for i, link in enumerate(links)})
+    comments = make_scraper(app, concurrency=4).fetch_comments(links)
+
+    assert [c['source_url'] for c in comments] == links
+    assert [c['comment_id'] for c in comments] == [link.rsplit('/', 1)[-1] for link in links]
+    assert sorted(app.calls) == sorted(links)
+
+@pytest.mark.parametrize('concurrency', [1, 3])
+def test_at_most_concurrency_pages_are_fetched_at_once(make_scraper, concurrency):
+    links = comment_links(9)
+    app = FakeFirecrawlApp(delays=dict.fromkeys(links, 0.05))
+    make_scraper(app, concurrency=concurrency).fetch_comments(links)
+
+    assert app.peak == concurrency
+
+def test_failed_pages_are_left_out_and_recorded(make_scraper, tmp_path):
+    links = comment_links(6)
+    state = ScrapeState(str(tmp_path / 'state.sqlite'))
+    state.record_page(DOCKET, links, page=1)
+    app = FakeFirecrawlApp(delays={links[0]: 0.05}, failures=[links[1], links[4]])
+    try:
+        comments = make_scraper(app, concurrency=3, state=state).fetch_comments(links)
+
+        assert [c['source_url'] for c in comments] == [links[0], links[2], links[3], links[5]]
+        assert state.status_counts(DOCKET) == {'fetched': 4, 'failed': 2}
+        # A resumed run only has the failed pages left to fetch
+        assert state.pending_links(DOCKET) == [links[1], links[4]]
+    finally:
+        state.close()
+
+def test_only_comment_pages_are_served_from_the_cache(make_scraper, tmp_path):
+    links = comment_links(3)
+    listing = ''.join(f'<a href="{link[len("https://www.regulations.gov"):]}">comment</a>' for link in links)
+    listing_url = f"{DOCKET}?pageNumber=1"
+    cache = FirecrawlCache(str(tmp_path / 'cache.sqlite'))
+    try:
+        first = FakeFirecrawlApp(listings={listing_url: listing})
+        make_scraper(first, cache=cache).extract_structured_data(DOCKET)
+        assert sorted(first.calls) == sorted([listing_url] + links)
+
+        # The listing is fetched again in case new comments arrived; comments come from the cache
+        second = FakeFirecrawlApp(listings={listing_url: listing})
+        comments = make_scraper(second, cache=cache).extract_structured_data(DOCKET)
+        assert second.calls == [listing_url]
+        assert [c['source_url'] for c in comments] == links
+
+        # Offline runs read the cached listing too
+        offline = make_scraper(None, cache=cache, offline=True).extract_structured_data(DOCKET)
+        assert offline == comments
+    finally:
+        cache.close()
+
+def test_dockets_without_a_document_id_get_their_own_files(make_scraper, tmp_path):
+    urls = ['https://www.regulations.gov/docket/EPA-HQ-OAR-2017-0015/comments',
+            'https://www.regulations.gov/docket/EPA-HQ-OLEM-2017-0463/comments']
+    links = comment_links(2)
+    listings = {f"{url}?pageNumber=1": f'<a href="{link}">comment</a>' for url, link in zip(urls, links)}
+    output_files = make_scraper(FakeFirecrawlApp(listings=listings), exports=()).process_multiple_urls(urls, max_comments=None)
+
+    individual = output_files['individual']
+    assert sorted(key.rsplit('_', 1)[0] for key in individual) == ['EPA-HQ-OAR-2017-0015', 'EPA-HQ-OLEM-2017-0463']
+    structured = [files['structured_json'] for files in individual.values()]
+    assert len(set(structured)) == 2
+    assert sorted(os.listdir(tmp_path / 'output')) == sorted(
+        [os.path.basename(path) for files in individual.values() for path in files.values()]
+        + [os.path.basename(output_files['combined']['json'])])
+
+def test_html_extraction_falls_back_to_the_llm_for_rejected_pages(make_scraper):
+    link = comment_links(1)[0]
+    app = FakeFirecrawlApp()
+    comment = make_scraper(app, extraction='html').fetch_comment(link)
+
+    assert comment['comment_id'] == link.rsplit('/', 1)[-1]
+    # The fallback only asks for the extraction; the page formats came with the first request
+    assert app.formats == [['markdown', 'html'], ['json']]
+
+def test_llm_extraction_is_the_default(load_script, tmp_path):
+    module = load_script('1_scrape_epa_comments')
+    app = FakeFirecrawlApp()
+    module.EPACommentScraper(output_dir=str(tmp_path / 'output'), app=app).fetch_comment(comment_links(1)[0])
+
+    assert app.formats == [['markdown', 'html', 'json']]
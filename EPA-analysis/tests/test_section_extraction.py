@@ -0,0 +1,85 @@
+import os
+import random
+import pytest
+from legacy_section_extractor import extract_epa_sections_legacy, roman_numeral, same_sections, synthetic_federal_register
+
+DOCUMENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'documents')
+
+@pytest.fixture(scope='module')
+def extract(load_script):
+    return load_script('3_extract_document_sections_fixed').extract_epa_sections_fixed
+
+WORDS = ('emission', 'standards', 'monitoring', 'the', 'EPA', 'proposes', 'facility', 'limits', 'risk', 'review',
+         '#', '###', '-', '---', 'PART', 'I.', 'A.', '(a)', '1.', 'General', 'Information', '\t')
+
+def random_line(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 12)))
+
+def random_federal_register(rng):
+    """
+    A small Federal Register-like document with randomly chosen heading styles, page breaks and oddities
+
+    It always opens with some intro text; without any, the legacy extractor
+    loses the first section's subsections (see the test below).
+    """
+    main, sub = rng.choice([('###', '####'), ('#', '#'), ('##', '###')])
+    lines = ['## SUMMARY:'] + [random_line(rng) for _ in range(rng.randint(0, 4))]
+    if rng.random() < 0.8:
+        lines.append(f"{rng.choice(['###', '#'])} I. General Information")
+    for number in range(1, rng.randint(1, 7)):
+        if number > 1 or rng.random() < 0.5:
+            lines.append(f"{main} {roman_numeral(number)}.{' ' * rng.randint(1, 2)}{random_line(rng) or 'Title'}")
+        for letter in 'ABCDEF'[:rng.randint(0, 4)]:
+            lines.append(f"{sub} {letter}. {random_line(rng) or 'Subtitle'}")
+            lines.extend(random_line(rng) for _ in range(rng.randint(0, 5)))
+            if rng.random() < 0.3:
+                lines.append('---')
+        lines.extend(random_line(rng) for _ in range(rng.randint(0, 3)))
+    if rng.random() < 0.5:
+        lines.append(f"# PART {rng.randint(1, 99)}--{random_line(rng)}")
+        lines.extend(random_line(rng) for _ in range(rng.randint(0, 4)))
+        if rng.random() < 0.5:
+            lines.append(f"# {random_line(rng)}")
+            lines.extend(random_line(rng) for _ in range(rng.randint(0, 3)))
+    newline = '\r\n' if rng.random() < 0.2 else '\n'
+    return newline.join(lines) + (newline if rng.random() < 0.5 else '')
+
+@pytest.mark.parametrize('seed', range(500))
+def test_matches_the_legacy_extractor_on_random_documents(extract, seed):
+    markdown_text = random_federal_register(random.Random(seed))
+    assert same_sections(extract(markdown_text), extract_epa_sections_legacy(markdown_text)), markdown_text
+
+def test_keeps_the_first_sections_subsections_without_an_intro(extract):
+    # The legacy extractor skipped sections[0] assuming it was the intro, losing I.A here
+    markdown_text = '### I. General Information\n#### A. Purpose\nText.\n### II. Background\n#### A. History\nMore text.\n'
+    sections = extract(markdown_text)
+
+    assert [(s['section_number'], s['hierarchy_level']) for s in sections] == [('I', 1), ('II', 1), ('A', 2), ('A', 2)]
+    assert [(s['section_number'], s['hierarchy_level']) for s in extract_epa_sections_legacy(markdown_text)] == [
+        ('I', 1), ('II', 1), ('A', 2)]
+
+def test_matches_the_legacy_extractor_on_a_synthetic_document(extract):
+    markdown_text = synthetic_federal_register(2 * 1024 * 1024)
+    sections = extract(markdown_text)
+    assert len(sections) > 100
+    assert same_sections(sections, extract_epa_sections_legacy(markdown_text))
+
+@pytest.mark.parametrize('name', ['doc2.md', 'dummy.md'])
+def test_matches_the_legacy_extractor_on_sample_documents(extract, name):
+    path = os.path.join(DOCUMENTS_DIR, name)
+    if not os.path.exists(path):
+        pytest.skip(f"{name} is not in data/documents")
+    with open(path, 'r', encoding='utf-8') as f:
+        markdown_text = f.read()
+    assert same_sections(extract(markdown_text), extract_epa_sections_legacy(markdown_text))
+
+@pytest.mark.parametrize('main, sub, other_sub', [('###', '####', '#'), ('#', '#', '####')])
+def test_subsections_use_the_heading_style_of_the_main_sections(extract, main, sub, other_sub):
+    markdown_text = (f"Intro.\n{main} I. General Information\n{sub} A. Purpose\nText.\n"
+                     f"{other_sub} B. Other style\nMore text.\n{main} II. Background\n")
+    sections = extract(markdown_text)
+
+    # With "#" subsections, "# I." itself reads as a subsection, as it did in the legacy extractor
+    subsections = [s['section_number'] for s in sections if s['hierarchy_level'] == 2]
+    assert subsections == (['A'] if sub == '####' else ['I', 'A'])
+    assert same_sections(sections, extract_epa_sections_legacy(markdown_text))
@@ -0,0 +1,73 @@
+import os
+import numpy as np
+import pytest
+from section_index import IVFFlatSectionIndex, index_path, load_or_build_index, recall_report
+
+def unit_rows(matrix):
+    return (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+
+def clustered(n_sections=1200, n_comments=300, topics=40, dim=32, noise=0.1, seed=1):
+    """Sections and comments scattered around shared topic directions, like real embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = unit_rows(rng.normal(size=(topics, dim)))
+    sections = unit_rows(centers[rng.integers(0, topics, n_sections)] + noise * rng.normal(size=(n_sections, dim)))
+    comments = unit_rows(centers[rng.integers(0, topics, n_comments)] + noise * rng.normal(size=(n_comments, dim)))
+    return comments, sections, [f"s{i}" for i in range(n_sections)]
+
+def brute_force(comment_matrix, section_matrix, threshold, max_matches):
+    """Score every section for every comment; best first, ties by section order"""
+    for c, comment in enumerate(comment_matrix):
+        scores = section_matrix @ comment
+        ranked = sorted(range(len(scores)), key=lambda s: (-scores[s], s))
+        yield c, [(s, float(scores[s])) for s in ranked[:max_matches] if scores[s] >= threshold]
+
+@pytest.fixture(scope='module')
+def data():
+    return clustered()
+
+def test_default_nprobe_recall(data, capsys):
+    comments, sections, ids = data
+    rows = recall_report(comments, sections, ids, brute_force, threshold=0.75, max_matches=5, nprobe_values=(8,))
+
+    assert [(row['nlist'], row['nprobe']) for row in rows] == [(IVFFlatSectionIndex.build(sections, ids).nlist, 8)]
+    assert rows[0]['recall'] >= 0.95
+    assert 'Exact search: ' in capsys.readouterr().out
+
+def test_probing_every_list_is_exact():
+    # Components on a 1/8 grid make every dot product exact in float32, whatever order it is summed in,
+    # so the many tied scores have to be broken the same way too
+    rng = np.random.default_rng(2)
+    sections = (rng.integers(-3, 4, size=(400, 16)) / 8).astype(np.float32)
+    comments = (rng.integers(-3, 4, size=(90, 16)) / 8).astype(np.float32)
+    index = IVFFlatSectionIndex.build(sections, [f"s{i}" for i in range(400)], nlist=16)
+
+    for threshold, max_matches in ((0.5, 5), (0.0, 12), (-10.0, 3), (2.0, 400)):
+        found = list(index.search(comments, sections, threshold, max_matches, nprobe=index.nlist, chunk_size=64))
+        assert found == list(brute_force(comments, sections, threshold, max_matches))
+
+def test_save_and_load_round_trip(data, tmp_path):
+    comments, sections, ids = data
+    index = IVFFlatSectionIndex.build(sections, ids, nlist=20, nprobe=3)
+    path = str(tmp_path / 'nested' / 'index.npz')
+    index.save(path)
+    loaded = IVFFlatSectionIndex.load(path)
+
+    for name in ('centroids', 'list_offsets', 'list_members'):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(index, name))
+        assert getattr(loaded, name).dtype == getattr(index, name).dtype
+    assert (loaded.fingerprint, loaded.nprobe, loaded.nlist) == (index.fingerprint, 3, 20)
+    assert list(loaded.search(comments, sections)) == list(index.search(comments, sections))
+
+def test_persisted_index_is_rebuilt_when_sections_change(data, tmp_path, capsys):
+    _, sections, ids = data
+    index_dir = str(tmp_path)
+    built = load_or_build_index('p', sections, ids, nlist=20, index_dir=index_dir)
+    assert os.path.exists(index_path('p', index_dir))
+
+    reused = load_or_build_index('p', sections, ids, nlist=20, nprobe=4, index_dir=index_dir)
+    np.testing.assert_array_equal(reused.centroids, built.centroids)
+    assert reused.nprobe == 4 and 'stale' not in capsys.readouterr().out
+
+    changed = load_or_build_index('p', sections[:-1], ids[:-1], nlist=20, index_dir=index_dir)
+    assert 'stale' in capsys.readouterr().out
+    assert changed.list_members.size == len(ids) - 1
@@ -0,0 +1,137 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from section_matching import (build_embedding_matrix, build_proposal_mask, fetch_server_matches, server_match_records,
+                              top_k_chunk_matches, top_k_section_matches, vector_search_similarity)
+
+def random_embeddings(rng, count, dim=12):
+    """Vectors with four +-1 entries: unit length once normalized, and every cosine a multiple of 1/4, so scores are
+    exact (whatever the summation order) and ties are common"""
+    vectors = np.zeros((count, dim))
+    for vector in vectors:
+        vector[rng.choice(dim, 4, replace=False)] = rng.choice([-1.0, 1.0], 4)
+    return vectors.tolist()
+
+def make_rows(rng, count, prefix):
+    rows = [{f"{prefix}_id": f"{prefix}{i}", 'embedding': vector,
+             'proposal_id': ['p', 'q', None][rng.integers(3)]} for i, vector in enumerate(random_embeddings(rng, count))]
+    # Rows uploaded before embedding score 0.0 against everything
+    rows[3]['embedding'] = []
+    return rows
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(5)
+    return make_rows(rng, 40, 'comment'), make_rows(rng, 25, 'section')
+
+def baseline(comments, sections, threshold, max_matches):
+    """The original per-pair loop: score every section, keep those over threshold, stable sort, take the best"""
+    for c, comment in enumerate(comments):
+        matches = []
+        for s, section in enumerate(sections):
+            if comment['proposal_id'] and section['proposal_id'] and comment['proposal_id'] != section['proposal_id']:
+                continue
+            similarity = vector_search_similarity(comment['embedding'], section['embedding'])
+            if similarity >= threshold:
+                matches.append((s, float(similarity)))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        yield c, matches[:max_matches]
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 40, 1024])
+@pytest.mark.parametrize('max_matches', [0, 1, 3, 25, 30])
+@pytest.mark.parametrize('threshold', [0.0, 0.5])
+def test_matches_the_per_pair_loop(data, chunk_size, max_matches, threshold):
+    comments, sections = data
+    comment_matrix = build_embedding_matrix([c['embedding'] for c in comments], 12)
+    section_matrix = build_embedding_matrix([s['embedding'] for s in sections], 12)
+
+    found = list(top_k_section_matches(comment_matrix, section_matrix, threshold, max_matches,
+                                       build_proposal_mask(comments, sections), chunk_size))
+    assert found == list(baseline(comments, sections, threshold, max_matches))
+
+def test_ties_keep_section_order():
+    comment_matrix = build_embedding_matrix([[1.0, 0.0]])
+    # Sections 1, 2 and 4 tie for first place and the cut falls inside the tie
+    section_matrix = build_embedding_matrix([[0.0, 1.0], [1.0, 0.0], [2.0, 0.0], [1.0, 1.0], [3.0, 0.0]])
+
+    assert list(top_k_section_matches(comment_matrix, section_matrix, 0.5, 2)) == [(0, [(1, 1.0), (2, 1.0)])]
+    assert [s for s, _ in next(top_k_section_matches(comment_matrix, section_matrix, 0.5, 10))[1]] == [1, 2, 4, 3]
+
+def test_single_chunk_owners_score_like_pooled_embeddings(data):
+    comments, sections = data
+    comment_matrix = build_embedding_matrix([c['embedding'] for c in comments], 12)
+    section_matrix = build_embedding_matrix([s['embedding'] for s in sections], 12)
+    pair_mask = build_proposal_mask(comments, sections)
+
+    found = list(top_k_chunk_matches(comment_matrix, np.arange(len(comments) + 1), section_matrix,
+                                     np.arange(len(sections) + 1), 0.25, 4, pair_mask, chunk_size=9))
+    assert found == list(top_k_section_matches(comment_matrix, section_matrix, 0.25, 4, pair_mask))
+
+class FakeRpcClient:
+    """
+    Answers match_comment_sections from precomputed {comment_id: [(section_id,
+    score), ...]} matches; like PostgREST, a response holds at most max_rows rows
+    """
+
+    def __init__(self, matches_by_comment, max_rows):
+        self.matches_by_comment = matches_by_comment
+        self.max_rows = max_rows
+        self.calls = []
+        self.truncated = False
+
+    def rpc(self, name, params):
+        assert name == 'match_comment_sections'
+        self.calls.append(params)
+        after = params['after_comment_id']
+        page = sorted(c for c in self.matches_by_comment if after is None or c > after)[:params['comment_limit']]
+        rows = []
+        for comment_id in page:
+            top = self.matches_by_comment[comment_id][:params['match_count']]
+            # A comment without matches still gets a row, so the cursor moves past it
+            rows.extend([{'comment_id': comment_id, 'section_id': s, 'score': score} for s, score in top] or
+                        [{'comment_id': comment_id, 'section_id': None, 'score': None}])
+        self.truncated |= len(rows) > self.max_rows
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=rows[:self.max_rows]))
+
+def client_mode_records(comments, sections, threshold, max_matches):
+    """Match dictionaries as python_matches builds them for one proposal"""
+    comment_matrix = build_embedding_matrix([c['embedding'] for c in comments], 12)
+    section_matrix = build_embedding_matrix([s['embedding'] for s in sections], 12)
+    records = []
+    for c, top in top_k_section_matches(comment_matrix, section_matrix, threshold, max_matches):
+        records.extend({'comment_id': comments[c]['comment_id'], 'section_id': sections[s]['section_id'],
+                        'similarity_score': score, 'proposal_id': 'p'} for s, score in top)
+    return records
+
+def test_server_matches_merge_like_client_mode(data):
+    comments, sections = data
+    expected = client_mode_records(comments, sections, 0.25, 4)
+    stored = {c['comment_id']: [] for c in comments}
+    for record in expected:
+        stored[record['comment_id']].append((record['section_id'], record['similarity_score']))
+    client = FakeRpcClient(stored, max_rows=10)
+
+    fetched = fetch_server_matches(client, 'p', 0.25, 4, max_rows=10)
+
+    # Every comment is listed, even those without matches, and no page ran into the row limit
+    assert sorted(fetched) == sorted(stored) and not client.truncated
+    assert sum(len(top) for top in stored.values()) > 10
+    key = lambda record: (record['comment_id'], record['section_id'])
+    assert sorted(server_match_records(fetched, 'p'), key=key) == sorted(expected, key=key)
+
+@pytest.mark.parametrize('max_rows, max_matches, comment_limit', [(1000, 5, 200), (10, 3, 3), (10, 10, 1), (7, 0, 7)])
+def test_server_pages_stay_under_the_row_limit(max_rows, max_matches, comment_limit):
+    # Every comment has a full set of matches, the worst case for the page size
+    stored = {f"c{i:02d}": [(f"s{j}", 0.9 - j / 100) for j in range(max_matches)] for i in range(23)}
+    client = FakeRpcClient(stored, max_rows)
+
+    fetched = fetch_server_matches(client, 'p', 0.5, max_matches, exact=True, ef_search=40, max_rows=max_rows)
+
+    assert fetched == stored and not client.truncated
+    assert {call['comment_limit'] for call in client.calls} == {comment_limit}
+    # One request per page, each starting after the last comment of the one before, then one that comes back empty
+    ids = sorted(stored)
+    pages = [ids[i:i + comment_limit] for i in range(0, len(ids), comment_limit)]
+    assert [call['after_comment_id'] for call in client.calls] == [None] + [page[-1] for page in pages]
+    assert all(call['exact'] and call['ef_search'] == 40 and call['match_count'] == max_matches
+               for call in client.calls)
@@ -0,0 +1,53 @@
+import json
+import pytest
+from records import open_text, write_records
+from section_tree import build_section_tree, load_sections, materialize_sections
+
+MARKDOWN = """## SUMMARY:
+The EPA is proposing amendments.
+
+### I. General Information
+#### A. Does this action apply to me?
+Facilities in the source category.
+#### B. Where can I get this information?
+In the docket.
+
+### II. Background
+The statutory authority for this action.
+
+# PART 63--NATIONAL EMISSION STANDARDS
+## 1. Amend section 63.1 as follows.
+"""
+
+SECTIONS = [
+    {'section_id': 'intro', 'section_number': 'INTRO', 'section_title': 'Document Header',
+     'section_text': 'The EPA is proposing amendments.', 'hierarchy_level': 0, 'parent_section_id': None},
+    {'section_id': 'one', 'section_number': 'I', 'section_title': 'General Information',
+     'section_text': '### I. General Information', 'hierarchy_level': 1, 'parent_section_id': None},
+    {'section_id': 'one-a', 'section_number': 'A', 'section_title': 'Does this action apply to me?',
+     'section_text': 'Facilities in the source category.', 'hierarchy_level': 2, 'parent_section_id': 'one'},
+]
+
+@pytest.mark.parametrize('name', ['sections.json', 'sections.json.gz', 'sections.jsonl', 'sections.jsonl.gz'])
+def test_loads_section_lists(tmp_path, name):
+    path = str(tmp_path / name)
+    write_records(path, SECTIONS)
+    assert load_sections(path) == SECTIONS
+
+@pytest.mark.parametrize('name', ['tree.json', 'tree.json.gz'])
+@pytest.mark.parametrize('text', ['body', 'subtree'])
+def test_loads_span_format_documents(tmp_path, name, text):
+    document = build_section_tree(MARKDOWN)
+    path = str(tmp_path / name)
+    with open_text(path, 'w') as f:
+        json.dump(document, f)
+
+    sections = load_sections(path, text)
+    assert sections == materialize_sections(document, text)
+    assert [s['hierarchy_path'] for s in sections][:4] == ['INTRO', 'I', 'I.A', 'I.B']
+
+def test_rejects_other_json_objects(tmp_path):
+    path = tmp_path / 'other.json'
+    path.write_text(json.dumps({'sections': SECTIONS}))
+    with pytest.raises(ValueError):
+        load_sections(str(path))
@@ -0,0 +1,83 @@
+import pytest
+from fake_supabase import FakeClient
+from supabase_rows import fetch_all_rows, section_levels, upsert_comment_batch, upsert_section_batch
+
+def chunk_rows(count):
+    return [{'section_id': f"s{i % 7}", 'chunk_index': i // 7, 'proposal_id': 'p' if i % 3 else 'q'}
+            for i in range(count)]
+
+def test_reads_past_the_row_limit():
+    rows = chunk_rows(2500)
+    client = FakeClient({'chunks': rows})
+
+    def query():
+        return client.table('chunks').select('*').eq('proposal_id', 'p').order('section_id').order('chunk_index')
+
+    fetched = fetch_all_rows(query)
+    expected = sorted((row for row in rows if row['proposal_id'] == 'p'),
+                      key=lambda row: (row['section_id'], row['chunk_index']))
+    # One unpaged select would have stopped at 1000 rows
+    assert len(query().execute().data) == 1000
+    assert fetched == expected
+
+def test_stops_after_a_short_page():
+    client = FakeClient({'chunks': chunk_rows(20)}, max_rows=5)
+    assert fetch_all_rows(lambda: client.table('chunks').select('*'), page_size=5) == chunk_rows(20)
+    # Four full pages, then an empty one
+    assert len(client.requests) == 5
+
+def chunked(text, pieces):
+    """get_chunked_embeddings-style result splitting text into the given number of chunks"""
+    size = len(text) // pieces
+    chunks = [{'chunk_index': i, 'start_char': i * size, 'end_char': (i + 1) * size, 'token_count': size,
+               'embedding': [float(i), 1.0]} for i in range(pieces)]
+    return {'embedding': [1.0, 0.0], 'chunks': chunks}
+
+COMMENTS = [{'comment_id': f"c{i}", 'commenter_name': 'Jane Doe', 'comment_date': 'Jun 20, 2020',
+             'comment_text': 'Please reconsider the rule. ' * 10, 'attachments': []} for i in range(3)]
+
+def test_comment_batches_replace_earlier_chunks():
+    client = FakeClient()
+    assert upsert_comment_batch(client, COMMENTS, [chunked(c['comment_text'], 3) for c in COMMENTS], 'p')
+    # Uploading again with the text split differently leaves only the new chunks
+    assert upsert_comment_batch(client, COMMENTS[:1], [chunked(COMMENTS[0]['comment_text'], 2)], 'p')
+
+    assert sorted(row['comment_id'] for row in client.tables['epa_comments']) == ['c0', 'c1', 'c2']
+    chunks = sorted((row['comment_id'], row['chunk_index']) for row in client.tables['epa_comment_chunks'])
+    assert chunks == [('c0', 0), ('c0', 1), ('c1', 0), ('c1', 1), ('c1', 2), ('c2', 0), ('c2', 1), ('c2', 2)]
+    assert {row['proposal_id'] for row in client.tables['epa_comment_chunks']} == {'p'}
+
+def test_section_rows_skip_empty_embeddings():
+    client = FakeClient()
+    sections = [{'section_id': 'one', 'section_text': 'General Information'},
+                {'section_id': 'one-a', 'section_text': '', 'parent_section_id': 'one', 'hierarchy_level': 2}]
+    embedded = [chunked('General Information', 1), {'embedding': [], 'chunks': []}]
+    assert upsert_section_batch(client, sections, embedded, 'p')
+
+    rows = {row['section_id']: row for row in client.tables['document_sections']}
+    assert rows['one']['embedding'] == [1.0, 0.0] and rows['one']['hierarchy_level'] == 1
+    assert 'embedding' not in rows['one-a'] and rows['one-a']['parent_section_id'] == 'one'
+    assert [row['section_id'] for row in client.tables['document_section_chunks']] == ['one']
+
+@pytest.mark.parametrize('failure', [('epa_comments', 'upsert'), ('epa_comment_chunks', 'delete'),
+                                     ('epa_comment_chunks', 'insert')])
+def test_failed_requests_fail_the_batch(failure, capsys):
+    client = FakeClient(failures=[failure])
+    assert not upsert_comment_batch(client, COMMENTS, [chunked(c['comment_text'], 2) for c in COMMENTS], 'p')
+    assert 'failed' in capsys.readouterr().out
+    if failure[0] == 'epa_comments':
+        # Chunks aren't stored for comments that weren't
+        assert ('epa_comment_chunks', 'insert') not in client.requests
+
+def test_section_levels_put_parents_first():
+    sections = [{'section_id': 'one-a-i', 'parent_section_id': 'one-a'},
+                {'section_id': 'two', 'parent_section_id': None},
+                {'section_id': 'one-a', 'parent_section_id': 'one'},
+                {'section_id': 'one', 'parent_section_id': None},
+                {'section_id': 'one-b', 'parent_section_id': 'one'},
+                # A parent from another file (or already stored) doesn't hold a section back
+                {'section_id': 'orphan', 'parent_section_id': 'elsewhere'}]
+
+    levels = section_levels(sections)
+    assert [[s['section_id'] for s in level] for level in levels] == [
+        ['two', 'one', 'orphan'], ['one-a', 'one-b'], ['one-a-i']]